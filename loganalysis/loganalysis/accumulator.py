@@ -0,0 +1,108 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+
+
+class Accumulator(object):
+    '''分块数据的累积器
+
+        逐块收集DataFrame，最后一次性拼接，代替循环中反复pd.concat/DataFrame.append。
+        已知总行数(例如来自文件索引)时，按第一个数据块的列和类型预先分配各列数组，
+        之后的数据块直接拷贝到对应位置；列或类型不一致、行数超出预期时退回到分块收集。
+    '''
+
+    def __init__(self, columns=None, rows=None, ignore_index=False, empty_columns=None):
+        '''初始化累积器
+
+           Args:
+               columns: 输出列名列表，为None时按数据块的列输出
+               rows: 预期总行数，为None时不预分配
+               ignore_index: 是否丢弃数据块的行索引，重新从0编号
+               empty_columns: 没有收到任何数据块时输出的列名列表
+        '''
+        self._columns = columns
+        self._empty_columns = empty_columns
+        self._rows = rows
+        self._ignore_index = ignore_index
+        self._chunks = []
+        self._empty = None
+        self._arrays = None
+        self._index = None
+        self._filled = 0
+
+    def __len__(self):
+        return self._filled + sum(len(chunk.index) for chunk in self._chunks)
+
+    def _preallocate(self, data):
+        '''按数据块的列和类型分配各列数组，仅支持numpy类型'''
+        if not all(isinstance(dtype, np.dtype) for dtype in data.dtypes) \
+                or not isinstance(data.index.dtype, np.dtype):
+            self._rows = None
+            return
+        self._arrays = {col: np.empty(self._rows, dtype=data[col].dtype) for col in data.columns}
+        self._index = np.empty(self._rows, dtype=data.index.dtype)
+
+    def _fits(self, data):
+        '''数据块能否直接拷贝到预分配的数组'''
+        if list(data.columns) != list(self._arrays) or self._filled + len(data.index) > self._rows:
+            return False
+        if data.index.dtype != self._index.dtype:
+            return False
+        return all(data[col].dtype == self._arrays[col].dtype for col in data.columns)
+
+    def _flush(self):
+        '''将预分配数组中已填充的部分转为数据块，之后不再预分配'''
+        filled = self._filled
+        if filled:
+            chunk = pd.DataFrame({col: arr[:filled] for col, arr in self._arrays.items()},
+                                 index=self._index[:filled])
+            self._chunks.append(chunk)
+        self._arrays = None
+        self._index = None
+        self._rows = None
+        self._filled = 0
+
+    def append(self, data):
+        '''添加一个数据块
+
+            Args：
+                data: DataFrame格式的数据块
+            Returns:
+                无
+        '''
+        if self._empty is None:
+            self._empty = data.iloc[:0]
+        if 0 == len(data.index):
+            return
+        if self._rows is not None and self._arrays is None and not self._chunks:
+            self._preallocate(data)
+        if self._arrays is not None:
+            if self._fits(data):
+                start, end = self._filled, self._filled + len(data.index)
+                for col, arr in self._arrays.items():
+                    arr[start:end] = data[col].values
+                self._index[start:end] = data.index.values
+                self._filled = end
+                return
+            self._flush()
+        self._chunks.append(data)
+
+    def result(self):
+        '''拼接所有数据块
+
+            Returns:
+                数据，DataFrame格式
+        '''
+        if self._arrays is not None:
+            self._flush()
+        if not self._chunks:
+            rlt = self._empty if self._empty is not None else pd.DataFrame(columns=self._empty_columns)
+        elif 1 == len(self._chunks):
+            rlt = self._chunks[0]
+        else:
+            rlt = pd.concat(self._chunks, ignore_index=self._ignore_index)
+        if self._ignore_index:
+            rlt = rlt.reset_index(drop=True)
+        if self._columns is not None:
+            rlt = rlt.reindex(columns=self._columns)
+        return rlt
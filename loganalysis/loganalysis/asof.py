@@ -0,0 +1,138 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+
+
+class AsofIndex(object):
+    '''按列非空位置建立的as-of查询索引
+
+        一次遍历LogFile，为每一列记录非空行的位置(按文件顺序的全局行序号)，同时记录每行的查询键和绝对TTI。
+        指定查询键列时，键为空的行不参与索引。
+        查询某组列时，按how对各列的位置数组求交集或并集，按(键, 绝对TTI, 行序号)排序后二分查找，
+        得到每个(键, 时间)之前最近一条满足条件的记录。各列组合的查找表在首次查询时建立并缓存。
+    '''
+
+    def __init__(self, logfile, cols, keycol=None):
+        '''遍历LogFile建立索引
+
+            Args:
+                logfile: LogFile实例，不受其时间范围限制
+                cols: 需要建立索引的列
+                keycol: 查询键列，如UEGID；为None时不区分键
+        '''
+        self._cols = list(cols)
+        self._keycol = keycol
+        readcols = list(set(self._cols + [ABSTTI_COL] + ([keycol] if keycol else [])))
+        files, rows, keys, ttis = [], [], [], []
+        positions = {col: [] for col in self._cols}
+        seq = 0
+        for span in logfile._file_spans():
+            fileidx = logfile.files.index(span[0])
+            for data in logfile._gen_of_cols(readcols, None, None, [span]):
+                num = len(data.index)
+                if 0 == num:
+                    continue
+                files.append(np.full(num, fileidx, dtype=np.int32))
+                rows.append(data.index.values.astype(np.int64))
+                ttis.append(data[ABSTTI_COL].values.astype(np.int64))
+                keyed = np.ones(num, dtype=bool)
+                if keycol:
+                    keyed = data[keycol].notna().values
+                    keys.append(data[keycol].to_numpy(dtype=np.int64, na_value=0))
+                for col in self._cols:
+                    positions[col].append(np.flatnonzero(data[col].notna().values & keyed) + seq)
+                seq = seq + num
+
+        self._filenames = logfile.files
+        self._files = np.concatenate(files) if files else np.array([], dtype=np.int32)
+        self._rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+        self._ttis = np.concatenate(ttis) if ttis else np.array([], dtype=np.int64)
+        self._keys = np.concatenate(keys) if keys else np.zeros(seq, dtype=np.int64)
+        self._positions = {col: np.concatenate(pos) if pos else np.array([], dtype=np.int64)
+                           for col, pos in positions.items()}
+        self._tables = {}
+
+    @property
+    def cols(self):
+        return self._cols
+
+    @property
+    def keycol(self):
+        return self._keycol
+
+    def positions(self, cols, how='any'):
+        '''cols中任一列(how='any')或全部列(how='all')非空的行序号，升序'''
+        assert(how in ('any', 'all'))
+        rlt = None
+        for col in cols:
+            pos = self._positions[col]
+            if rlt is None:
+                rlt = pos
+            else:
+                rlt = np.union1d(rlt, pos) if 'any' == how else np.intersect1d(rlt, pos, assume_unique=True)
+        return np.array([], dtype=np.int64) if rlt is None else rlt
+
+    def _table(self, cols, how):
+        '''按(键, 绝对TTI, 行序号)排序的查找表：(唯一键, 组合键, 行序号, TTI基准, TTI跨度)'''
+        name = (tuple(sorted(cols)), how)
+        if name not in self._tables:
+            pos = self.positions(cols, how)
+            keys = self._keys[pos]
+            ttis = self._ttis[pos]
+            pos = pos[np.lexsort((pos, ttis, keys))]
+            uniqkeys, codes = np.unique(self._keys[pos], return_inverse=True)
+            base = int(ttis.min()) if len(ttis) else 0
+            span = (int(ttis.max()) - base + 2) if len(ttis) else 1
+            combined = codes.astype(np.int64) * span + (self._ttis[pos] - base)
+            self._tables[name] = (uniqkeys, combined, pos, base, span)
+        return self._tables[name]
+
+    def lookup(self, ttis, cols, how='any', keys=None):
+        '''批量查找每个(键, 绝对TTI)及之前最近一条满足条件的记录
+
+            Args:
+                ttis: 查询的绝对TTI数组
+                cols: 列名列表，须为建立索引时的列
+                how: 'any'任一列非空，'all'全部列非空
+                keys: 与ttis等长的查询键数组，keycol为None时忽略；键为空的查询不命中
+            Returns:
+                行序号数组，没有命中时为-1
+        '''
+        uniqkeys, combined, pos, base, span = self._table(cols, how)
+        ttis = np.asarray(ttis, dtype=np.int64)
+        if 0 == len(combined):
+            return np.full(len(ttis), -1, dtype=np.int64)
+        keyed = np.ones(len(ttis), dtype=bool)
+        if keys is None or not self._keycol:
+            keys = np.zeros(len(ttis), dtype=np.int64)
+        else:
+            keys = pd.Series(keys)
+            keyed = keys.notna().values
+            keys = keys.to_numpy(dtype=np.int64, na_value=0)
+        codes = np.minimum(np.searchsorted(uniqkeys, keys), len(uniqkeys) - 1)
+        offsets = np.clip(ttis - base, -1, span - 1)
+        idx = np.searchsorted(combined, codes * span + offsets, side='right') - 1
+        hit = keyed & (uniqkeys[codes] == keys) & (offsets >= 0) & (idx >= 0)
+        hit[hit] = combined[idx[hit]] // span == codes[hit]
+        return np.where(hit, pos[np.maximum(idx, 0)], -1)
+
+    def locations(self, seqs):
+        '''行序号转换为记录位置
+
+            Returns:
+                DataFrame格式，列为['File', 'Row', 'AirTime', ABSTTI_COL]，行序号为-1的记录File为空值，其他列为-1
+        '''
+        seqs = np.asarray(seqs, dtype=np.int64)
+        hit = seqs >= 0
+        valid = seqs[hit]
+        files = np.full(len(seqs), None, dtype=object)
+        files[hit] = np.asarray(self._filenames, dtype=object)[self._files[valid]]
+        rows = np.full(len(seqs), -1, dtype=np.int64)
+        rows[hit] = self._rows[valid]
+        ttis = np.full(len(seqs), -1, dtype=np.int64)
+        ttis[hit] = self._ttis[valid]
+        airtimes = np.full(len(seqs), -1, dtype=np.int64)
+        tti = ttis[hit] % TTI_PERIOD
+        airtimes[hit] = tti // 10 * 16 + tti % 10
+        return pd.DataFrame({'File': files, 'Row': rows, 'AirTime': airtimes, ABSTTI_COL: ttis})
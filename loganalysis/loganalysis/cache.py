@@ -0,0 +1,743 @@
+# coding=utf-8
+import json
+import os
+import os.path
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+from loganalysis.schema import apply_schema, record_group, schema_of
+from loganalysis.idstats import id_stats, may_contain
+from loganalysis.timeline import timeline_stats
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+class SidecarCache(object):
+    '''EI CSV文件的列式缓存
+
+        首次读取CSV文件时将其转换为Parquet格式的旁路文件，之后按列读取旁路文件。
+        旁路文件中记录源文件的大小、修改时间和类型规则版本，任一变化后自动重建。
+    '''
+
+    _META_KEY = b'loganalysis'
+
+    def __init__(self, directory, cache_dir=None, filetype=None):
+        '''初始化缓存实例
+
+           Args:
+               directory: Log所在目录
+               cache_dir: 缓存目录，如果为None，缓存到Log目录下的CACHE_DIRNAME目录
+               filetype: 文件类型，按schema_of得到的紧凑类型解析源文件
+        '''
+        if pq is None:
+            raise ImportError('列式缓存依赖pyarrow，请先安装pyarrow')
+        self._directory = directory
+        self._filetype = filetype
+        self._cache_dir = cache_dir if cache_dir else os.path.join(directory, CACHE_DIRNAME)
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def path(self, file):
+        '''旁路文件路径'''
+        return os.path.join(self._cache_dir, file.rsplit(r'.', 1)[0] + r'.parquet')
+
+    def _stamp(self, file):
+        '''源文件的大小、修改时间和类型规则版本'''
+        stat = os.stat(os.path.join(self._directory, file))
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'schema': EI_SCHEMA_VERSION}
+
+    def is_valid(self, file):
+        '''旁路文件是否存在且与源文件一致'''
+        path = self.path(file)
+        if not os.path.exists(path):
+            return False
+        try:
+            meta = pq.read_schema(path).metadata or {}
+        except (OSError, pa.ArrowInvalid):
+            return False
+        if self._META_KEY not in meta:
+            return False
+        return json.loads(meta[self._META_KEY].decode()) == self._stamp(file)
+
+    def _parse(self, file):
+        '''按紧凑类型解析源文件'''
+        filename = os.path.join(self._directory, file)
+        data = pd.read_csv(filename, na_values='-')
+        return apply_schema(data, schema_of(self._filetype, data.columns))
+
+    def _write(self, data, path, meta=None):
+        '''把数据写为Parquet文件，meta为附加到文件中的元数据{键: 可JSON序列化的值}'''
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        if meta:
+            schema_meta = dict(table.schema.metadata or {})
+            schema_meta.update({key: json.dumps(value).encode() for key, value in meta.items()})
+            table = table.replace_schema_metadata(schema_meta)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+        pq.write_table(table, tmppath, row_group_size=CACHE_ROW_GROUP_SIZE)
+        os.replace(tmppath, path)
+
+    def build(self, file):
+        '''由源文件生成旁路文件'''
+        stamp = self._stamp(file)
+        self._write(self._parse(file), self.path(file), {self._META_KEY: stamp})
+
+    @staticmethod
+    def _row_groups(pfile, start, end):
+        '''与行范围[start, end)有交集的row group，[(序号, 起始行号, 行数)]列表'''
+        groups = []
+        offset = 0
+        for idx in range(pfile.metadata.num_row_groups):
+            num = pfile.metadata.row_group(idx).num_rows
+            if offset < end and offset + num > start:
+                groups.append((idx, offset, num))
+            offset += num
+        return groups
+
+    @staticmethod
+    def _may_match(pfile, group, filters):
+        '''根据row group的统计信息(空值数、最小值、最大值)判断其中是否可能有满足filters的行'''
+        if not filters:
+            return True
+        meta = pfile.metadata.row_group(group)
+        names = pfile.schema_arrow.names
+        for col, vals in filters.items():
+            if col not in names:
+                continue
+            stats = meta.column(names.index(col)).statistics
+            if stats is None:
+                continue
+            vals = [val for val in vals if not pd.isna(val)]
+            if stats.null_count == meta.num_rows and len(vals) == len(filters[col]):
+                return False
+            if not stats.has_min_max:
+                continue
+            try:
+                if not any(stats.min <= val <= stats.max for val in vals):
+                    return False
+            except TypeError:
+                continue
+        return True
+
+    @staticmethod
+    def _filter_mask(table, filters):
+        '''计算arrow表中满足filters的行'''
+        mask = np.ones(table.num_rows, dtype=bool)
+        for col, vals in filters.items():
+            mask &= table.column(col).to_pandas().isin(vals).values
+        return mask
+
+    def _group_mask(self, pfile, group, offset, rows, filters):
+        '''只读取row group中的过滤列，计算行范围内满足filters的行，没有filters时返回None'''
+        if not filters:
+            return None
+        lo, hi = rows
+        table = pfile.read_row_group(group, columns=list(filters)).slice(lo - offset, hi - lo)
+        return self._filter_mask(table, filters)
+
+    @staticmethod
+    def _to_frame(table, start, mask):
+        '''arrow表转换为DataFrame，只转换mask选中的行，行索引为文件中的行号'''
+        if mask is None:
+            data = table.to_pandas()
+            data.index = pd.RangeIndex(start, start + len(data.index))
+            return data
+        data = table.filter(pa.array(mask)).to_pandas()
+        data.index = pd.Index(np.flatnonzero(mask) + start)
+        return data
+
+    @staticmethod
+    def _dense(data, dense):
+        '''只保留dense中至少一列非空的行'''
+        if dense is None:
+            return data
+        return data[data[dense].notna().any(axis=1).values]
+
+    @staticmethod
+    def _empty(pfile, cols):
+        '''没有数据时输出的空表'''
+        data = pfile.schema_arrow.empty_table().to_pandas()
+        return data if cols is None else data[cols]
+
+    def _read_range(self, path, cols, rows, filters=None):
+        '''读取Parquet文件中指定行范围的指定列，cols按文件中的列顺序输出
+
+            filters不为空时按row group的统计信息跳过不可能满足条件的row group，只输出满足条件的行
+        '''
+        if cols is not None:
+            # 与read_csv(usecols=...)一致，按文件中的列顺序输出
+            names = pq.read_schema(path).names
+            cols = [col for col in names if col in cols] + [col for col in cols if col not in names]
+        if rows is None and not filters:
+            return pd.read_parquet(path, columns=cols)
+
+        # 只读取与行范围有交集且可能满足条件的row group
+        pfile = pq.ParquetFile(path)
+        start, end = rows if rows is not None else (0, pfile.metadata.num_rows)
+        chunks = []
+        for group, offset, num in self._row_groups(pfile, start, end):
+            if not self._may_match(pfile, group, filters):
+                continue
+            lo, hi = max(start, offset), min(end, offset + num)
+            mask = self._group_mask(pfile, group, offset, (lo, hi), filters)
+            if mask is not None and not mask.any():
+                continue
+            table = pfile.read_row_group(group, columns=cols).slice(lo - offset, hi - lo)
+            chunks.append(self._to_frame(table, lo, mask))
+        if not chunks:
+            return self._empty(pfile, cols)
+        return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+    def read(self, file, cols=None, rows=None, dense=None, filters=None):
+        '''读取指定列，必要时先生成旁路文件
+
+            Args：
+                file: 文件名
+                cols: 列名列表，如果为None，表示获取全部列
+                rows: 行范围[start, end)，如果为None，表示读取全部行
+                dense: 列名列表，不为None时只输出其中至少一列非空的行
+                filters: 过滤条件，字典格式{'colname': [val1,]}，在读取时求值，只输出满足条件的行
+            Returns:
+                数据，DataFrame格式，行索引为文件中的行号
+        '''
+        if not self.is_valid(file):
+            self.build(file)
+        return self._dense(self._read_range(self.path(file), cols, rows, filters), dense)
+
+    def read_chunks(self, file, cols=None, rows=None, chunksize=CACHE_ROW_GROUP_SIZE, dense=None, filters=None):
+        '''按固定行数分块读取指定列，必要时先生成旁路文件
+
+            Args：
+                file: 文件名
+                cols: 列名列表，如果为None，表示获取全部列
+                rows: 行范围[start, end)，如果为None，表示读取全部行
+                chunksize: 每块的行数
+                dense: 列名列表，不为None时只输出其中至少一列非空的行
+                filters: 过滤条件，字典格式{'colname': [val1,]}，跳过不可能满足条件的row group和数据块
+            Yields:
+                数据块，DataFrame格式，行索引为文件中的行号
+        '''
+        if not self.is_valid(file):
+            self.build(file)
+        path = self.path(file)
+        pfile = pq.ParquetFile(path)
+        if cols is not None:
+            names = pfile.schema_arrow.names
+            cols = [col for col in names if col in cols] + [col for col in cols if col not in names]
+        start, end = rows if rows is not None else (0, pfile.metadata.num_rows)
+        empty = True
+        for group, offset, num in self._row_groups(pfile, start, end):
+            if not self._may_match(pfile, group, filters):
+                continue
+            lo, hi = max(start, offset), min(end, offset + num)
+            mask = self._group_mask(pfile, group, offset, (lo, hi), filters)
+            if mask is not None and not mask.any():
+                continue
+            for batch in pfile.iter_batches(batch_size=chunksize, row_groups=[group], columns=cols):
+                blo, bhi = max(lo, offset), min(hi, offset + batch.num_rows)
+                if blo < bhi:
+                    chunkmask = None if mask is None else mask[blo - lo:bhi - lo]
+                    if chunkmask is None or chunkmask.any():
+                        empty = False
+                        yield self._dense(self._to_frame(batch.slice(blo - offset, bhi - blo), blo, chunkmask), dense)
+                offset += batch.num_rows
+        if empty:
+            yield self._empty(pfile, cols)
+
+
+class SplitCache(SidecarCache):
+    '''按记录组拆分的列式缓存
+
+        EI文件的每一行通常只填写一个记录组(如SCHD.*、ACK.*、TB.*)，其余列为空。首次读取时把源文件拆分为
+        一张公共列表(AirTime、CellId、UEGID等没有结构名的列，包含全部行)和每个记录组一张子表，子表只保存
+        该组至少一列非空的行，并带有源文件中的行号。读取时只访问请求列所在的子表，按行号还原到源文件的行上；
+        指定dense时只输出子表中出现的行，不再构造整张稀疏表。
+    '''
+
+    _LAYOUT_KEY = b'loganalysis.split'
+    _ROW_COL = '_row'
+    _KEYS_TABLE = '_keys'
+
+    def __init__(self, directory, cache_dir=None, filetype=None):
+        super(SplitCache, self).__init__(directory, cache_dir, filetype)
+        self._layouts = {}
+
+    def path(self, file):
+        '''公共列表路径，各记录组的子表在同一目录下'''
+        return self._table_path(file, self._KEYS_TABLE)
+
+    def _table_path(self, file, table):
+        '''公共列表或记录组子表的路径'''
+        return os.path.join(self._cache_dir, file.rsplit(r'.', 1)[0] + r'.split', table + r'.parquet')
+
+    def _stamp(self, file):
+        '''源文件的大小、修改时间、类型规则版本和存储方式'''
+        stamp = super(SplitCache, self)._stamp(file)
+        stamp['layout'] = 'split'
+        return stamp
+
+    def build(self, file):
+        '''由源文件生成公共列表和各记录组的子表，公共列表最后写入，作为整体有效的标志'''
+        stamp = self._stamp(file)
+        data = self._parse(file)
+        rows = np.arange(len(data.index), dtype=np.int64)
+        groups = {}
+        for col in data.columns:
+            group = record_group(col)
+            if group is not None:
+                groups.setdefault(group, []).append(col)
+        for group, cols in groups.items():
+            mask = data[cols].notna().any(axis=1).values
+            sub = data.loc[mask, cols]
+            sub.insert(0, self._ROW_COL, rows[mask])
+            self._write(sub, self._table_path(file, group))
+        layout = {'columns': list(data.columns), 'groups': groups, 'rows': len(rows)}
+        keys = [col for col in data.columns if record_group(col) is None]
+        self._write(data[keys], self.path(file), {self._META_KEY: stamp, self._LAYOUT_KEY: layout})
+        self._layouts[file] = layout
+
+    def _layout(self, file):
+        '''文件的列顺序、各记录组的列和总行数，必要时先生成拆分后的表'''
+        if not self.is_valid(file):
+            self.build(file)
+        elif file not in self._layouts:
+            meta = pq.read_schema(self.path(file)).metadata
+            self._layouts[file] = json.loads(meta[self._LAYOUT_KEY].decode())
+        return self._layouts[file]
+
+    def _read_groups(self, file, cols, rows, filters=None):
+        '''读取行范围内请求列所在的记录组子表
+
+            filters中的每个条件只在其列所在的表(子表或公共列表)上求值，按row group统计信息跳过不满足条件的部分
+            Returns:
+                (按文件顺序排列的cols, 公共列表中的列, [(子表中的列, 子表)], 行范围, 满足filters的行号)，
+                子表的行索引为源文件中的行号，没有filters时行号为None
+        '''
+        layout = self._layout(file)
+        columns = layout['columns']
+        if cols is None:
+            cols = columns
+        else:
+            cols = [col for col in columns if col in cols] + [col for col in cols if col not in columns]
+        start, end = (0, layout['rows']) if rows is None else (rows[0], min(rows[1], layout['rows']))
+        end = max(start, end)
+
+        # 不属于任何子表的列(包括文件中不存在的列)从公共列表读取
+        groupcols = {}
+        for col in cols:
+            group = record_group(col)
+            if group in layout['groups'] and col in layout['groups'][group]:
+                groupcols.setdefault(group, []).append(col)
+        keycols = [col for col in cols if record_group(col) not in groupcols]
+
+        selected = None
+        for col, vals in (filters or {}).items():
+            group = record_group(col)
+            if group in layout['groups'] and col in layout['groups'][group]:
+                hits = self._read_range(self._table_path(file, group), [self._ROW_COL], None, {col: vals})
+                hits = hits[self._ROW_COL].values
+                hits = hits[(hits >= start) & (hits < end)]
+            else:
+                hits = self._read_range(self.path(file), [col], (start, end), {col: vals}).index.values
+            selected = hits if selected is None else np.intersect1d(selected, hits, assume_unique=True)
+
+        subs = []
+        for group, gcols in groupcols.items():
+            sub = pq.read_table(self._table_path(file, group), columns=[self._ROW_COL] + gcols,
+                                filters=[(self._ROW_COL, '>=', start), (self._ROW_COL, '<', end)]).to_pandas()
+            sub = sub.set_index(self._ROW_COL)
+            if selected is not None:
+                sub = sub[np.isin(sub.index.values, selected)]
+            subs.append((gcols, sub))
+        return cols, keycols, subs, (start, end), selected
+
+    def _assemble(self, file, cols, keycols, subs, rows, dense, selected=None):
+        '''按行号把公共列和子表还原到源文件的行上
+
+            dense不为None时只保留其所在子表中出现的行，selected不为None时只保留其中的行
+        '''
+        start, end = rows
+        index = pd.RangeIndex(start, end)
+        if dense is not None:
+            index = pd.Index(np.unique(np.concatenate(
+                [np.array([], dtype=np.int64)] + [sub.index.values for gcols, sub in subs if set(gcols) & set(dense)])))
+        if selected is not None:
+            index = pd.Index(np.intersect1d(index.values, selected, assume_unique=True))
+        if not keycols:
+            keys = pd.DataFrame(index=index)
+        elif isinstance(index, pd.RangeIndex):
+            keys = self._read_range(self.path(file), keycols, rows)
+        elif len(index):
+            # 只读取覆盖所选行的row group
+            first = int(index.values[0])
+            keys = self._read_range(self.path(file), keycols, (first, int(index.values[-1]) + 1))
+            keys = keys.iloc[index.values - first]
+        else:
+            keys = self._read_range(self.path(file), keycols, (start, start))
+        data = pd.concat([keys] + [sub.reindex(index) for _, sub in subs], axis=1)[cols]
+        data.index = index
+        return self._dense(data, dense)
+
+    def read(self, file, cols=None, rows=None, dense=None, filters=None):
+        '''读取指定列，只访问请求列所在的记录组子表
+
+            Args：
+                file: 文件名
+                cols: 列名列表，如果为None，表示获取全部列
+                rows: 行范围[start, end)，如果为None，表示读取全部行
+                dense: 列名列表，不为None时只输出其中至少一列非空的行，只构造这些列所在子表中出现的行
+                filters: 过滤条件，字典格式{'colname': [val1,]}，在读取时求值，只输出满足条件的行
+            Returns:
+                数据，DataFrame格式，行索引为文件中的行号
+        '''
+        cols, keycols, subs, rows, selected = self._read_groups(file, cols, rows, filters)
+        return self._assemble(file, cols, keycols, subs, rows, dense, selected)
+
+    def read_chunks(self, file, cols=None, rows=None, chunksize=CACHE_ROW_GROUP_SIZE, dense=None, filters=None):
+        '''按固定行数分块读取指定列，子表只读取一次，公共列表按块读取
+
+            Args：
+                file: 文件名
+                cols: 列名列表，如果为None，表示获取全部列
+                rows: 行范围[start, end)，如果为None，表示读取全部行
+                chunksize: 每块的行数，按源文件的行数计算
+                dense: 列名列表，不为None时只输出其中至少一列非空的行
+                filters: 过滤条件，字典格式{'colname': [val1,]}，跳过没有满足条件的行的数据块
+            Yields:
+                数据块，DataFrame格式，行索引为文件中的行号
+        '''
+        cols, keycols, subs, (start, end), selected = self._read_groups(file, cols, rows, filters)
+        empty = True
+        for lo in range(start, end, chunksize):
+            hi = min(lo + chunksize, end)
+            chunksel = None
+            if selected is not None:
+                chunksel = selected[np.searchsorted(selected, lo):np.searchsorted(selected, hi)]
+                if 0 == len(chunksel):
+                    continue
+            chunks = [(gcols, sub.iloc[np.searchsorted(sub.index.values, lo):np.searchsorted(sub.index.values, hi)])
+                      for gcols, sub in subs]
+            empty = False
+            yield self._assemble(file, cols, keycols, chunks, (lo, hi), dense, chunksel)
+        if empty:
+            yield self._assemble(file, cols, keycols, [(gcols, sub.iloc[:0]) for gcols, sub in subs], (start, start),
+                                 dense, selected)
+
+
+class FileIndex(object):
+    '''Log目录的文件元数据索引
+
+        按文件名记录每个文件的大小、修改时间、表头，以及按ID列(如CellId, UEGID)分组的行数、
+        首末行位置、首末AirTime和LocalTime，以及文件内的时间轴(翻转位置和TTI标记)。
+        对INDEX_ID_COLS中的ID列记录取值摘要(文件级去重取值和最小/最大值，分块的最小/最大值和布隆过滤器)，
+        用于跳过不包含指定ID的文件和数据块。
+        每INDEX_OFFSET_ROWS个数据行记录一次行首的字节位置，读取CSV的行范围时从最近的位置开始解析。
+        索引持久化在缓存目录下，源文件变化后自动重建对应条目。
+        另外为每个文件建立ID列取值到行号的倒排表，单独存放为npz文件，用于只读取指定小区/UE的行。
+        由多个文件推导出的结果(如小区上下行配比)按名称缓存，所依赖的文件变化后重新计算。
+    '''
+
+    _FILENAME = 'index.json'
+    _DERIVED_FILENAME = 'derived.json'
+    _ROWS_SUFFIX = '.rows.npz'
+    _OFFSET_BLOCK_BYTES = 16 * 1024 * 1024
+    _VERSION = 4
+    _STAT_COLS = ['rows', 'first_row', 'last_row', 'first_airtime', 'last_airtime',
+                  'first_localtime', 'last_localtime']
+
+    def __init__(self, directory, cache_dir=None):
+        '''初始化索引实例
+
+           Args:
+               directory: Log所在目录
+               cache_dir: 索引目录，如果为None，存放到Log目录下的CACHE_DIRNAME目录
+        '''
+        self._directory = directory
+        self._cache_dir = cache_dir if cache_dir else os.path.join(directory, CACHE_DIRNAME)
+        self._entries = {}
+        self._inverted = {}
+        self._dirty = False
+        try:
+            with open(self.path, 'r') as fp:
+                self._entries = json.load(fp)
+        except (OSError, ValueError):
+            self._entries = {}
+        try:
+            with open(os.path.join(self._cache_dir, self._DERIVED_FILENAME), 'r') as fp:
+                self._derived = json.load(fp)
+        except (OSError, ValueError):
+            self._derived = {}
+
+    @property
+    def path(self):
+        return os.path.join(self._cache_dir, self._FILENAME)
+
+    def _stamp(self, file):
+        '''源文件的大小和修改时间'''
+        stat = os.stat(os.path.join(self._directory, file))
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def entry(self, file, keycols, reader):
+        '''获取文件的索引条目，不存在或已过期时重建
+
+            Args：
+                file: 文件名
+                keycols: 分组统计的ID列名列表
+                reader: 读取函数，reader(file, cols)返回DataFrame
+            Returns:
+                索引条目，字典格式
+        '''
+        stamp = self._stamp(file)
+        entry = self._entries.get(file)
+        if entry and entry.get('version') == self._VERSION and entry['size'] == stamp['size'] \
+                and entry['mtime'] == stamp['mtime'] and entry['keys'] == list(keycols):
+            return entry
+
+        columns = list(pd.read_csv(os.path.join(self._directory, file), na_values='-', nrows=0).columns)
+        keys = [col for col in keycols if col in columns]
+        idcols = [col for col in INDEX_ID_COLS if col in columns]
+        data = reader(file, list(dict.fromkeys(['LocalTime', 'AirTime'] + keys + idcols)))
+        rows = np.arange(len(data.index))
+        if keys:
+            grouped = data[keys].assign(_row=rows).groupby(keys, dropna=False, sort=False)['_row']
+            stats = grouped.agg(['size', 'min', 'max']).reset_index()
+        else:
+            stats = pd.DataFrame({'size': [len(rows)], 'min': [0], 'max': [len(rows) - 1]})
+            stats = stats[stats['size'] > 0]
+        groups = pd.DataFrame({col: stats[col] if col in keys else np.nan for col in keycols}, index=stats.index)
+        groups['rows'] = stats['size']
+        groups['first_row'] = stats['min']
+        groups['last_row'] = stats['max']
+        for col, name in [('AirTime', 'airtime'), ('LocalTime', 'localtime')]:
+            groups['first_' + name] = data[col].values[stats['min'].values]
+            groups['last_' + name] = data[col].values[stats['max'].values]
+
+        entry = dict(stamp)
+        entry['version'] = self._VERSION
+        entry['columns'] = columns
+        entry['rows'] = len(rows)
+        entry['keys'] = list(keycols)
+        # 文件内的时间轴，用于计算绝对TTI以及按时间定位行范围
+        entry['timeline'] = timeline_stats(data['AirTime'].values)
+        entry['groups'] = {col: groups[col].tolist() for col in list(keycols) + self._STAT_COLS}
+        entry['ids'] = {col: id_stats(data[col].to_numpy(dtype=np.float64, na_value=np.nan)) for col in idcols}
+        entry['offsets'] = self._row_offsets(os.path.join(self._directory, file), len(rows))
+        self._entries[file] = entry
+        self._dirty = True
+        self._build_rows(file, data, keys, keycols, stamp)
+        return entry
+
+    @classmethod
+    def _row_offsets(cls, filename, rows, stride=INDEX_OFFSET_ROWS):
+        '''CSV文件第0, stride, 2*stride...个数据行行首的字节位置
+
+            文件中有引号或空行时，文本行与解析出的数据行可能不一一对应，此时不记录位置
+            Args：
+                filename: 文件路径
+                rows: 解析出的数据行数
+                stride: 记录位置的行间隔
+            Returns:
+                {'stride': stride, 'positions': 字节位置列表}，不能按文本行定位时为None
+        '''
+        positions = []
+        newlines = 0
+        base = 0
+        last = b''
+        with open(filename, 'rb') as fp:
+            while True:
+                block = fp.read(cls._OFFSET_BLOCK_BYTES)
+                if not block:
+                    break
+                if b'"' in block:
+                    return None
+                ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+                # 第k个换行符之后是第k个数据行(第0个换行符结束表头)
+                marks = (newlines + np.arange(len(ends))) % stride == 0
+                positions.extend((base + ends[marks] + 1).tolist())
+                newlines += len(ends)
+                base += len(block)
+                last = block[-1:]
+        lines = newlines + (1 if last and last != b'\n' else 0)
+        if lines - 1 != rows:
+            return None
+        return {'stride': stride, 'positions': positions[:-(-rows // stride)]}
+
+    def _rows_path(self, file):
+        '''倒排表文件路径'''
+        return os.path.join(self._cache_dir, file.rsplit(r'.', 1)[0] + self._ROWS_SUFFIX)
+
+    def _build_rows(self, file, data, keys, keycols, stamp):
+        '''建立ID列取值到行号的倒排表，按分组依次存放各组的行号
+
+            Args：
+                file: 文件名
+                data: 包含keys列的数据
+                keys: 文件中存在的ID列
+                keycols: 分组统计的ID列名列表
+                stamp: 源文件的大小和修改时间
+        '''
+        rows = len(data.index)
+        if keys and rows:
+            codes = data[keys].groupby(keys, dropna=False, sort=False).ngroup().values
+        else:
+            codes = np.zeros(rows, dtype=np.int64)
+        order = np.argsort(codes, kind='stable').astype(np.int32 if rows < 2**31 else np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes))]).astype(np.int64)
+        first = order[offsets[:-1]]
+        values = np.empty((len(first), len(keycols)))
+        for idx, col in enumerate(keycols):
+            values[:, idx] = data[col].values[first] if col in keys else np.nan
+        inverted = {'keycols': np.array(keycols, dtype=str), 'values': values, 'offsets': offsets, 'rows': order,
+                    'stamp': np.array([stamp['size'], stamp['mtime']], dtype=np.int64)}
+        self._inverted[file] = inverted
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            path = self._rows_path(file)
+            tmppath = '{path}.{pid}.tmp.npz'.format(path=path, pid=os.getpid())
+            np.savez(tmppath, **inverted)
+            os.replace(tmppath, path)
+        except OSError:
+            pass
+
+    def _load_rows(self, file, keycols, stamp):
+        '''读取与源文件一致的倒排表，不存在或已过期时返回None'''
+        inverted = self._inverted.get(file)
+        if inverted is None:
+            try:
+                with np.load(self._rows_path(file)) as npz:
+                    inverted = {name: npz[name] for name in npz.files}
+            except (OSError, ValueError):
+                return None
+        if inverted['stamp'].tolist() != [stamp['size'], stamp['mtime']] \
+                or inverted['keycols'].tolist() != list(keycols):
+            return None
+        self._inverted[file] = inverted
+        return inverted
+
+    def rows_of_ids(self, file, keycols, id_filter, reader):
+        '''获取文件中ID列取值满足id_filter的行号
+
+            Args：
+                file: 文件名
+                keycols: 分组统计的ID列名列表
+                id_filter: ID过滤条件，字典格式{'colname': [val1,]}，列名必须属于keycols
+                reader: 读取函数，reader(file, cols)返回DataFrame
+            Returns:
+                升序排列的行号数组
+        '''
+        stamp = self._stamp(file)
+        inverted = self._load_rows(file, keycols, stamp)
+        if inverted is None:
+            entry = self.entry(file, keycols, reader)
+            inverted = self._load_rows(file, keycols, stamp)
+            if inverted is None:
+                keys = [col for col in keycols if col in entry['columns']]
+                self._build_rows(file, reader(file, keys), keys, keycols, stamp)
+                inverted = self._inverted[file]
+
+        mask = np.ones(len(inverted['values']), dtype=bool)
+        for col, vals in id_filter.items():
+            mask &= np.isin(inverted['values'][:, list(keycols).index(col)], vals)
+        offsets = inverted['offsets']
+        rows = [inverted['rows'][offsets[idx]:offsets[idx+1]] for idx in np.flatnonzero(mask)]
+        if not rows:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(rows))
+
+    def candidate_spans(self, file, keycols, filters, reader):
+        '''根据ID列的取值摘要选择可能包含满足filters的行的行范围
+
+            Args：
+                file: 文件名
+                keycols: 分组统计的ID列名列表
+                filters: 过滤条件，字典格式{'colname': [val1,]}，只使用其中有取值摘要的列
+                reader: 读取函数，reader(file, cols)返回DataFrame
+            Returns:
+                升序排列的行范围[(start, end), ]列表，为空时文件中没有满足条件的行；没有可用的摘要时返回None
+        '''
+        entry = self.entry(file, keycols, reader)
+        ids = entry.get('ids', {})
+        chunks = None
+        for col, vals in (filters or {}).items():
+            if col not in ids:
+                continue
+            hit = may_contain(ids[col], vals)
+            chunks = hit if chunks is None else chunks & hit
+        if chunks is None:
+            return None
+        chunk_rows = INDEX_ID_CHUNK_ROWS if not ids else next(iter(ids.values()))['chunk_rows']
+        idx = np.flatnonzero(chunks)
+        if 0 == len(idx):
+            return []
+        breaks = np.flatnonzero(np.diff(idx) > 1)
+        starts = np.concatenate([[idx[0]], idx[breaks + 1]])
+        ends = np.concatenate([idx[breaks], [idx[-1]]]) + 1
+        return [(int(start) * chunk_rows, min(int(end) * chunk_rows, entry['rows'])) for start, end in zip(starts, ends)]
+
+    def groups(self, file, keycols, reader):
+        '''获取文件按ID列分组的统计信息
+
+            Returns:
+                DataFrame格式，列为ID列以及rows, first_row, last_row, first/last_airtime,
+                first/last_localtime
+        '''
+        entry = self.entry(file, keycols, reader)
+        return pd.DataFrame(entry['groups'], columns=list(keycols) + self._STAT_COLS)
+
+    def timeline(self, file, keycols, reader):
+        '''获取文件的时间轴信息
+
+            Returns:
+                timeline_stats的结果，字典格式
+        '''
+        return self.entry(file, keycols, reader)['timeline']
+
+    def row_offsets(self, file, keycols, reader):
+        '''获取CSV文件按行间隔记录的行首字节位置
+
+            Returns:
+                {'stride': 行间隔, 'positions': 字节位置列表}，不能按文本行定位时为None
+        '''
+        return self.entry(file, keycols, reader)['offsets']
+
+    def derived(self, name, files, compute):
+        '''获取由多个文件推导出的结果，缓存不存在或所依赖的文件变化时重新计算
+
+            Args：
+                name: 结果名称
+                files: 所依赖的文件名列表
+                compute: 计算函数，compute()返回可JSON序列化的结果
+            Returns:
+                推导结果
+        '''
+        stamps = {file: self._stamp(file) for file in files}
+        cached = self._derived.get(name)
+        if cached and cached['files'] == stamps:
+            return cached['value']
+        value = compute()
+        self._derived[name] = {'files': stamps, 'value': value}
+        self._dirty = True
+        return value
+
+    def save(self):
+        '''索引有变化时写回磁盘，目录不可写时忽略'''
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            for filename, content in [(self._FILENAME, self._entries), (self._DERIVED_FILENAME, self._derived)]:
+                path = os.path.join(self._cache_dir, filename)
+                tmppath = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+                with open(tmppath, 'w') as fp:
+                    json.dump(content, fp)
+                os.replace(tmppath, path)
+            self._dirty = False
+        except OSError:
+            pass
@@ -4,12 +4,46 @@
 ########################################################################################################################
 
 # 聚合函数
-AGG_FUNC = ('sum', 'mean', 'max', 'min', 'count')
+AGG_FUNC = ('sum', 'mean', 'max', 'min', 'count', 'std')
 AGG_FUNC_SUM = AGG_FUNC[0]
 AGG_FUNC_MEAN = AGG_FUNC[1]
 AGG_FUNC_CNT = AGG_FUNC[4]
 AGG_FUNC_MIN = AGG_FUNC[3]
 AGG_FUNC_MAX = AGG_FUNC[2]
+AGG_FUNC_STD = AGG_FUNC[5]
+
+# 列式缓存
+CACHE_DIRNAME = '.loganalysis'
+CACHE_ROW_GROUP_SIZE = 65536
+
+# 后台预读：默认预读的数据块个数和已缓冲数据块的内存上限(字节)
+PREFETCH_DEPTH = 2
+PREFETCH_MAX_BYTES = 512 * 1024 * 1024
+
+# 文件索引中每INDEX_OFFSET_ROWS个数据行记录一次CSV行首的字节位置，读取行范围时seek到最近的位置再解析
+INDEX_OFFSET_ROWS = 4096
+
+# 流式匹配允许的时间乱序范围(16进制空口时间，16帧)
+JOIN_TIME_SLACK = 0x100
+
+# 绝对时间轴：空口帧号按AIRTIME_FRAME_WRAP翻转，翻转周期为TTI_PERIOD个TTI
+AIRTIME_FRAME_WRAP = 0x10000000
+TTI_PERIOD = AIRTIME_FRAME_WRAP * 10
+ABSTTI_COL = 'AbsTti'
+TIMELINE_MARK_STRIDE = 4096
+
+# 文件索引中建立取值摘要的ID列：每个文件记录去重取值和最小/最大值，每INDEX_ID_CHUNK_ROWS行记录最小/最大值和布隆过滤器
+INDEX_ID_COLS = ['CellId', 'UEGID', 'NodeID', 'NBRID']
+INDEX_ID_CHUNK_ROWS = 4096
+INDEX_ID_MAX_VALUES = 1024
+INDEX_BLOOM_BITS = 512
+INDEX_BLOOM_HASHES = 3
+
+# EI字段名前缀(如SCHD.u8RbNum中的u8)对应的紧凑类型，可空整数类型兼容'-'表示的空值，as16等数组字段同样适用
+EI_FIELD_DTYPES = {'u8': 'UInt8', 'u16': 'UInt16', 'u32': 'UInt32', 'u64': 'UInt64', 'b8': 'UInt8',
+                   's8': 'Int8', 's16': 'Int16', 's32': 'Int32', 's64': 'Int64'}
+# 类型规则变化时递增，使列式缓存重建
+EI_SCHEMA_VERSION = 1
 
 
 ########################################################################################################################
@@ -23,6 +57,9 @@ LTE_SCHD_FAIL_RSNS = ('cce_input_param', 'cce_not_enough', 'cce_position_collisi
                       'pre_cnt_over', 'ccch_schd_timeover', 'fbd_schd', 'msg0_num_over', 'preamble_id_err',
                       'msg0_alloc_cce_fail', 'cce_alloc_fail', 'retx_occupy_rb_fail', 'pttgap', 'other')
 
+# 批量推测的调度失败原因，排在LTE_SCHD_FAIL_RSNS之后
+LTE_SCHD_FAIL_INFER_RSNS = ('no_schd_context', 'no_bsr', 'bsr_after_schd', 'rlc_bsr_zero', 'manual')
+
 # LTE文件类型
 LTE_FILE_TYPES = ('RTL2_ulUeTtiInfo', 'RTL2_dlUeTtiInfo', 'RTL2_CellTtiInfo',
                   'Cell0DLPHYUERunInfo', 'Cell1DLPHYUERunInfo', 'Cell2DLPHYUERunInfo',
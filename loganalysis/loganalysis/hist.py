@@ -0,0 +1,25 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+
+
+def hist2d(keys, values):
+    '''按行键统计各取值出现的次数
+
+        等价于values.groupby(keys).value_counts().unstack(fill_value=0)，但使用整数编码和bincount计数，
+        没有逐组的Python调用。结果为整数次数，多个数据块的结果可以用DataFrame.add(fill_value=0)精确合并。
+        Args:
+            keys: 行键(如时间粒度)，Series或数组
+            values: 待统计的值，Series或数组，与keys等长
+        Returns:
+            DataFrame格式，行为行键，列为取值，均升序排列；keys或values为空值的记录不计数
+    '''
+    key_arr = np.asarray(keys)
+    val_arr = np.asarray(values)
+    valid = ~(pd.isna(key_arr) | pd.isna(val_arr))
+    key_uniq, key_codes = np.unique(key_arr[valid], return_inverse=True)
+    val_uniq, val_codes = np.unique(val_arr[valid], return_inverse=True)
+    counts = np.bincount(key_codes * len(val_uniq) + val_codes, minlength=len(key_uniq) * len(val_uniq))
+    return pd.DataFrame(counts.reshape(len(key_uniq), len(val_uniq)),
+                        index=pd.Index(key_uniq, name=getattr(keys, 'name', None)),
+                        columns=pd.Index(val_uniq, name=getattr(values, 'name', None)))
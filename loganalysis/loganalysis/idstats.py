@@ -0,0 +1,90 @@
+# coding=utf-8
+import numpy as np
+from loganalysis.const import *
+
+# 布隆过滤器各哈希函数的乘数(64位黄金分割常数的奇数变体)
+_BLOOM_SEEDS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93],
+                        dtype=np.uint64)[:INDEX_BLOOM_HASHES]
+
+
+def _bloom_bits(values):
+    '''ID取值在布隆过滤器中对应的位，返回(取值数, 哈希数)数组'''
+    values = np.asarray(values).astype(np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        hashed = values[:, None] * _BLOOM_SEEDS[None, :]
+    return (hashed >> np.uint64(32)) % np.uint64(INDEX_BLOOM_BITS)
+
+
+def id_stats(values, chunk_rows=INDEX_ID_CHUNK_ROWS):
+    '''统计单个文件中一个ID列的取值摘要，可JSON序列化
+
+        Args:
+            values: 文件中按行排列的ID列取值，可以有空值
+            chunk_rows: 分块统计的行数
+        Returns:
+            字典，包括去重取值(超过INDEX_ID_MAX_VALUES个时为None)、最小/最大值，
+            以及每chunk_rows行的最小/最大值(没有取值的块为None)和十六进制编码的布隆过滤器
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    num = len(values)
+    nchunks = -(-num // chunk_rows)
+    valid = ~np.isnan(values)
+    uniqs = np.unique(values[valid]).astype(np.int64)
+    stats = {'chunk_rows': chunk_rows,
+             'values': uniqs.tolist() if len(uniqs) <= INDEX_ID_MAX_VALUES else None,
+             'min': int(uniqs[0]) if len(uniqs) else None, 'max': int(uniqs[-1]) if len(uniqs) else None,
+             'chunk_min': [None] * nchunks, 'chunk_max': [None] * nchunks}
+
+    words = INDEX_BLOOM_BITS // 64
+    blooms = np.zeros((nchunks, words), dtype=np.uint64)
+    rows = np.flatnonzero(valid)
+    if len(rows):
+        chunks = rows // chunk_rows
+        vals = values[rows].astype(np.int64)
+        present = np.unique(chunks)
+        starts = np.searchsorted(chunks, present)
+        for chunk, lo, mn, mx in zip(present, starts, np.minimum.reduceat(vals, starts),
+                                     np.maximum.reduceat(vals, starts)):
+            stats['chunk_min'][chunk] = int(mn)
+            stats['chunk_max'][chunk] = int(mx)
+        bits = _bloom_bits(vals)
+        for idx in range(bits.shape[1]):
+            np.bitwise_or.at(blooms, (chunks, (bits[:, idx] // np.uint64(64)).astype(np.int64)),
+                             np.uint64(1) << (bits[:, idx] % np.uint64(64)))
+    stats['chunk_bloom'] = [''.join('{:016x}'.format(int(word)) for word in bloom) for bloom in blooms]
+    return stats
+
+
+def may_contain(stats, vals):
+    '''根据取值摘要判断文件及其各数据块是否可能包含vals中的取值
+
+        Args:
+            stats: id_stats的结果
+            vals: 待查找的ID取值列表
+        Returns:
+            每个数据块是否可能包含的bool数组；文件中一定不包含时全为False
+    '''
+    nchunks = len(stats['chunk_min'])
+    vals = np.unique(np.asarray([val for val in vals if val == val], dtype=np.int64))
+    if stats['values'] is not None:
+        vals = vals[np.isin(vals, stats['values'])]
+    elif stats['min'] is not None:
+        vals = vals[(vals >= stats['min']) & (vals <= stats['max'])]
+    if 0 == len(vals) or stats['min'] is None:
+        return np.zeros(nchunks, dtype=bool)
+
+    present = np.array([mn is not None for mn in stats['chunk_min']])
+    mins = np.array([mn if mn is not None else 0 for mn in stats['chunk_min']], dtype=np.int64)
+    maxs = np.array([mx if mx is not None else -1 for mx in stats['chunk_max']], dtype=np.int64)
+    inrange = present[:, None] & (mins[:, None] <= vals[None, :]) & (vals[None, :] <= maxs[:, None])
+
+    words = INDEX_BLOOM_BITS // 64
+    blooms = np.array([[int(bloom[idx*16:(idx+1)*16], 16) for idx in range(words)] for bloom in stats['chunk_bloom']],
+                      dtype=np.uint64).reshape(nchunks, words)
+    bits = _bloom_bits(vals)
+    hit = inrange
+    for idx in range(bits.shape[1]):
+        word = (bits[:, idx] // np.uint64(64)).astype(np.int64)
+        mask = np.uint64(1) << (bits[:, idx] % np.uint64(64))
+        hit = hit & ((blooms[:, word] & mask[None, :]) != 0)
+    return hit.any(axis=1)
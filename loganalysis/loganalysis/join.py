@@ -0,0 +1,178 @@
+# coding=utf-8
+from collections import deque
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+
+
+def keys_of(data):
+    '''将各列转为MultiIndex，便于按哈希判断是否存在'''
+    return pd.MultiIndex.from_arrays([data[col].values.astype(np.int64) for col in data.columns])
+
+
+class StreamJoin(object):
+    '''按时间有序的流式匹配
+
+        右侧Log(如PHY Log)和左侧Log(如调度Log)都在同一次共享扫描中读取：右侧数据块由扫描送入缓冲区，
+        左侧数据块在右侧数据覆盖其时间范围(或右侧扫描结束)之后才交给处理函数，处理函数中用unmatched查询。
+        缓冲区只保留各左侧Log当前位置之后仍可能被匹配的右侧记录，多个查询可以共用同一个右侧Log的StreamJoin。
+        时间列允许JOIN_TIME_SLACK以内的乱序。两侧的空口时间都换算为不翻转的TTI数后再比较，
+        取与最近处理的时间最接近的翻转周期，因此可以跨过空口帧号的翻转点。
+        用法：
+            join = StreamJoin(phycols).attach(scan, phylog)
+            join.add_left(scan, schdlog, schdcols, func)
+            func(schddata)中调用join.unmatched(schdcols, schddata)
+    '''
+
+    def __init__(self, cols, slack=JOIN_TIME_SLACK):
+        '''初始化流式匹配
+
+            Args:
+                cols: 右侧需要读取的列，第一列为时间列
+                slack: 允许的时间乱序范围
+        '''
+        self._cols = cols
+        self._slack = slack // 16 * 10 + slack % 16
+        self._ref = None
+        self._chunks = []
+        self._first = None
+        self._last = None
+        self._finished = False
+        self._queue = deque()
+        self._positions = {}
+
+    def _unwrap(self, airtime):
+        '''16进制空口时间数组转换为不翻转的TTI数，取与最近处理的时间最接近的翻转周期'''
+        airtime = np.asarray(airtime).astype(np.int64)
+        tti = airtime // 16 * 10 + airtime % 16
+        if self._ref is None:
+            self._ref = int(tti[0])
+        tti = tti + np.rint((self._ref - tti) / TTI_PERIOD).astype(np.int64) * TTI_PERIOD
+        self._ref = max(self._ref, int(tti.max()))
+        return tti
+
+    def _ttis(self, data, timecol):
+        '''数据块中时间列非空的行及其TTI数'''
+        airtime = data[timecol].to_numpy(dtype=np.float64, na_value=np.nan)
+        known = ~np.isnan(airtime)
+        return known, self._unwrap(airtime[known]) if known.any() else None
+
+    def attach(self, scan, logfile):
+        '''在共享扫描中登记右侧Log
+
+            Args:
+                scan: SharedScan实例
+                logfile: 右侧LogFile实例
+            Returns:
+                self
+        '''
+        scan.add(logfile, self._cols, self._feed, finish=self._finish)
+        return self
+
+    def add_left(self, scan, logfile, cols, func, val_filter=None):
+        '''在共享扫描中登记左侧Log
+
+            Args:
+                scan: SharedScan实例
+                logfile: 左侧LogFile实例
+                cols: 左侧需要读取的列，第一列为时间列
+                func: 处理函数，func(data)，data为按cols和val_filter选取的数据块，调用时右侧数据已覆盖其时间范围
+                val_filter: 过滤条件，字典格式{'colname': [val1,]}
+            Returns:
+                无
+        '''
+        source = object()
+        self._positions[source] = None
+        totcols = list(dict.fromkeys(cols + list(val_filter or {})))
+        scan.add(logfile, totcols, lambda data: self._submit(source, cols, val_filter, func, data),
+                 finish=lambda: self._close(source))
+
+    def _feed(self, data):
+        '''接收右侧数据块'''
+        known, tti = self._ttis(data, self._cols[0])
+        if tti is None:
+            return
+        if self._first is None:
+            self._first = tti.min()
+        self._last = tti.max() if self._last is None else max(self._last, tti.max())
+        self._chunks.append(data[known].assign(_tti=tti))
+        self._process()
+
+    def _finish(self):
+        '''右侧Log扫描结束'''
+        self._finished = True
+        self._process()
+
+    def _submit(self, source, cols, val_filter, func, data):
+        '''接收左侧数据块，按过滤条件选取后排队等待右侧数据覆盖其时间范围'''
+        known, tti = self._ttis(data, cols[0])
+        if tti is None:
+            return
+        # 左侧Log的当前位置，之后的数据块不早于该位置(允许乱序)
+        position = self._positions[source]
+        self._positions[source] = tti.min() if position is None else max(position, tti.min())
+        if val_filter:
+            selected = data[list(val_filter.keys())].isin(val_filter).all(axis=1).values
+            data = data[selected]
+            tti = tti[selected[known]]
+        if len(tti):
+            self._queue.append((tti.min(), tti.max(), func, data[cols]))
+        self._process()
+
+    def _close(self, source):
+        '''左侧Log扫描结束'''
+        del self._positions[source]
+        self._process()
+
+    def _process(self):
+        '''处理右侧数据已覆盖的左侧数据块，并丢弃不再需要的右侧记录'''
+        while self._queue:
+            start, end, func, data = self._queue[0]
+            if not self._finished and (self._last is None or self._last <= end + self._slack):
+                break
+            self._queue.popleft()
+            func(data)
+
+        starts = [start for start, _, _, _ in self._queue]
+        if None in self._positions.values():
+            return
+        starts.extend(self._positions.values())
+        if not starts:
+            if self._finished:
+                self._chunks = []
+            return
+        bound = min(starts) - self._slack
+        chunks = [chunk for chunk in self._chunks if chunk['_tti'].values.max() >= bound]
+        if chunks and chunks[0]['_tti'].values.min() < bound:
+            chunks[0] = chunks[0][chunks[0]['_tti'].values >= bound]
+        self._chunks = chunks
+
+    def unmatched(self, leftcols, leftdata, cols=None):
+        '''查找左侧数据块中在右侧没有对应记录的行，在add_left登记的处理函数中调用
+
+            只比较右侧Log时间范围以内的记录，超出范围的左侧记录不计入结果
+            Args:
+                leftcols: 左侧的匹配列，第一列为时间列
+                leftdata: 左侧数据块
+                cols: 右侧的匹配列，与leftcols按位置对应，为None时使用初始化时的全部列
+            Returns:
+                不匹配记录的行索引
+        '''
+        cols = self._cols if cols is None else cols
+        known, tti = self._ttis(leftdata, leftcols[0])
+        if tti is None or self._first is None:
+            return leftdata.index[:0]
+
+        inrange = np.zeros(len(leftdata.index), dtype=bool)
+        inrange[known] = (tti >= self._first) & (tti <= self._last)
+        leftdata = leftdata[inrange]
+        valid = leftdata[leftcols].notna().all(axis=1).values
+        mismatch = ~valid
+        if valid.any() and self._chunks:
+            if len(self._chunks) > 1:
+                self._chunks = [pd.concat(self._chunks)]
+            matchdata = self._chunks[0][cols].dropna(how='any')
+            mismatch[valid] = ~keys_of(leftdata.loc[valid, leftcols]).isin(keys_of(matchdata))
+        elif valid.any():
+            mismatch[:] = True
+        return leftdata.index[mismatch]
@@ -1,10 +1,19 @@
 # coding=utf-8
 import os
 import os.path
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from loganalysis.const import *
+from loganalysis.accumulator import Accumulator
+from loganalysis.asof import AsofIndex
+from loganalysis.cache import SidecarCache, SplitCache, FileIndex
+from loganalysis.hist import hist2d
+from loganalysis.prefetch import Prefetcher
+from loganalysis.schema import apply_schema, record_group, schema_of
+from loganalysis.timeline import Timeline, timeline_stats
 
 
 class Log(object):
@@ -17,18 +26,34 @@ class Log(object):
         要求所有文件命名符合EI命名格式：子系统_时间.csv
     '''
 
-    def __init__(self, directory, time_interval=None, product_type='Micro'):
+    def __init__(self, directory, time_interval=None, product_type='Micro', cache=False, index=True,
+                 chunksize=None, workers=None, prefetch=None):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                directory: Log所在目录
                time_interval: 时间范围[start, end],格式为yyyymmddhhmmss
                product_type:产品类型['Macro', 'Micro']，默认为micro
+               cache: 列式缓存，False不缓存，True缓存到Log目录下，也可以直接指定缓存目录
+               index: 是否使用持久化的文件元数据索引，默认为True；即使cache为False，索引(index.json和*.rows.npz)
+                      也会写入Log目录下的.loganalysis目录(cache为目录时写入该目录)，不希望改动Log目录时设为False
+               chunksize: 分块读取的行数，为None时按文件读取
+               workers: 聚合计算的并行进程数或者Executor实例，为None时单进程计算；
+                        为进程数时创建一个进程池，由所有Log文件共用，close时关闭
+               prefetch: 后台预读的数据块个数或者Prefetcher实例，为None时不预读
         '''
         self._directory = directory
         self._product_type = product_type
         self._logfiles={}
         self._time_interval = time_interval
+        self._cache = cache
+        self._chunksize = chunksize
+        self._executor = ProcessPoolExecutor(workers) if isinstance(workers, int) else None
+        self._workers = workers if self._executor is None else self._executor
+        self._prefetch = prefetch
+        self._index = None
+        if index:
+            self._index = FileIndex(directory, cache if isinstance(cache, str) else None)
 
     @property
     def product_type(self):
@@ -38,6 +63,39 @@ class Log(object):
     def directory(self):
         return self._directory
 
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def chunksize(self):
+        return self._chunksize
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def prefetch(self):
+        return self._prefetch
+
+    def close(self):
+        '''关闭按workers进程数创建的进程池，调用方传入的Executor由调用方关闭'''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
     def _filenames_of_type(self, filetype):
         '''获取指定文件类型的所有文件名
             Args：
@@ -76,32 +134,144 @@ class Log(object):
         df.index.name = 'filename'
         return df
 
+    def shared_scan(self):
+        '''创建共享扫描，在with语句中登记的多个分析对每个LogFile只读取一次文件
+
+            Returns:
+                SharedScan实例
+        '''
+        return SharedScan()
+
+
+class SharedScan(object):
+    '''共享扫描
+
+        登记多个待执行的分析(所需列、过滤条件和数据块处理函数)，按LogFile合并后一次遍历文件，
+        每个数据块按各分析的列和过滤条件选取后依次交给对应的处理函数。
+        各LogFile轮流读取一个数据块，使按时间对应的多个Log(如调度Log和PHY Log)同步推进，
+        跨Log的流式匹配只需缓存两侧当前位置之间的数据。
+        用法：
+            with log.shared_scan() as scan:
+                scan.add(logfile, cols, consumer)
+            退出with语句时执行扫描，之后各分析的结果可用
+    '''
+
+    def __init__(self):
+        self._pending = []
+        self._shared = {}
+        self._done = []
+
+    def add(self, logfile, cols, consumer, val_filter=None, finish=None):
+        '''登记一个分析
+
+            Args：
+                logfile: 待扫描的LogFile实例
+                cols: 列名列表，如果为None，表示获取全部列
+                consumer: 数据块处理函数，consumer(data)
+                val_filter: 过滤条件，字典格式{'colname': [val1,]}
+                finish: 该LogFile遍历结束后调用的函数，finish()
+            Returns:
+                无
+        '''
+        self._pending.append((logfile, cols, val_filter, consumer, finish))
+
+    def on_done(self, func):
+        '''登记所有LogFile遍历结束后调用的函数，func()'''
+        self._done.append(func)
+
+    def shared(self, key, factory):
+        '''获取本次扫描中按key共享的对象，首次获取时由factory()创建
+
+            用于多个分析共用同一个中间结果(如同一个右侧Log的StreamJoin)
+        '''
+        if key not in self._shared:
+            self._shared[key] = factory()
+        return self._shared[key]
+
+    def run(self):
+        '''执行所有已登记的分析，每个LogFile只遍历一次'''
+        groups = {}
+        for logfile, cols, val_filter, consumer, finish in self._pending:
+            group = groups.setdefault(id(logfile), (logfile, [], []))
+            group[1].append((cols, val_filter, consumer))
+            if finish is not None:
+                group[2].append(finish)
+        self._pending = []
+        self._shared = {}
+        scans = [(logfile._scan_chunks(requests), finishes) for logfile, requests, finishes in groups.values()]
+        while scans:
+            for scan, finishes in list(scans):
+                if not next(scan, False):
+                    scans.remove((scan, finishes))
+                    for finish in finishes:
+                        finish()
+        done, self._done = self._done, []
+        for func in done:
+            func()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
+        return False
+
 
 class LogFile(object):
     '''Log文件接口类'''
 
-    def __init__(self, type, directory, files, id_filter=None):
+    # 文件元数据索引中分组统计的ID列
+    _KEY_COLS = []
+
+    def __init__(self, type, directory, files, id_filter=None, cache=False, index=None, chunksize=None,
+                 workers=None, split=False, prefetch=None):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                file: 文件名
                type: log类型
+               cache: 列式缓存，False不缓存，True缓存到Log目录下，也可以直接指定缓存目录
+               index: 文件元数据索引FileIndex实例，为None时扫描文件获取元数据
+               chunksize: 分块读取的行数，为None时gen_of_cols按文件输出，否则按固定行数分块输出
+               workers: 聚合计算的并行进程数或者Executor实例，为None时单进程计算；
+                        为进程数时创建一个进程池，由该实例的所有计算共用，close时关闭
+               split: 是否按记录组拆分为稠密子表存储，读取时只访问请求列所在的子表；
+                      拆分后的表存放在缓存目录下，cache为False时缓存到Log目录下
+               prefetch: 后台预读的数据块个数或者Prefetcher实例，为None时不预读；
+                         gen_of_cols在后台线程中读取和解析后续数据块，与调用方的计算重叠
         '''
         self._files = files
         self._type = type
         self._directory = directory
         self._id_filter = id_filter
         self._time_filter = None
+        self._timeline = None
+        self._asof = {}
+        self._headers = {}
+        self._cache = None
+        if split:
+            self._cache = SplitCache(directory, cache if isinstance(cache, str) else None, type)
+        elif cache:
+            self._cache = SidecarCache(directory, cache if isinstance(cache, str) else None, type)
+        self._index = index
+        self._chunksize = chunksize
+        self._executor = ProcessPoolExecutor(workers) if isinstance(workers, int) else None
+        self._workers = workers if self._executor is None else self._executor
+        self._prefetch = Prefetcher(prefetch) if isinstance(prefetch, int) else prefetch
         self._size = sum([os.path.getsize(os.path.join(directory, file)) for file in files])
         self._pctimes = [-1, -1]
         self._airtimes = [-1, -1]
         self._lines = 0
+        if self._indexable():
+            self._init_from_index()
+            return
+
         cols = ['LocalTime', 'AirTime']
         for data in self.gen_of_cols(cols):
             if len(data.index) == 0:
-                self._lines = 0
-                return
-            self._lines = self._lines + data.index.max()
+                continue
+            self._lines = self._lines + len(data.index)
             if self._pctimes[0] == -1:
                 self._pctimes[0] = data.iat[0, 0]
             self._pctimes[1] = data.iat[-1, 0]
@@ -109,6 +279,35 @@ class LogFile(object):
                 self._airtimes[0] = data.iat[0, 1]
             self._airtimes[1] = data.iat[-1, 1]
 
+    def _indexable(self):
+        '''元数据能否直接从索引中获取'''
+        if self._index is None:
+            return False
+        return set(self._id_filter or {}).issubset(self._KEY_COLS)
+
+    def _index_groups(self, file):
+        '''索引中指定文件满足id_filter的分组统计信息'''
+        groups = self._index.groups(file, self._KEY_COLS, self._read_file)
+        if self._id_filter:
+            groups = groups[groups[list(self._id_filter.keys())].isin(self._id_filter).all(axis=1)]
+        return groups
+
+    def _init_from_index(self):
+        '''根据索引计算行数、pctime和airtime范围'''
+        for file in self._files:
+            groups = self._index_groups(file)
+            if 0 == len(groups.index):
+                continue
+            self._lines = self._lines + int(groups['rows'].sum())
+            first = groups['first_row'].idxmin()
+            last = groups['last_row'].idxmax()
+            if self._pctimes[0] == -1:
+                self._pctimes[0] = groups.at[first, 'first_localtime']
+                self._airtimes[0] = groups.at[first, 'first_airtime']
+            self._pctimes[1] = groups.at[last, 'last_localtime']
+            self._airtimes[1] = groups.at[last, 'last_airtime']
+        self._index.save()
+
     @property
     def type(self):
         return self._type
@@ -125,6 +324,48 @@ class LogFile(object):
     def id_filter(self):
         return self._id_filter
 
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def chunksize(self):
+        return self._chunksize
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def prefetch(self):
+        return self._prefetch
+
+    def close(self):
+        '''关闭按workers进程数创建的进程池，调用方传入的Executor由调用方关闭'''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __getstate__(self):
+        '''传递到工作进程时不携带执行器和索引'''
+        state = self.__dict__.copy()
+        state['_workers'] = None
+        state['_executor'] = None
+        state['_index'] = None
+        state['_asof'] = {}
+        return state
+
     @property
     def lines(self):
         '''获取文件总行数'''
@@ -140,79 +381,413 @@ class LogFile(object):
         '''AirTime时间范围'''
         return tuple(self._airtimes)
 
+    @property
+    def timeline(self):
+        '''绝对TTI时间轴，首次使用时从索引获取，没有索引时读取AirTime列计算'''
+        if self._timeline is None:
+            if self._index is not None:
+                stats = [self._index.timeline(file, self._KEY_COLS, self._read_file) for file in self._files]
+                self._index.save()
+            else:
+                stats = [timeline_stats(self._read_file(file, ['AirTime'])['AirTime'].values)
+                         for file in self._files]
+            self._timeline = Timeline(stats)
+        return self._timeline
+
+    def _time_interval(self):
+        '''time_interval对应的绝对TTI范围，没有指定时为None'''
+        if self._time_filter is None:
+            return None
+        return self.timeline.interval(*self._time_filter)
+
+    def locate(self, start_airtime, end_airtime=None):
+        '''查找时间范围所在的文件和行范围
+
+            时间按绝对TTI比较，支持跨越翻转点的范围(end早于start)
+            Args：
+                start_airtime: 起始时间
+                end_airtime: 截止时间，为None时只查找start_airtime
+            Returns:
+                [(文件名, (lo, hi)), ]列表，行范围[lo, hi)可能多于实际满足条件的行
+        '''
+        end_airtime = start_airtime if end_airtime is None else end_airtime
+        start, end = self.timeline.interval(start_airtime, end_airtime)
+        return [(self._files[fileidx], rows) for fileidx, rows in self.timeline.locate(start, end)]
+
+    def asof_index(self, cols, keycol=None):
+        '''获取cols的as-of查询索引，首次使用时遍历全部文件建立并缓存
+
+            同一keycol下请求了新的列时，按已有列和新列的并集重建索引
+            Args：
+                cols: 列名列表
+                keycol: 查询键列，为None时不区分键
+            Returns:
+                AsofIndex实例
+        '''
+        index = self._asof.get(keycol)
+        if index is None or not set(cols).issubset(index.cols):
+            totcols = list(cols) if index is None else index.cols + [col for col in cols if col not in index.cols]
+            index = AsofIndex(self, totcols, keycol)
+            self._asof[keycol] = index
+        return index
+
+    def get_last_of_cols(self, airtimes, cols, how='any', keys=None, keycol=None):
+        '''批量查找每个查询时间及之前，cols非空的最近一条记录
+
+            时间按绝对TTI比较，不受set_airtimes_interval限制
+            Args：
+                airtimes: 查询时间数组，16进制空口时间
+                cols: 列名列表
+                how: 'any'任一列非空，'all'全部列非空
+                keys: 与airtimes等长的查询键数组，如UEGID；为None时不区分键
+                keycol: keys对应的列名，为None时使用_KEY_COLS的最后一列，该类Log没有键列时抛出ValueError
+            Returns:
+                DataFrame格式，与查询逐行对应，列为['File', 'Row', 'AirTime', 'AbsTti']，
+                没有命中的查询File为空值，其他列为-1
+        '''
+        if keys is not None and keycol is None:
+            if not self._KEY_COLS:
+                raise ValueError('keycol must be specified for {0} log'.format(self._type))
+            keycol = self._KEY_COLS[-1]
+        index = self.asof_index(cols, keycol if keys is not None else None)
+        ttis = np.atleast_1d(self.timeline.to_abstti(np.asarray(airtimes)))
+        return index.locations(index.lookup(ttis, cols, how, keys))
+
+    def get_idx_of_last_cols(self, airtime, cols, how='any'):
+        '''指定时间及之前，cols非空的最近一条记录的位置
+
+            Args：
+                airtime: 16进制空口时间
+                cols: 列名列表
+                how: 'any'任一列非空，'all'全部列非空
+            Returns:
+                (文件名, 行号)，没有满足条件的记录时为None
+        '''
+        rlt = self.get_last_of_cols([airtime], cols, how)
+        if rlt['File'].iat[0] is None:
+            return None
+        return rlt['File'].iat[0], int(rlt['Row'].iat[0])
+
     @staticmethod
     def addtime(time1, time2):
-        time1 = np.uint32(time1)
-        time2 = np.uint32(time2)
+        '''空口时间相加，支持标量或者数组(按元素计算)
+
+            空口时间低4位为子帧号(0~9)，其余为帧号，帧号按0x10000000翻转
+        '''
+        time1 = np.asarray(time1).astype(np.uint32)
+        time2 = np.asarray(time2).astype(np.uint32)
         frm = time1 // 16 + time2 // 16
         subfrm = time1 % 16 + time2 % 16
-        if subfrm >= 10:
-            subfrm -= 10
-            frm += 1
-        return frm % 0x10000000 * 16 + subfrm
+        carry = (subfrm >= 10).astype(np.uint32)
+        subfrm = subfrm - carry * 10
+        frm = frm + carry
+        return (frm % 0x10000000 * 16 + subfrm)[()]
 
     @staticmethod
     def difftime(time1, time2):
-        time1 = np.uint32(time1)
-        time2 = np.uint32(time2)
+        '''空口时间相减，支持标量或者数组(按元素计算)'''
+        time1 = np.asarray(time1).astype(np.uint32)
+        time2 = np.asarray(time2).astype(np.uint32)
         subfrm1 = time1 % 16
         subfrm2 = time2 % 16
         frm = time1 // 16 + 0x10000000 - time2 // 16
-        if subfrm1 >= subfrm2:
-            subfrm = subfrm1 - subfrm2
-        else:
-            subfrm = subfrm1 + 10 - subfrm2
-            frm = frm - 1
-        frm = frm % 0x10000000
-        return frm * 16 + subfrm
+        borrow = (subfrm1 < subfrm2).astype(np.uint32)
+        subfrm = subfrm1 + borrow * 10 - subfrm2
+        frm = (frm - borrow) % 0x10000000
+        return (frm * 16 + subfrm)[()]
 
     @staticmethod
     def dectime(hextime):
-        hextime = np.uint32(hextime)
-        return hextime // 16 * 10 + hextime % 16
+        '''16进制编码的空口时间转换为10进制TTI数，支持标量或者数组'''
+        hextime = np.asarray(hextime).astype(np.uint32)
+        return (hextime // 16 * 10 + hextime % 16)[()]
 
     @staticmethod
     def hextime(dectime):
-        dectime = np.uint32(dectime)
-        return dectime // 10 * 16 + dectime % 10
+        '''10进制TTI数转换为16进制编码的空口时间，支持标量或者数组'''
+        dectime = np.asarray(dectime).astype(np.uint32)
+        return (dectime // 10 * 16 + dectime % 10)[()]
 
-    def gen_of_cols(self, cols=None, val_filter=None):
-        '''获取指定列的生成器
+    def _schema(self, file, cols):
+        '''读取指定列后转换的紧凑类型，cols为None时按文件的表头获取'''
+        if cols is None:
+            if file not in self._headers:
+                filename = os.path.join(self._directory, file)
+                self._headers[file] = list(pd.read_csv(filename, na_values='-', nrows=0).columns)
+            cols = self._headers[file]
+        return schema_of(self._type, cols)
+
+    @staticmethod
+    def _select(data, dense, filters):
+        '''CSV数据块按dense和filters选取行'''
+        mask = np.ones(len(data.index), dtype=bool)
+        if dense is not None:
+            mask &= data[dense].notna().any(axis=1).values
+        for col, vals in (filters or {}).items():
+            mask &= data[col].isin(vals).values
+        return data if mask.all() else data[mask]
+
+    def _read_file(self, file, cols=None, rows=None, dense=None, filters=None):
+        '''读取单个文件的指定列
             Args：
+                file: 文件名
                 cols: 列名列表，如果为None，表示获取全部列
-                col_val_filter: 过滤条件，字典格式{'colname': [val1,]}
+                rows: 行范围[start, end)，如果为None，表示读取全部行
+                dense: 列名列表，不为None时只输出其中至少一列非空的行
+                filters: 过滤条件，字典格式{'colname': [val1,]}，使用列式缓存时在读取中求值并跳过不满足的row group
+            Returns:
+                数据，DataFrame格式，行索引为文件中的行号
+        '''
+        if self._cache is not None:
+            return self._cache.read(file, cols, rows, dense, filters)
+        start = 0 if rows is None else rows[0]
+        with open(os.path.join(self._directory, file), 'rb') as fp:
+            data = self._read_csv(fp, file, cols, start, None if rows is None else rows[1] - rows[0])
+        apply_schema(data, self._schema(file, cols))
+        if start:
+            data.index = pd.RangeIndex(start, start+len(data.index))
+        return self._select(data, dense, filters)
+
+    def _read_chunks(self, file, cols=None, rows=None, dense=None, filters=None):
+        '''按chunksize分块读取单个文件的指定列
+            Args：
+                file: 文件名
+                cols: 列名列表，如果为None，表示获取全部列
+                rows: 行范围[start, end)，如果为None，表示读取全部行
+                dense: 列名列表，不为None时只输出其中至少一列非空的行
+                filters: 过滤条件，字典格式{'colname': [val1,]}，使用列式缓存时跳过没有满足条件的行的数据块
             Yields:
-                生成器格式
+                数据块，DataFrame格式，行索引为文件中的行号
+        '''
+        if self._chunksize is None:
+            yield self._read_file(file, cols, rows, dense, filters)
+            return
+
+        if self._cache is not None:
+            for data in self._cache.read_chunks(file, cols, rows, self._chunksize, dense, filters):
+                yield data
+            return
+
+        start = 0 if rows is None else rows[0]
+        nrows = None if rows is None else rows[1] - rows[0]
+        with open(os.path.join(self._directory, file), 'rb') as fp:
+            with self._read_csv(fp, file, cols, start, nrows, self._chunksize) as reader:
+                schema = self._schema(file, cols)
+                for data in reader:
+                    apply_schema(data, schema)
+                    data.index = pd.RangeIndex(start, start+len(data.index))
+                    start = start + len(data.index)
+                    yield self._select(data, dense, filters)
+
+    def _read_csv(self, fp, file, cols, start, nrows, chunksize=None):
+        '''从第start个数据行开始解析打开的CSV文件
+
+            索引中记录了行首字节位置时，seek到不超过start的最近位置，只需解析其后不足一个间隔的行；
+            否则从文件头开始跳过start行，被跳过的行仍然要分词
+            Args：
+                fp: 以二进制方式打开的文件
+                file: 文件名
+                cols: 列名列表，如果为None，表示获取全部列
+                start: 起始数据行
+                nrows: 读取的行数，为None时读到文件末尾
+                chunksize: 分块读取的行数，不为None时返回分块读取器
+            Returns:
+                DataFrame或者分块读取器，行索引从0开始
         '''
+        kwargs = {'na_values': '-', 'usecols': cols, 'nrows': nrows, 'chunksize': chunksize}
+        offsets = None
+        if start and self._index is not None:
+            offsets = self._index.row_offsets(file, self._KEY_COLS, self._read_file)
+        if not offsets or not offsets['positions']:
+            return pd.read_csv(fp, skiprows=range(1, start+1), **kwargs)
+        mark = min(start // offsets['stride'], len(offsets['positions']) - 1)
+        fp.seek(offsets['positions'][mark])
+        names = self._index.entry(file, self._KEY_COLS, self._read_file)['columns']
+        return pd.read_csv(fp, header=None, names=names, skiprows=start - mark*offsets['stride'], **kwargs)
 
+    def _filters(self, val_filter=None):
+        '''合并val_filter和id_filter'''
         filters = {}
         if val_filter:
             filters.update(val_filter)
         if self._id_filter:
             filters.update(self._id_filter)
-        totcols = cols
-        
+        return filters
+
+    def _candidate_spans(self, file, rows, filters):
+        '''根据索引中ID列的取值摘要选择文件中可能有满足filters的行的行范围
+
+            Returns:
+                行范围列表，为空时不需要读取该文件；没有可用的摘要时返回None
+        '''
+        if self._index is None or not filters:
+            return None
+        spans = self._index.candidate_spans(file, self._KEY_COLS, filters, self._read_file)
+        if spans is None:
+            return None
+        if rows is not None:
+            spans = [(max(start, rows[0]), min(end, rows[1])) for start, end in spans]
+            spans = [(start, end) for start, end in spans if start < end]
+        if spans and self._cache is None:
+            # CSV文件只能顺序解析，读取覆盖全部候选块的一个范围
+            spans = [(spans[0][0], spans[-1][1])]
+        return spans
+
+    def _file_spans(self, interval=None, val_filter=None):
+        '''根据时间范围、id_filter和val_filter选择需要读取的文件以及文件内的行范围
+            Args：
+                interval: 绝对TTI范围(start, end)，如果为None，表示不限定时间
+                val_filter: 过滤条件，字典格式{'colname': [val1,]}，其中有取值摘要的ID列用于跳过文件和数据块
+            Yields:
+                (文件名, 行范围, 行号数组)，行范围为None表示读取整个文件，
+                行号数组不为None时只保留其中的行(来自索引的倒排表)
+        '''
+        filters = self._filters(val_filter)
+        located = None
+        if interval is not None:
+            located = dict(self.timeline.locate(interval[0], interval[1]))
+        for fileidx, file in enumerate(self._files):
+            rows = None
+            if located is not None:
+                if fileidx not in located:
+                    continue
+                rows = located[fileidx]
+            spans = self._candidate_spans(file, rows, filters)
+            if spans is not None and not spans:
+                continue
+            if not self._id_filter or not self._indexable():
+                for span in [rows] if spans is None else spans:
+                    yield file, span, None
+                continue
+
+            positions = self._index.rows_of_ids(file, self._KEY_COLS, self._id_filter, self._read_file)
+            if rows is not None:
+                positions = positions[(positions >= rows[0]) & (positions < rows[1])]
+            for span in self._split_positions(positions):
+                yield file, span, positions[(positions >= span[0]) & (positions < span[1])]
+
+    def _split_positions(self, positions):
+        '''把行号数组划分为需要读取的行范围
+
+            CSV文件只能顺序解析，读取覆盖全部行号的一个范围；使用列式缓存时按row group划分，
+            只读取包含行号的row group
+        '''
+        if 0 == len(positions):
+            return []
+        if self._cache is None:
+            return [(int(positions[0]), int(positions[-1]) + 1)]
+        blocks = np.unique(positions // CACHE_ROW_GROUP_SIZE)
+        breaks = np.flatnonzero(np.diff(blocks) > 1)
+        starts = np.concatenate([[blocks[0]], blocks[breaks + 1]])
+        ends = np.concatenate([blocks[breaks], [blocks[-1]]])
+        return [(max(int(start) * CACHE_ROW_GROUP_SIZE, int(positions[0])),
+                 min((int(end) + 1) * CACHE_ROW_GROUP_SIZE, int(positions[-1]) + 1))
+                for start, end in zip(starts, ends)]
+
+    def gen_of_cols(self, cols=None, val_filter=None, dense=False):
+        '''获取指定列的生成器
+            Args：
+                cols: 列名列表，如果为None，表示获取全部列
+                col_val_filter: 过滤条件，字典格式{'colname': [val1,]}
+                dense: 为True时只输出cols中记录组列(如SCHD.*、ACK.*)至少一列非空的行，
+                       按记录组拆分存储时只读取这些列所在的子表
+            Yields:
+                生成器格式
+        '''
+        interval = self._time_interval()
+        if self._prefetch is None:
+            for data in self._gen_of_cols(cols, val_filter, interval, dense=dense):
+                yield data
+            return
+
+        # 在当前线程中确定读取范围并建立时间轴，后台线程只读取和解析数据块
+        spans = list(self._file_spans(interval, val_filter))
+        if interval is not None or (cols is not None and ABSTTI_COL in cols):
+            self._timeline = self.timeline
+        for data in self._prefetch.iterate(self._gen_of_cols(cols, val_filter, interval, spans, dense)):
+            yield data
+
+    def _gen_of_cols(self, cols, val_filter, interval, spans=None, dense=False):
+        '''获取指定绝对TTI范围内指定列的生成器，不与interval重叠的文件不读取
+
+            cols中可以包含ABSTTI_COL，由AirTime和时间轴计算得到绝对TTI列
+            spans: (文件名, 行范围, 行号数组)列表，为None时根据interval和id_filter选择
+            dense: 为True时只输出cols中记录组列至少一列非空的行，行索引不再连续
+        '''
+
+        filters = self._filters(val_filter)
+
         aircol = 'AirTime'
-        if self._time_filter and aircol not in totcols :
-            totcols.append(aircol) 
-            
+        abstti = interval is not None or (cols is not None and ABSTTI_COL in cols)
+        totcols = None
         if cols is not None:
-            totcols = list(set.union(set(filters), set(cols)))
-        for file in self._files:
-            filename = os.path.join(self._directory, file)
-            data = pd.read_csv(filename, na_values='-', usecols=totcols)
-            if self._time_filter:
-                start, end = self._time_filter
-                data = data[(start<= data[aircol]) & (data[aircol]<=end)]
-            if not filters:
-                yield data
-                continue
+            totcols = list(set.union(set(filters), set(cols)) - {ABSTTI_COL})
+            if abstti and aircol not in totcols:
+                totcols.append(aircol)
 
-            mask = data[list(filters.keys())].isin(filters).all(1)
-            if cols is not None:
-                yield data[mask][cols]
-            else:
-                yield data[mask]
+        densecols = None
+        if dense and cols is not None:
+            densecols = [col for col in cols if record_group(col) is not None] or None
+
+        if spans is None:
+            spans = self._file_spans(interval, val_filter)
+        empty = True
+        for file, rows, positions in spans:
+            fileidx = self._files.index(file) if abstti else None
+            for data in self._read_chunks(file, totcols, rows, densecols, filters):
+                if positions is not None and len(data.index):
+                    lo = np.searchsorted(positions, data.index[0])
+                    hi = np.searchsorted(positions, data.index[-1], side='right')
+                    locs = data.index.get_indexer(positions[lo:hi])
+                    data = data.iloc[locs[locs >= 0]]
+                if abstti:
+                    tti = self.timeline.abstti(fileidx, data.index.values, data[aircol].values)
+                    if cols is not None and ABSTTI_COL in cols:
+                        data = data.assign(**{ABSTTI_COL: tti})
+                    if interval:
+                        data = data[(interval[0] <= tti) & (tti <= interval[1])]
+                empty = False
+                yield data if cols is None or set(data.columns) == set(cols) else data[cols]
+
+        if empty and self._files:
+            # 所有文件都被跳过时输出一个空数据块，与读取后再过滤的结果一致
+            data = self._read_file(self._files[0], totcols, (0, 1)).iloc[:0]
+            if cols is not None and ABSTTI_COL in cols:
+                data = data.assign(**{ABSTTI_COL: np.array([], dtype=np.int64)})
+            yield data if cols is None or set(data.columns) == set(cols) else data[cols]
+
+    def scan(self, requests):
+        '''一次遍历文件，把每个数据块分发给多个处理函数
+
+            Args：
+                requests: [(cols, val_filter, consumer), ]列表，consumer(data)处理按cols和val_filter选取后的数据块
+            Returns:
+                无
+        '''
+        for _ in self._scan_chunks(requests):
+            pass
+
+    def _scan_chunks(self, requests):
+        '''scan的生成器形式，每分发完一个数据块输出一次True，供SharedScan轮流推进多个LogFile'''
+        if not requests:
+            return
+        totcols = set()
+        for cols, val_filter, consumer in requests:
+            if cols is None:
+                totcols = None
+                break
+            totcols.update(cols)
+            if val_filter:
+                totcols.update(val_filter)
+        totcols = None if totcols is None else list(totcols)
+
+        for data in self._gen_of_cols(totcols, None, self._time_interval()):
+            for cols, val_filter, consumer in requests:
+                chunk = data
+                if val_filter:
+                    chunk = chunk[chunk[list(val_filter.keys())].isin(val_filter).all(axis=1)]
+                consumer(chunk.copy() if cols is None else chunk[cols])
+            yield True
 
     def get_filename_by_airtime(self, airtime):
         '''根据指定时间获取文件名
@@ -221,47 +796,42 @@ class LogFile(object):
             Returns:
                 文件名
         '''
-        col = ['AirTime']
-        for file in self._files:
-            filename = os.path.join(self._directory, file)
-            data = pd.read_csv(filename, na_values='-', usecols=col)[col[0]]
-            if airtime < data.iat[0] or airtime > data.iat[-1]:
-                continue
+        for file, rows in self.locate(airtime):
             return file
 
     def get_data_between_airtimes(self, start_airtime, end_airtime, cols=None, val_filter=None):
         '''获取指定时间范围内的数据
             Args：
                 start_airtime:起始时间
-                end_airtime:截止时间
+                end_airtime:截止时间，早于start_airtime时认为跨过了翻转点
                 cols: 列名列表，如果为None，表示获取全部列
                 col_val_filter: 过滤条件，字典格式{'colname': [val1,]}
             Returns:
                 数据，DataFrame格式
         '''
-        assert(start_airtime <= end_airtime)
-        rlt = pd.DataFrame()
         if cols is not None:
             totcols = list(set(cols + ['AirTime']))
         else:
             totcols = None
-        for data in self.gen_of_cols(cols=totcols, val_filter=val_filter):
-            airtime = data['AirTime'].astype(np.uint32)
-            if start_airtime > airtime.iat[-1] or end_airtime < airtime.iat[0]:
-                continue
-            data = data[(airtime <= end_airtime) & (airtime >= start_airtime)]
-            rlt = pd.concat([rlt, data], ignore_index=True)
-        return rlt
-    
+        rlt = Accumulator(ignore_index=True, empty_columns=totcols)
+        interval = self.timeline.interval(start_airtime, end_airtime)
+        if self._time_filter:
+            time_interval = self._time_interval()
+            interval = (max(interval[0], time_interval[0]), min(interval[1], time_interval[1]))
+            if interval[0] > interval[1]:
+                return rlt.result()
+        for data in self._gen_of_cols(totcols, val_filter, interval):
+            rlt.append(data)
+        return rlt.result()
+
     def set_airtimes_interval(self, start, end):
         '''指定当前log的时间范围
             Args：
                 start:起始时间
-                end:截止时间
+                end:截止时间，早于start时认为跨过了翻转点
             Returns:
                 无
         '''
-        assert(start <= end)
         self._time_filter = (start, end)
         return
     
@@ -283,10 +853,43 @@ class LogFile(object):
             Returns:
                 数据，DataFrame格式
         '''
-        rlt = pd.DataFrame()
+        # 没有值过滤和时间过滤时，总行数即文件行数，可以预分配
+        rows = self._lines if not val_filter and not self._time_filter else None
+        rlt = Accumulator(rows=rows, empty_columns=cols)
         for data in self.gen_of_cols(cols=cols, val_filter=val_filter):
-            rlt = pd.concat([rlt, data])
-        return rlt
+            rlt.append(data)
+        return rlt.result()
+
+    def _map_of_cols(self, mapper, cols=None, val_filter=None):
+        '''对gen_of_cols输出的每个数据块执行mapper，按文件顺序输出结果
+
+            workers不为None时，每个文件的读取和mapper计算在进程池中并行执行
+            Args：
+                mapper: 可序列化的函数，mapper(data)返回部分结果
+                cols: 列名列表，如果为None，表示获取全部列
+                val_filter: 过滤条件，字典格式{'colname': [val1,]}
+            Yields:
+                每个数据块的部分结果
+        '''
+        if self._workers is None:
+            for data in self.gen_of_cols(cols, val_filter):
+                yield mapper(data)
+            return
+
+        interval = self._time_interval()
+        if cols is not None and ABSTTI_COL in cols:
+            # 在主进程中建立时间轴，随LogFile一起传递到工作进程
+            self._timeline = self.timeline
+        futures = [self._workers.submit(_map_file, self, span, cols, val_filter, interval, mapper)
+                   for span in self._file_spans(interval, val_filter)]
+        try:
+            for future in futures:
+                for part in future.result():
+                    yield part
+        finally:
+            # 调用方提前结束时取消尚未开始的任务，进程池由其他计算继续使用
+            for future in futures:
+                future.cancel()
 
     def mean_of_cols(self, cols, airtime_bin_size, by, filters=None, time_col='AirTime'):
         '''按照时间粒度计算指定列的平均值
@@ -301,11 +904,11 @@ class LogFile(object):
         assert(airtime_bin_size>=1)
         rlt = pd.DataFrame()
         cnt = pd.DataFrame()
-        for data in self.gen_of_cols(cols+[time_col], val_filter=filters):
-            airtime = data[time_col] // (airtime_bin_size*1600)
-            group_data = data[cols].groupby(airtime)          
-            rlt = rlt.add(group_data.sum(), fill_value=0)
-            cnt = cnt.add(group_data.count(), fill_value=0) 
+        mapper = partial(_groupby_airtime, cols=cols, airtime_bin_size=airtime_bin_size,
+                         funcs=['sum', 'count'], time_col=time_col)
+        for sum_data, cnt_data in self._map_of_cols(mapper, cols+[time_col], val_filter=filters):
+            rlt = rlt.add(sum_data, fill_value=0)
+            cnt = cnt.add(cnt_data, fill_value=0)
         return rlt.div(cnt).dropna()
 
     def sum_of_cols(self, cols, airtime_bin_size, filters=None, time_col='AirTime'):
@@ -319,10 +922,10 @@ class LogFile(object):
         '''
         assert(airtime_bin_size>=1)
         rlt = pd.DataFrame()
-        for data in self.gen_of_cols(cols+[time_col], val_filter=filters):
-            airtime = data[time_col] // (airtime_bin_size*1600)
-            group_data = data[cols].groupby(airtime)
-            rlt = rlt.add(group_data.sum(), fill_value=0)
+        mapper = partial(_groupby_airtime, cols=cols, airtime_bin_size=airtime_bin_size,
+                         funcs=['sum'], time_col=time_col)
+        for sum_data, in self._map_of_cols(mapper, cols+[time_col], val_filter=filters):
+            rlt = rlt.add(sum_data, fill_value=0)
         return rlt.dropna()
         
     def min_of_cols(self, cols, airtime_bin_size, filters=None, time_col='AirTime'):
@@ -335,12 +938,12 @@ class LogFile(object):
                 time_col: 聚合的时间列名，默认‘AirTime’
         '''
         assert(airtime_bin_size>=1)
-        rlt = pd.DataFrame()
-        for data in self.gen_of_cols(cols+[time_col], val_filter=filters):
-            airtime = data[time_col] // (airtime_bin_size*1600)
-            group_data = data[cols].groupby(airtime)
-            rlt = rlt.combine_first(group_data.min().dropna())
-        return rlt
+        mapper = partial(_groupby_airtime, cols=cols, airtime_bin_size=airtime_bin_size,
+                         funcs=['min'], time_col=time_col)
+        rlts = [min_data for min_data, in self._map_of_cols(mapper, cols+[time_col], val_filter=filters)]
+        if not rlts:
+            return pd.DataFrame()
+        return pd.concat(rlts).groupby(level=0).min().dropna()
         
     def max_of_cols(self, cols, airtime_bin_size, filters=None, time_col='AirTime'):
         '''按照时间粒度计算指定列的最大值
@@ -352,12 +955,12 @@ class LogFile(object):
                 time_col: 聚合的时间列名，默认‘AirTime’
         '''
         assert(airtime_bin_size>=1)
-        rlt = pd.DataFrame()
-        for data in self.gen_of_cols(cols+[time_col], val_filter=filters):
-            airtime = data[time_col] // (airtime_bin_size*1600)
-            group_data = data[cols].groupby(airtime)
-            rlt = rlt.combine_first(group_data.max().dropna())
-        return rlt
+        mapper = partial(_groupby_airtime, cols=cols, airtime_bin_size=airtime_bin_size,
+                         funcs=['max'], time_col=time_col)
+        rlts = [max_data for max_data, in self._map_of_cols(mapper, cols+[time_col], val_filter=filters)]
+        if not rlts:
+            return pd.DataFrame()
+        return pd.concat(rlts).groupby(level=0).max().dropna()
 
     def cnt_of_cols(self, cols, airtime_bin_size, filters=None, time_col='AirTime'):
         '''按照时间粒度计算指定列的次数
@@ -368,12 +971,67 @@ class LogFile(object):
         '''
         assert(airtime_bin_size>=1)
         cnt = pd.DataFrame()
-        for data in self.gen_of_cols(cols+[time_col], val_filter=filters):
-            airtime = data[time_col] // (airtime_bin_size*1600)
-            group_data = data[cols].groupby(airtime)
-            cnt = cnt.add(group_data.count(), fill_value=0)
+        mapper = partial(_groupby_airtime, cols=cols, airtime_bin_size=airtime_bin_size,
+                         funcs=['count'], time_col=time_col)
+        for cnt_data, in self._map_of_cols(mapper, cols+[time_col], val_filter=filters):
+            cnt = cnt.add(cnt_data, fill_value=0)
         return cnt
 
+    def agg_of_cols(self, spec, airtime_bin_size, filters=None, time_col='AirTime'):
+        '''按照时间粒度一次遍历计算多个列的多种聚合结果
+
+            Args:
+                spec: 聚合规格，字典格式{‘列名’：聚合函数或聚合函数列表}，聚合函数取值见AGG_FUNC
+                airtime_bin_size：时间粒度（s)
+                filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
+                time_col: 聚合的时间列名，默认‘AirTime’
+            Returns:
+                DataFrame格式，行索引为时间粒度，列为(列名, 聚合函数)两级索引
+        '''
+        assert(airtime_bin_size>=1)
+        spec = {col: [funcs] if isinstance(funcs, str) else list(funcs) for col, funcs in spec.items()}
+        funcs = set(func for col_funcs in spec.values() for func in col_funcs)
+        assert(funcs <= set(AGG_FUNC))
+
+        # 每个聚合函数依赖的部分统计量，std由各块的平方偏差和合并得到
+        stats = set()
+        for func in funcs:
+            stats.update({AGG_FUNC_SUM: ['sum'], AGG_FUNC_CNT: ['count'], AGG_FUNC_MEAN: ['sum', 'count'],
+                          AGG_FUNC_STD: ['sum', 'count', 'm2'], AGG_FUNC_MIN: ['min'],
+                          AGG_FUNC_MAX: ['max']}[func])
+        cols = list(spec)
+        mapper = partial(_agg_by_airtime, cols=cols, airtime_bin_size=airtime_bin_size,
+                         stats=sorted(stats), time_col=time_col)
+        totals = {}
+        extremes = {'min': [], 'max': []}
+        for parts in self._map_of_cols(mapper, cols+[time_col], val_filter=filters):
+            if 'm2' in parts:
+                totals['m2'] = _merge_m2(totals.get('m2'), totals.get('count'), totals.get('sum'),
+                                         parts['m2'], parts['count'], parts['sum'])
+            for stat in ('sum', 'count'):
+                if stat in parts:
+                    totals[stat] = parts[stat] if stat not in totals else totals[stat].add(parts[stat], fill_value=0)
+            for stat in ('min', 'max'):
+                if stat in parts:
+                    extremes[stat].append(parts[stat])
+        if not totals and not extremes['min'] and not extremes['max']:
+            return pd.DataFrame()
+        for stat in ('min', 'max'):
+            if extremes[stat]:
+                totals[stat] = getattr(pd.concat(extremes[stat]).groupby(level=0), stat)()
+
+        rlt = {}
+        for col, col_funcs in spec.items():
+            for func in col_funcs:
+                if func in (AGG_FUNC_SUM, AGG_FUNC_CNT, AGG_FUNC_MIN, AGG_FUNC_MAX):
+                    rlt[(col, func)] = totals[func][col]
+                elif func == AGG_FUNC_MEAN:
+                    rlt[(col, func)] = totals['sum'][col] / totals['count'][col]
+                else:
+                    rlt[(col, func)] = np.sqrt(totals['m2'][col] / (totals['count'][col] - 1))
+        rlt = pd.DataFrame(rlt).sort_index()
+        return rlt.dropna(how='all')
+
     def hist_of_col(self, col, airtime_bin_size, ratio=True, filters=None):
         '''按照时间粒度计算指定列的直方图数据
 
@@ -383,19 +1041,13 @@ class LogFile(object):
         '''
         cols = ['AirTime', col]
         rlt = pd.DataFrame()
-        for data in self.gen_of_cols(cols, val_filter=filters):
-            if airtime_bin_size == 0:
-                airtime = np.zeros(len(data.index))
-            else:
-                airtime = data[cols[0]] // (airtime_bin_size*1600)
-
-            group_data = data[cols[1]].groupby(airtime).apply(lambda x: x.value_counts())
-            if 0 == group_data.size:
+        mapper = partial(_hist_by_airtime, col=col, airtime_bin_size=airtime_bin_size)
+        for group_data in self._map_of_cols(mapper, cols, val_filter=filters):
+            if group_data is None:
                 continue
-            group_data = group_data.unstack(level=1, fill_value=0)
             rlt = rlt.add(group_data, fill_value=0)
-            if ratio:
-                rlt = rlt.apply(lambda x: x/x.sum(), axis=1)
+        if ratio:
+            rlt = rlt.apply(lambda x: x/x.sum(), axis=1)
         rlt.columns = rlt.columns.map(lambda x: np.uint32(x))
         rlt = rlt.reindex(columns=np.sort(rlt.columns))
         return rlt
@@ -453,3 +1105,57 @@ class LogFile(object):
         ax.set_ylabel(ylabel)
         hist = self.hist_of_col(col, airtime_bin_size=0, ratio=ratio)
         hist.loc[0, :].plot(kind='bar', xlim=xlim)
+
+
+def _map_file(logfile, span, cols, val_filter, interval, mapper):
+    '''进程池任务：读取单个文件，对每个数据块执行mapper'''
+    return [mapper(data) for data in logfile._gen_of_cols(cols, val_filter, interval, [span])]
+
+
+def _groupby_airtime(data, cols, airtime_bin_size, funcs, time_col='AirTime'):
+    '''按照时间粒度分组，返回各聚合函数的部分结果列表'''
+    airtime = data[time_col] // (airtime_bin_size*1600)
+    group_data = data[cols].groupby(airtime)
+    return [getattr(group_data, func)() for func in funcs]
+
+
+def _agg_by_airtime(data, cols, airtime_bin_size, stats, time_col='AirTime'):
+    '''按照时间粒度分组，返回各统计量的部分结果字典
+
+        stats取值为sum, count, min, max, m2，m2为各时间粒度内的平方偏差和
+    '''
+    airtime = data[time_col] // (airtime_bin_size*1600)
+    # 紧凑整数类型的分组求和结果在不溢出时保持原类型，多个数据块相加会按位截断，统一按浮点数计算
+    group_data = data[cols].astype(np.float64).groupby(airtime)
+    parts = {}
+    for stat in stats:
+        if 'm2' == stat:
+            parts[stat] = (group_data.var(ddof=0) * group_data.count()).fillna(0)
+        else:
+            parts[stat] = getattr(group_data, stat)()
+    return parts
+
+
+def _merge_m2(m2_a, cnt_a, sum_a, m2_b, cnt_b, sum_b):
+    '''合并两部分数据的平方偏差和(Chan并行算法)，第一部分为None时直接返回第二部分'''
+    if m2_a is None:
+        return m2_b
+    m2_a, m2_b = m2_a.align(m2_b, fill_value=0)
+    cnt_a, cnt_b = cnt_a.align(cnt_b, fill_value=0)
+    sum_a, sum_b = sum_a.align(sum_b, fill_value=0)
+    cnt = cnt_a + cnt_b
+    delta = ((sum_a*cnt_b - sum_b*cnt_a)**2 / (cnt_a*cnt_b*cnt)).fillna(0)
+    return m2_a + m2_b + delta
+
+
+def _hist_by_airtime(data, col, airtime_bin_size):
+    '''按照时间粒度统计指定列各取值的次数，没有数据时返回None'''
+    if airtime_bin_size == 0:
+        airtime = np.zeros(len(data.index))
+    else:
+        airtime = data['AirTime'] // (airtime_bin_size*1600)
+
+    group_data = hist2d(airtime, data[col])
+    if 0 == group_data.size:
+        return None
+    return group_data
@@ -3,6 +3,8 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from loganalysis.const import *
+from loganalysis.accumulator import Accumulator
+from loganalysis.join import StreamJoin
 from .dlschd import DlSchdCell
 from .ue import Ue
 from .ulschd import UlSchdCell
@@ -30,12 +32,14 @@ class Ni(object):
                 nicols = [col for col in data.columns if col.startswith('RTL2_EI_CELL_NI')]
             data = data[nicols].dropna(how='any', axis=0)
             data = data[data < 0].dropna(how='any', axis=1).max()
+            if 0 == data.size:
+                continue
             if rb_data is None:
                 rb_data = data
             else:
-                rb_data = pd.Series([max(rb_data[i], data[i]) for i in data.index])
-            rb_data.index.name = 'RbIdx'
-            rb_data.index = np.arange(len(rb_data.index))
+                rb_data = pd.concat([rb_data, data]).groupby(level=0).max()
+        rb_data = rb_data.reindex([col for col in nicols if col in rb_data.index])
+        rb_data.index = pd.Index(np.arange(len(rb_data.index)), name='RbIdx')
 
         ax = plt.subplots(1, 1)[1]
         ax.set(xlabel='RbIdx', ylabel='NI', title='NI vs RB', xlim=[0, len(rb_data.index)])
@@ -48,7 +52,7 @@ class Ni(object):
             if time_data is None:
                 time_data = data
             else:
-                time_data = [max(time_data[i], data[i]) for i in data.index]
+                time_data = pd.concat([time_data, data]).groupby(level=0).max()
 
         ax = plt.subplots(1, 1)[1]
         ax.set(xlabel='AirTime/{bin}s'.format(bin=airtime_bin_size), ylabel='NI',
@@ -62,13 +66,15 @@ class Ni(object):
 class Cell(object):
     '''小区实例'''
 
-    def __init__(self, cellid, log):
+    def __init__(self, cellid, log, uldlcfgidx=None):
         '''初始化小区实例
             根据输入的信息，完成如下事情：
-                a) 尝试推断上下行配比,有可能需要用户输入
+                a) 获取上下行配比，未指定时根据调度与ACK/CRC反馈时序推断
 
             Args:
                 cellid: 小区Id
+                log: LteLog实例
+                uldlcfgidx: 上下行配比(0,1,2,7)，为None时自动推断
         '''
         self._cellid = cellid
         self._log = log
@@ -98,7 +104,7 @@ class Cell(object):
         if pusch_log is not None:
             self._puschlog = pusch_log
 
-        self._uldlcfgidx = self._get_uldlcfgidx()
+        self._uldlcfgidx = self._get_uldlcfgidx(uldlcfgidx)
         self._next_dl_subfrm_offset = LTE_NEXT_DLSUBFRM_OFFSET[self._uldlcfgidx]
         self._dem_subfrm_offset = LTE_DEM_SUBFRM_OFFSET[self._uldlcfgidx]
         self._schd_subfrm_offset = LTE_SCHD_DLSUBFRM_OFFSET[self._uldlcfgidx]
@@ -136,24 +142,36 @@ class Cell(object):
         uluegid = self._ul.log.uegids if hasattr(self, '_ul') else set()
         return set.union(dluegid, uluegid)
 
-    def _get_uldlcfgidx(self):
-        '''用户输入uldlcfgidx'''
-
-#        uldlcfgidx = 255
-#        if hasattr(self, '_dl'):
-#            uldlcfgidx = self._dl.infer_uldlcfgidx()
-#        if uldlcfgidx == 255 and hasattr(self, '_ul'):
-#            uldlcfgidx = self._ul.infer_uldlcfgidx()
-#        if uldlcfgidx != 255:
-#            return uldlcfgidx
+    def _get_uldlcfgidx(self, uldlcfgidx=None):
+        '''获取上下行配比
 
-        while True:
-            uldlcfgidx = input('Please input uldlcfgidx(0,1,2,7):')
+            未指定时先根据下行调度推断，失败再根据上行调度推断，推断结果按Log目录缓存
+        '''
+        if uldlcfgidx is not None:
             if int(uldlcfgidx) not in [0, 1, 2, 7]:
-                print('Not support uldlcgfidx, input again:')
-                continue
+                raise ValueError('Not support uldlcfgidx: {0}'.format(uldlcfgidx))
             return int(uldlcfgidx)
 
+        def infer():
+            uldlcfgidx = 255
+            if hasattr(self, '_dl'):
+                uldlcfgidx = self._dl.infer_uldlcfgidx()
+            if uldlcfgidx == 255 and hasattr(self, '_ul'):
+                uldlcfgidx = self._ul.infer_uldlcfgidx()
+            return uldlcfgidx
+
+        index = self._log.index
+        if index is None:
+            uldlcfgidx = infer()
+        else:
+            files = list(self._dl.log.files if hasattr(self, '_dl') else []) + \
+                    list(self._ul.log.files if hasattr(self, '_ul') else [])
+            uldlcfgidx = index.derived('uldlcfgidx_{0}'.format(self._cellid), files, infer)
+            index.save()
+        if uldlcfgidx == 255:
+            raise ValueError('Cannot infer uldlcfgidx of cell {0}, please specify uldlcfgidx'.format(self._cellid))
+        return uldlcfgidx
+
     def get_ue(self, uegid=None):
         '''获取小区实例
             Args：
@@ -172,18 +190,28 @@ class Cell(object):
         else:
             return '非法uegid值，此ue不存在'
 
-    def _mismatch_idx(self, schdcols, schddata, matchcols, matchlog):
-        for matchdata in matchlog.gen_of_cols(matchcols):
-            matchdata = matchdata.dropna(how='any')
-            airtime_min = max(schddata[schdcols[0]].iat[0], matchdata[matchcols[0]].iat[0])
-            airtime_max = min(schddata[schdcols[0]].iat[-1], matchdata[matchcols[0]].iat[-1])
-            if airtime_min > airtime_max:
-                return pd.Index([])
-            schddata = schddata[(schddata[schdcols[0]] >= airtime_min) & (schddata[schdcols[0]] <= airtime_max)]
-            matchdata = matchdata[(matchdata[matchcols[0]] >= airtime_min) & (matchdata[matchcols[0]] <= airtime_max)]
-            merged = pd.merge(schddata, matchdata, left_on=schdcols, right_on=matchcols, how='left')
-            merged.index = schddata.index
-            return merged[merged[matchcols[2]].isnull()].index
+    def _find_mismatch(self, register):
+        '''执行单个不匹配查询，register(scan)登记查询并返回结果累积器'''
+        with self._log.shared_scan() as scan:
+            mis_match_data = register(scan)
+        return None if mis_match_data is None else mis_match_data.result().astype(np.uint32)
+
+    def scan_mismatches(self, scan, names):
+        '''在共享扫描中登记多个不匹配查询
+
+            Args：
+                scan: SharedScan实例
+                names: 查询名称列表，如['pusch_mismatch', 'ulcrcdem_mismatch']
+            Returns:
+                {名称: 结果累积器}，缺少相关Log的查询为None；扫描执行后用mismatch_results取结果
+        '''
+        return {name: getattr(self, '_scan_' + name)(scan) for name in names}
+
+    @staticmethod
+    def mismatch_results(mismatches):
+        '''将scan_mismatches登记的查询转为{名称: 不匹配记录}'''
+        return {name: None if data is None else data.result().astype(np.uint32)
+                for name, data in mismatches.items()}
 
     def find_pdsch_mismatch(self):
         '''查询L2和L1的PDSCH控制消息不匹配的情形，并输出相应的空口时间和UEGID
@@ -194,18 +222,37 @@ class Cell(object):
             return：
                 result：不匹配的空口时间，UEGID列表
         '''
+        return self._find_mismatch(self._scan_pdsch_mismatch)
 
+    # 同一次扫描中共用一个StreamJoin的右侧Log所需的列
+    _DLPHY_COLS = ['DLPHY_UE_EI_INFO.u32AirTime', 'UEGID', 'DLPHY_UE_EI_INFO.u8PDSCH_TS'] + \
+                  [r'DLPHY_UE_EI_INFO.u8PDCCH_CCEStartNo' + str(index) for index in np.arange(4)]
+    _PHYMGR_COLS = ['PHYMGR_INFO.u32DemTime', 'UEGID', 'PHYMGR_INFO.u8AckExist', 'PHYMGR_INFO.u8HarqProcID']
+
+    @staticmethod
+    def _join(scan, logfile, cols):
+        '''获取本次扫描中以logfile为右侧的StreamJoin，多个查询共用，右侧Log只读取一次'''
+        return scan.shared(('join', id(logfile)), lambda: StreamJoin(cols).attach(scan, logfile))
+
+    def _scan_pdsch_mismatch(self, scan):
+        '''登记PDSCH不匹配查询，返回结果累积器'''
         if not hasattr(self, '_dl') or not hasattr(self, '_dlphylog'):
             return None
 
         schdcols = ['AirTime', 'UEGID', 'SCHD.u8TranScheme']
-        dlphycols = ['DLPHY_UE_EI_INFO.u32AirTime', 'UEGID', 'DLPHY_UE_EI_INFO.u8PDSCH_TS']
-        mis_match_data = pd.DataFrame(columns=schdcols)
-        for schddata in self._dl.log.gen_of_cols(schdcols):
+        dlphycols = self._DLPHY_COLS[:3]
+        mis_match_data = Accumulator(columns=schdcols, ignore_index=True)
+        join = self._join(scan, self._dlphylog, self._DLPHY_COLS)
+
+        def consume(schddata):
             schddata = schddata.dropna(how='any')
-            mis_match_index = self._mismatch_idx(schdcols, schddata, dlphycols, self._dlphylog)
-            mis_match_data = pd.concat([mis_match_data, schddata.reindex(index=mis_match_index)], axis=0, ignore_index=True)
-        return mis_match_data.astype(np.uint32)
+            if 0 == len(schddata.index):
+                return
+            mis_match_index = join.unmatched(schdcols, schddata, dlphycols)
+            mis_match_data.append(schddata.reindex(index=mis_match_index))
+
+        join.add_left(scan, self._dl.log, schdcols, consume)
+        return mis_match_data
 
     def find_pdcch_mismatch(self):
         '''查询L2和L1的PDCCH控制消息不匹配的情形，并输出相应的空口时间和UEGID
@@ -215,38 +262,55 @@ class Cell(object):
             return：
                 result：不匹配的空口时间，UEGID列表
         '''
+        return self._find_mismatch(self._scan_pdcch_mismatch)
+
+    def _scan_pdcch_mismatch(self, scan):
+        '''登记PDCCH不匹配查询，返回结果累积器'''
         if not hasattr(self, '_dlphylog'):
             return None
 
+        dlphycols = self._DLPHY_COLS[:2] + self._DLPHY_COLS[3:]
+        join = self._join(scan, self._dlphylog, self._DLPHY_COLS)
+
         def mismatch(schdcols, schddata):
-            dlphycols = ['DLPHY_UE_EI_INFO.u32AirTime', 'UEGID', 'DLPHY_UE_EI_INFO.u8PDCCH_CCEStartNo']
-            mis_match_index = pd.Index([])
-            for index in np.arange(4):
-                dlphycols[2] = r'DLPHY_UE_EI_INFO.u8PDCCH_CCEStartNo' + str(index)
-                mis_match_index = self._mismatch_idx(schdcols, schddata, dlphycols, self._dlphylog)
+            # 与4个CCE起始位置都不匹配才算不匹配
+            for cce_col in dlphycols[2:]:
+                mis_match_index = join.unmatched(schdcols, schddata, dlphycols[:2] + [cce_col])
                 schddata = schddata.reindex(index=mis_match_index)
                 if 0 == len(mis_match_index):
                     break
             return schddata[['AirTime', 'UEGID']]
 
-        rlt = pd.DataFrame(columns=['AirTime', 'UEGID'])
+        rlt = Accumulator(columns=['AirTime', 'UEGID'], ignore_index=True)
+        ulrlt = Accumulator(columns=['AirTime', 'UEGID'], ignore_index=True)
         if hasattr(self, '_dl'):
-            schdcols = ['AirTime', 'UEGID', 'SCHD.u8CceStart']
-            for schddata in self._dl._log.gen_of_cols(schdcols):
+            dlcols = ['AirTime', 'UEGID', 'SCHD.u8CceStart']
+
+            def consume_dl(schddata):
                 schddata = schddata.dropna(how='any')
-                dl_dismatch = mismatch(schdcols, schddata)
-                rlt = pd.concat([rlt, dl_dismatch], axis=0, ignore_index=True)
+                if 0 == len(schddata.index):
+                    return
+                rlt.append(mismatch(dlcols, schddata))
+
+            join.add_left(scan, self._dl.log, dlcols, consume_dl)
 
         if hasattr(self, '_ul'):
-            schdcols = ['AirTime', 'UEGID', 'GRANT.u8CceStart', 'GRANT.u8IsDciSchd']
-            for schddata in self._ul.log.gen_of_cols(schdcols):
+            ulcols = ['AirTime', 'UEGID', 'GRANT.u8CceStart', 'GRANT.u8IsDciSchd']
+
+            def consume_ul(schddata):
                 schddata = schddata.dropna(how='any')
                 if 7 == self._uldlcfgidx:
-                    schddata['AirTime'] = schddata['AirTime'].map(lambda x: x+7 if (x%16 == 9) else x)
-                schddata = schddata[schddata[schdcols[3]] == 1]
-                ul_dismatch = mismatch(schdcols[:3], schddata)
-                rlt = pd.concat([rlt, ul_dismatch], axis=0, ignore_index=True)
-        return rlt.astype(np.uint32)
+                    airtime = schddata['AirTime'].values
+                    schddata['AirTime'] = np.where(airtime % 16 == 9, airtime + 7, airtime)
+                schddata = schddata[schddata[ulcols[3]] == 1]
+                if 0 == len(schddata.index):
+                    return
+                ulrlt.append(mismatch(ulcols[:3], schddata))
+
+            join.add_left(scan, self._ul.log, ulcols, consume_ul)
+            # 两个调度Log交替读取，扫描结束后再把上行结果接在下行结果之后
+            scan.on_done(lambda: rlt.append(ulrlt.result()))
+        return rlt
 
     def find_pucch_mismatch(self):
         '''查询L2和L1的PUCCH控制消息不匹配的情形，并输出相应的空口时间和UEGID
@@ -256,6 +320,10 @@ class Cell(object):
             return：
                 result：不匹配的空口时间，UEGID列表
         '''
+        return self._find_mismatch(self._scan_pucch_mismatch)
+
+    def _scan_pucch_mismatch(self, scan):
+        '''登记PUCCH不匹配查询，返回结果累积器'''
         if not hasattr(self, '_ul') or not hasattr(self, '_pucchlog'):
             return None
 
@@ -263,14 +331,15 @@ class Cell(object):
                     'PHYMGR_INFO.u8CqiExist', 'PHYMGR_INFO.u8SrExist']
         phycols = ['DSP1_PUCCH_UERUN_INFO.SystemSfn', 'UEGID', 'DSP1_PUCCH_UERUN_INFO.AckExist',
                      'DSP1_PUCCH_UERUN_INFO.CqiExist', 'DSP1_PUCCH_UERUN_INFO.SrExist']
-        mis_match_data = pd.DataFrame(columns=schdcols)
-        for schddata in self._ul.log.gen_of_cols(schdcols, val_filter={'PHYMGR_INFO.u8UlSchFlag': [0]}):
-            if 0 == len(schddata.index):
-                continue
-            mis_match_index = self._mismatch_idx(schdcols, schddata, phycols, self._pucchlog)
-            mis_match_data = pd.concat([mis_match_data, schddata.reindex(index=mis_match_index)], axis=0,
-                                       ignore_index=True)
-        return mis_match_data.astype(np.uint32)
+        mis_match_data = Accumulator(columns=schdcols, ignore_index=True)
+        join = self._join(scan, self._pucchlog, phycols)
+
+        def consume(schddata):
+            mis_match_index = join.unmatched(schdcols, schddata, phycols)
+            mis_match_data.append(schddata.reindex(index=mis_match_index))
+
+        join.add_left(scan, self._ul.log, schdcols, consume, val_filter={'PHYMGR_INFO.u8UlSchFlag': [0]})
+        return mis_match_data
 
     def find_pusch_mismatch(self):
         '''查询L2和L1的PUSCH控制消息不匹配的情形，并输出相应的空口时间和UEGID
@@ -280,19 +349,24 @@ class Cell(object):
             return：
                 result：不匹配的空口时间，UEGID列表
         '''
+        return self._find_mismatch(self._scan_pusch_mismatch)
+
+    def _scan_pusch_mismatch(self, scan):
+        '''登记PUSCH不匹配查询，返回结果累积器'''
         if not hasattr(self, '_ul') or not hasattr(self, '_puschlog'):
             return None
 
         schdcols = ['PHYMGR_INFO.u32DemTime', 'UEGID', 'PHYMGR_INFO.u8HarqProcID']
         phycols = ['DSP1_PUSCH_UE_RUN_INFO.SystemTime', 'UEGID', 'DSP1_PUSCH_UE_RUN_INFO.HarqProcID']
-        mis_match_data = pd.DataFrame(columns=schdcols)
-        for schddata in self._ul.log.gen_of_cols(schdcols, val_filter={'PHYMGR_INFO.u8UlSchFlag': [1]}):
-            if 0 == len(schddata.index):
-                continue
-            mis_match_index = self._mismatch_idx(schdcols, schddata, phycols, self._puschlog)
-            mis_match_data = pd.concat([mis_match_data, schddata.reindex(index=mis_match_index)], axis=0,
-                                       ignore_index=True)
-        return mis_match_data.astype(np.uint32)
+        mis_match_data = Accumulator(columns=schdcols, ignore_index=True)
+        join = self._join(scan, self._puschlog, phycols)
+
+        def consume(schddata):
+            mis_match_index = join.unmatched(schdcols, schddata, phycols)
+            mis_match_data.append(schddata.reindex(index=mis_match_index))
+
+        join.add_left(scan, self._ul.log, schdcols, consume, val_filter={'PHYMGR_INFO.u8UlSchFlag': [1]})
+        return mis_match_data
 
     def find_dlackdem_mismatch(self):
         '''查询下行Ack解调消息不匹配的情形，并输出相应的空口时间和UEGID
@@ -304,21 +378,27 @@ class Cell(object):
             return：
                 result：不匹配的空口时间，UEGID列表
         '''
+        return self._find_mismatch(self._scan_dlackdem_mismatch)
+
+    def _scan_dlackdem_mismatch(self, scan):
+        '''登记下行Ack解调不匹配查询，返回结果累积器'''
         if not hasattr(self, '_ul') or not hasattr(self, '_dl'):
             return None
 
         dlcols = ['ACK.u32DemTime', 'UEGID']
-        ulcols = ['PHYMGR_INFO.u32DemTime', 'UEGID', 'PHYMGR_INFO.u8AckExist']
-        mis_match_data = pd.DataFrame(columns=dlcols)
-        for schddata in self._dl.log.gen_of_cols(dlcols, val_filter={'ACK.u8IsSelfMainTain': [1]}):
-            if 0 == len(schddata.index):
-                continue
+        ulcols = self._PHYMGR_COLS[:3]
+        mis_match_data = Accumulator(columns=dlcols+['AckExits'], ignore_index=True)
+        # 右侧为上行调度Log，与其他上行查询在同一次扫描中读取
+        join = self._join(scan, self._ul.log, self._PHYMGR_COLS)
+
+        def consume(schddata):
             schddata = schddata.drop_duplicates()
             schddata.loc[:, 'AckExits'] = 1
-            mis_match_index = self._mismatch_idx(dlcols+['AckExits'], schddata, ulcols, self._ul.log)
-            mis_match_data = pd.concat([mis_match_data, schddata.reindex(index=mis_match_index)], axis=0,
-                                       ignore_index=True)
-        return mis_match_data.astype(np.uint32)
+            mis_match_index = join.unmatched(dlcols+['AckExits'], schddata, ulcols)
+            mis_match_data.append(schddata.reindex(index=mis_match_index))
+
+        join.add_left(scan, self._dl.log, dlcols, consume, val_filter={'ACK.u8IsSelfMainTain': [1]})
+        return mis_match_data
 
     def find_ulcrcdem_mismatch(self):
         '''上行CRC解调消息不匹配的情形，并输出相应的空口时间和UEGID
@@ -330,20 +410,28 @@ class Cell(object):
             return：
                 result：不匹配的空口时间，UEGID列表
         '''
+        return self._find_mismatch(self._scan_ulcrcdem_mismatch)
+
+    def _scan_ulcrcdem_mismatch(self, scan):
+        '''登记上行CRC解调不匹配查询，返回结果累积器'''
         if not hasattr(self, '_ul'):
             return None
 
         schdcols = ['CRCI.u32DemTime', 'UEGID', 'CRCI.u8CrcHarqId']
-        demcols = ['PHYMGR_INFO.u32DemTime', 'UEGID', 'PHYMGR_INFO.u8HarqProcID']
-        mis_match_data = pd.DataFrame(columns=schdcols)
-        for schddata in self._ul.log.gen_of_cols(schdcols, val_filter={'CRCI.b8IsSelfMainTain': [1]}):
+        demcols = self._PHYMGR_COLS[:2] + self._PHYMGR_COLS[3:]
+        mis_match_data = Accumulator(columns=schdcols, ignore_index=True)
+        # 左右两侧都是上行调度Log，共用同一次扫描
+        join = self._join(scan, self._ul.log, self._PHYMGR_COLS)
+
+        def consume(schddata):
             schddata = schddata.dropna(how='any').astype(np.uint32)
             if 0 == len(schddata.index):
-                continue
-            mis_match_index = self._mismatch_idx(schdcols, schddata, demcols, self._ul.log)
-            mis_match_data = pd.concat([mis_match_data, schddata.reindex(index=mis_match_index)], axis=0,
-                                       ignore_index=True)
-        return mis_match_data.astype(np.uint32)
+                return
+            mis_match_index = join.unmatched(schdcols, schddata, demcols)
+            mis_match_data.append(schddata.reindex(index=mis_match_index))
+
+        join.add_left(scan, self._ul.log, schdcols, consume, val_filter={'CRCI.b8IsSelfMainTain': [1]})
+        return mis_match_data
 
     def show_ue_livetime(self):
         cols = ['AirTime', 'UEGID']
@@ -371,6 +459,34 @@ class Cell(object):
         fig, ax = plt.subplots(1, 1)
         rlt.plot(ax=ax, kind='line', title='Ue_Alive_time')
 
+    def why_selfmaintain(self):
+        '''分析本小区上下行所有自维护的原因
+
+            上下行自维护记录和所需的不匹配查询在一次共享扫描中完成，每类不匹配记录只计算一次
+            Args：
+                无
+            Returns:
+                DataFrame格式，列为['Link', 'DemTime', 'UEGID', 'Reason']，Link为'DL'或'UL'
+        '''
+        schds = [(link, schd) for link, schd in [('DL', self.dl), ('UL', self.ul)] if schd is not None]
+        names = []
+        for _, schd in schds:
+            names.extend(name for name in schd.SELFMAINTAIN_REASONS if name not in names)
+
+        with self._log.shared_scan() as scan:
+            selfdatas = [(link, schd, schd._scan_selfmaintain(scan)) for link, schd in schds]
+            mismatches = self.scan_mismatches(scan, names)
+        mismatches = self.mismatch_results(mismatches)
+
+        cols = ['Link', 'DemTime', 'UEGID', 'Reason']
+        rlt = Accumulator(columns=cols, ignore_index=True, empty_columns=cols)
+        for link, schd, selfdata in selfdatas:
+            data = schd.attribute_selfmaintain(selfdata.result(), mismatches)
+            data.columns = cols[1:]
+            data.insert(0, cols[0], link)
+            rlt.append(data)
+        return rlt.result()
+
     def describle(self):
         '''小区整体信息描述'''
         rlt = pd.Series(name='小区整体信息描述')
@@ -378,29 +494,27 @@ class Cell(object):
         rlt['dlschd_log_lines'] = self._dl.log.lines if hasattr(self, '_dl') else 0
         rlt['ulschd_log_lines'] = self._ul.log.lines if hasattr(self, '_ul') else 0
         rlt['dlphy_log_lines'] = self._dlphylog.lines if hasattr(self, '_dlphylog') else 0
-        pdsch_mismatch = self.find_pdsch_mismatch()
-        rlt['pdsch_mismatch_cnt'] = 0 if pdsch_mismatch is None else len(pdsch_mismatch.index)
-        pdcch_mismatch = self.find_pdsch_mismatch()
-        rlt['pdcch_mismatch_cnt'] = 0 if pdcch_mismatch is None else len(pdcch_mismatch.index)
-        pucch_mismatch = self.find_pucch_mismatch()
-        rlt['pucch_mismatch_cnt'] = 0 if pucch_mismatch is None else len(pucch_mismatch.index)
-        pusch_mismatch = self.find_pusch_mismatch()
-        rlt['pusch_mismatch_cnt'] = 0 if pusch_mismatch is None else len(pusch_mismatch.index)
-        dlackdem_mismatch = self.find_dlackdem_mismatch()
-        rlt['dlackdem_mismatch_cnt'] = 0 if dlackdem_mismatch is None else len(dlackdem_mismatch.index)
-        ulcrcdem_mismatch = self.find_ulcrcdem_mismatch()
-        rlt['ulcrcdem_mismatch_cnt'] = 0 if ulcrcdem_mismatch is None else len(ulcrcdem_mismatch.index)
+        # 所有不匹配查询共用一次扫描，调度Log和PHY Log各只读取一次：
+        # PDSCH和PDCCH查询共用DL PHY的流式匹配，下行ACK和上行CRC解调查询的右侧数据来自同一次上行调度Log扫描
+        with self._log.shared_scan() as scan:
+            mismatches = [('pdsch_mismatch_cnt', self._scan_pdsch_mismatch(scan)),
+                          ('pdcch_mismatch_cnt', self._scan_pdcch_mismatch(scan)),
+                          ('pucch_mismatch_cnt', self._scan_pucch_mismatch(scan)),
+                          ('pusch_mismatch_cnt', self._scan_pusch_mismatch(scan)),
+                          ('dlackdem_mismatch_cnt', self._scan_dlackdem_mismatch(scan)),
+                          ('ulcrcdem_mismatch_cnt', self._scan_ulcrcdem_mismatch(scan))]
+        for name, mis_match_data in mismatches:
+            rlt[name] = 0 if mis_match_data is None else len(mis_match_data)
         return rlt.astype(np.uint32)
     
     def set_airtimes_interval(self, start, end):
         '''指定当前log的时间范围
             Args：
                 start:起始时间
-                end:截止时间
+                end:截止时间，早于start时认为跨过了翻转点
             Returns:
                 无
         '''
-        assert(start <= end)
         if self._dl.log:
             self._dl.log.set_airtimes_interval(start, end)
             
@@ -3,11 +3,20 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from loganalysis.const import *
+from loganalysis.log import SharedScan
+from loganalysis.accumulator import Accumulator
+from loganalysis.hist import hist2d
+from .harq import HarqMatcher, ack_subframe_table, first_chunk
+from .kpi import ue_matrices
+from .reason import attribute_mismatches, infer_schdfail_reasons
 
 
 class DlSchd():
     '''下行调度分析类'''
 
+    # 自维护原因，按优先级排列，对应Cell中的不匹配查询
+    SELFMAINTAIN_REASONS = ['dlackdem_mismatch', 'pucch_mismatch', 'pusch_mismatch']
+
     def __init__(self, log, cell, uegid=None):
         self._type = LTE_FILE_DLSCHD
         self._log = log
@@ -37,15 +46,14 @@ class DlSchd():
         '''
         ack_cols = ['ACK.u32DemTime', 'ACK.u8Tb0AckInfo', 'ACK.u8Tb1AckInfo']
         rlt = pd.DataFrame()
-        for data in self._log.gen_of_cols(ack_cols):
+        for data in self._log.gen_of_cols(ack_cols, dense=True):
             data = data.dropna(how='any').astype(np.uint32)
             if subframe < 10:
                 data = data[data[ack_cols[0]]%16 == subframe]
             if 0 == data.size:
                 continue
             ack_sum = data[ack_cols[1]] + data[ack_cols[2]]
-            cnt = ack_sum.groupby(data[ack_cols[0]] // (airtime_bin_size*1600)).apply(
-                lambda x: x.value_counts()).unstack(level=1)
+            cnt = hist2d(data[ack_cols[0]] // (airtime_bin_size*1600), ack_sum)
             rlt = rlt.add(cnt, fill_value=0)
 
         def func(data):
@@ -169,44 +177,65 @@ class DlSchd():
         '''
         col = ['SCHD_FAIL_RSN.u32UeSchdFailRsn']
         rlt = pd.Series(name='SchdFail_Cnt')
-        for data in self._log.gen_of_cols(col):
+        for data in self._log.gen_of_cols(col, dense=True):
             data = data[col[0]].dropna().astype(np.int32).value_counts()
             rlt = rlt.add(data, fill_value=0) if rlt is not None else data
         rlt.index = [LTE_SCHD_FAIL_RSNS[int(idx)] for idx in rlt.index]
         rlt.index.name='Fail_Rsn'
         return rlt
 
+    def infer_schdfail_reasons(self):
+        '''批量推测当前时间范围内每个UE没有得到调度的原因
+
+            一次遍历Log，对每个有失败原因或BSR记录、但没有调度的(UEGID, TTI)推测原因，判断规则同_infer_schdfail_reason
+            Args：
+                无
+            Returns：
+                DataFrame格式，列为['AirTime', 'UEGID', 'AbsTti', 'Reason']，按UEGID和时间排序，
+                Reason为Categorical格式，取值为LTE_SCHD_FAIL_RSNS和LTE_SCHD_FAIL_INFER_RSNS
+        '''
+        cols = ['UEGID', ABSTTI_COL, 'SCHD.u8HarqId', 'SCHD_FAIL_RSN.u32UeSchdFailRsn', 'BSRCHANGE.u8LchId',
+                'BSRCHANGE.b8LchHasBsr', 'LCH_SCHD.u8LchId', 'LCH_SCHD.u16RlcRptBsr', 'LCH_SCHD.u16SchdBsr']
+        events = [cols[2], cols[3], cols[4], cols[6]]
+        data = Accumulator(columns=cols)
+        for chunk in self._log.gen_of_cols(cols):
+            data.append(chunk[chunk[events].notna().any(axis=1).values])
+        rlt = infer_schdfail_reasons(data.result(), cols)
+        tti = rlt[ABSTTI_COL].values % TTI_PERIOD
+        rlt.insert(0, 'AirTime', tti // 10 * 16 + tti % 10)
+        return rlt
+
     def match_schd_and_ack(self, cols):
         ''' 匹配调度和Ack反馈信息
 
-            根据调度时间，UEGID，HarqID匹配调度与ACK信息
+            根据调度时间，UEGID，HarqID匹配调度与ACK信息，ACK在后续数据块或文件中的也能匹配
             Args：
-                cols: 匹配后输出的列名
+                cols: 匹配后输出的列名，以ACK开头的列取自匹配到的ACK记录
             Yields:
                 DataFrame, 生成器方式
         '''
         schdcols = ['FN', 'UEGID', 'SCHD.u8HarqId']
         demcols = ['ACK.u32DemTime', 'UEGID', 'ACK.u8HarqId']
-        totcols = list(set(['AirTime'] + schdcols + demcols + cols))
-        for data in self._log.gen_of_cols(cols=totcols):
-            data['FN'] = data['AirTime'].map(self._get_demtime)
-            addcols = [col for col in cols if col.startswith('ACK')]
-            matchcols = np.union1d(addcols, demcols)
-            matchdata = data[matchcols]
-            data = data.drop(np.setdiff1d(matchcols, ['UEGID']), axis=1)
-            merged = pd.merge(data, matchdata, how='left', left_on=schdcols, right_on=demcols)
-            yield merged[cols]
+        totcols = list(set(['AirTime'] + schdcols + demcols + cols) - {'FN'})
+        matcher = HarqMatcher(schdcols, demcols, cols, 'ACK')
+
+        def chunks():
+            for data in self._log.gen_of_cols(cols=totcols):
+                data['FN'] = self._get_demtime(data['AirTime'].values)
+                yield data
+
+        return matcher.match(chunks())
 
     def _get_schdtime(self, demtime):
-        '''给定解调时间，计算调度时间'''
-        subfrm = demtime % 16
-        offset = self._cell._schd_subfrm_offset[subfrm]
+        '''给定解调时间，计算调度时间，支持标量或者数组'''
+        demtime = np.asarray(demtime).astype(np.uint32)
+        offset = np.asarray(self._cell._schd_subfrm_offset)[demtime % 16]
         return self._log.difftime(demtime, offset)
 
     def _get_demtime(self, schdtime):
-        '''给定调度时间，计算解调时间'''
-        subfrm = schdtime % 16
-        offset = self._cell._dem_subfrm_offset[subfrm]
+        '''给定调度时间，计算解调时间，支持标量或者数组'''
+        schdtime = np.asarray(schdtime).astype(np.uint32)
+        offset = np.asarray(self._cell._dem_subfrm_offset)[schdtime % 16]
         return self._log.addtime(schdtime, offset)
 
     def is_valid_airtime(self, airtime):
@@ -215,33 +244,36 @@ class DlSchd():
 
     def find_selfmaintain(self):
         '''查找是否存在自维护, 并输出相关信息'''
+        with SharedScan() as scan:
+            rlt = self._scan_selfmaintain(scan)
+        return rlt.result()
 
+    def _scan_selfmaintain(self, scan):
+        '''登记自维护查询，返回结果累积器'''
         cols = ['ACK.u32DemTime', 'UEGID', 'ACK.u8HarqId', 'ACK.u8IsSelfMainTain']
-        rlt = pd.DataFrame(columns=cols)
-        for data in self._log.gen_of_cols(cols):
-            data = data[data[cols[3]] == 1]
-            rlt = rlt.append(data)
+        rlt = Accumulator(columns=cols)
+        scan.add(self._log, cols, rlt.append, val_filter={cols[3]: [1]})
         return rlt
 
     def find_harqfail(self):
         '''查找是否存harqfail, 并输出相关信息'''
 
         cols = ['ACK.u32DemTime', 'UEGID', 'ACK.u8HarqId', 'ACK.u8Tb0IsHarqFail', 'ACK.u8Tb1IsHarqFail']
-        rlt = pd.DataFrame(columns=cols)
+        rlt = Accumulator(columns=cols)
         for data in self._log.gen_of_cols(cols):
             data = data[(data[cols[3]] == 1) | (data[cols[4]] == 1)]
-            rlt = rlt.append(data)
-        return rlt
+            rlt.append(data)
+        return rlt.result()
 
     def find_dtx(self):
         '''查找是否存dtx, 并输出相关信息'''
 
         cols = ['ACK.u32DemTime', 'UEGID', 'ACK.u8HarqId', 'ACK.u8Tb0AckInfo', 'ACK.u8Tb1AckInfo']
-        rlt = pd.DataFrame(columns=cols)
+        rlt = Accumulator(columns=cols)
         for data in self._log.gen_of_cols(cols):
             data = data[(data[cols[3]] == 2) | (data[cols[4]] == 2)]
-            rlt = rlt.append(data)
-        return rlt
+            rlt.append(data)
+        return rlt.result()
 
     def find_bler_over(self, thresh, airtime_bin_size=1):
         '''查找bler超过一定门限的时间,时间粒度可以指定
@@ -267,25 +299,24 @@ class DlSchd():
         
         if self._cell is None:
             return 'cell is None, cant analysize '
-        
-        cols = ['ACK.u32DemTime', 'UEGID']
-        selfdata = self.find_selfmaintain()[cols].drop_duplicates().astype(np.uint32)
-        dlackdem_mismatch = self._cell.find_dlackdem_mismatch()
-        pucch_mismatch = self._cell.find_pucch_mismatch()
-        pusch_mismatch = self._cell.find_pusch_mismatch()
-
-        for idx in selfdata.index:
-            mismatchs = [dlackdem_mismatch, pucch_mismatch, pusch_mismatch]
-            reasons = ['dlackdem_mismatch', 'pucch_mismatch', 'pusch_mismatch']
-            for reason_idx, mismatch in enumerate(mismatchs):
-                mismatch_cols = mismatch.columns  # 默认解调时间都在第一个位置
-                mask = (mismatch[mismatch_cols[0]] == selfdata.at[idx, cols[0]])\
-                       & (mismatch[cols[1]] == selfdata.at[idx, cols[1]])
-                ack_filter = mismatch[mask]
-                if len(ack_filter.index) != 0:
-                    selfdata.loc[idx, 'Reason'] = reasons[reason_idx]
-                    break
 
+        with SharedScan() as scan:
+            selfdata = self._scan_selfmaintain(scan)
+            mismatches = self._cell.scan_mismatches(scan, self.SELFMAINTAIN_REASONS)
+        return self.attribute_selfmaintain(selfdata.result(), self._cell.mismatch_results(mismatches))
+
+    def attribute_selfmaintain(self, selfdata, mismatches):
+        '''按优先级将自维护记录归因到不匹配记录
+
+            Args：
+                selfdata: find_selfmaintain的结果
+                mismatches: {原因: 不匹配记录}，不匹配记录的第一列为解调时间
+            return：
+                demtime, uegid：reason 列表
+        '''
+        cols = ['ACK.u32DemTime', 'UEGID']
+        selfdata = selfdata[cols].drop_duplicates().astype(np.uint32)
+        selfdata['Reason'] = attribute_mismatches(selfdata, cols, self.SELFMAINTAIN_REASONS, mismatches)
         return selfdata
     
     def show_throuput(self, airtime_bin_size=1):
@@ -372,6 +403,19 @@ class DlSchdCell(DlSchd):
     def __init__(self, log, cell):
         super(DlSchdCell, self).__init__(log, cell)
 
+    def ue_matrices(self, airtime_bin_size=1):
+        '''一次HARQ匹配计算小区内所有UE的流量和BLER矩阵
+
+            Args:
+                airtime_bin_size：统计粒度，默认为1s
+            Returns：
+                (流量, bler)，均为DataFrame格式，行为时间粒度，列为UEGID，稀疏存储；
+                流量单位Kbits，没有调度的时间粒度为0；bler没有反馈时为空值
+        '''
+        assert(airtime_bin_size>=1)
+        cols = ['AirTime', 'UEGID', 'TB.u16TbSize', 'ACK.u8Tb0AckInfo', 'ACK.u8Tb1AckInfo']
+        return ue_matrices(self.match_schd_and_ack(cols), cols, airtime_bin_size)
+
     def infer_uldlcfgidx(self):
         '''推测上下行配比
 
@@ -385,47 +429,25 @@ class DlSchdCell(DlSchd):
 
         schdcols = ['UEGID', 'AirTime', 'SCHD.u8HarqId']
         ackcols = ['UEGID', 'ACK.u32DemTime', 'ACK.u8HarqId']
-        data = next(self._log.gen_of_cols(cols=schdcols + ackcols[1:]))[:400]
+        data = first_chunk(self._log, schdcols + ackcols[1:])
+        if data is None:
+            return 255
         ackdata = data[ackcols].dropna(how='any').astype(np.uint32)
         schddata = data[schdcols].dropna(how='any').astype(np.uint32)
-
-        def get_deminfo_idx(schdidx, uegid, airtime, harqid):
-            for idx in ackdata.index:
-                if idx <= schdidx:
-                    continue
-                if ackdata.at[idx, ackcols[0]] == uegid and ackdata.at[idx, ackcols[2]] == harqid:
-                    demtime = ackdata.at[idx, ackcols[1]]
-                    if self._log.difftime(demtime, airtime) < 32:
-                        return idx
-                    else:
-                        return -1
-            return -1
-
-        ack_table = np.zeros((10, 10))
-        for idx in schddata.index:
-            if schddata.at[idx, 'SCHD.u8HarqId'] > 7:
-                return 2
-
-            ackidx = get_deminfo_idx(idx, *schddata.loc[idx, schdcols])
-            if -1 == ackidx:
-                continue
-
-            airtime = ackdata.at[ackidx, 'ACK.u32DemTime']
-            ackfrm = ackdata.at[ackidx, 'ACK.u32DemTime'] % 16
-            subfrm = schddata.at[idx, 'AirTime'] % 16
-            if 1 == ack_table[subfrm][ackfrm]:
-                continue
-            ack_table[subfrm][ackfrm] = 1
-            if sum(ack_table[3]) != 0 or sum(ack_table[8]) != 0 or ack_table[4][2] != 0 or ack_table[9][7] != 0:
-                return 2
-            if ack_table[4][8] != 0 or ack_table[9][3] != 0:
-                return 1
-            if ack_table[5][9] != 0:
-                return 0
-            if ack_table[0][4] != 0 and ack_table[[1, 5, 6]].sum() != 0:
-                return 0
-            if ack_table[1][5] != 0:
-                return 7
+        if (schddata['SCHD.u8HarqId'] > 7).any():
+            return 2
+
+        ack_table = ack_subframe_table(schddata, ackdata, schdcols, ackcols)
+        if ack_table[[3, 8]].sum() != 0 or ack_table[4][2] != 0 or ack_table[9][7] != 0:
+            return 2
+        if ack_table[4][8] != 0 or ack_table[9][3] != 0:
+            return 1
+        if ack_table[5][9] != 0:
+            return 0
+        if ack_table[0][4] != 0 and ack_table[[1, 5, 6]].sum() != 0:
+            return 0
+        if ack_table[1][5] != 0:
+            return 7
         return 255
 
 
@@ -446,8 +468,8 @@ class DlSchdUe(DlSchd):
         '''
         cols = ['AirTime', 'SCHD.u8Tac', 'TA.as16Cp0RptTa', 'TA.as16Cp1RptTa']
         rlt = self._log.get_data_of_cols(cols)
-        rlt[cols[0]] = rlt[cols[0]].map(self._log.dectime)
-        rlt[cols[1]] = rlt[cols[1]].map(lambda x: (x-31)*16)
+        rlt[cols[0]] = self._log.dectime(rlt[cols[0]].values)
+        rlt[cols[1]] = (rlt[cols[1]].astype('Int16')-31)*16
         rlt = rlt.set_index(cols[0])
         rlt[rlt==-32767] = None    
         ax = plt.subplots(3, 1, sharex=True)[1]
@@ -472,53 +494,59 @@ class DlSchdUe(DlSchd):
         return True
 
     def get_idx_of_lastschd(self, curtime):
-        '''距离当前时间往前的最近一次调度索引'''
+        '''距离当前时间往前的最近一次调度位置，(文件名, 行号)格式，没有时为None'''
         return self._log.get_idx_of_last_cols(curtime, ['SCHD.u8HarqId'], how='all')
 
     def _infer_schdfail_reason(self, airtime):
         '''分析指定时间UE没有得到调度的原因
 
+            通过as-of索引定位上一次调度，只读取上一次调度到指定时间之间的记录
             Args:
                 airtime：指定时间
-                max_tti_ue_num: 每TTI最大调度UE数，默认为4
             Returns：
                 result: failrsn
         '''
         assert(airtime % 16 < 10)
-        last_schd_idx = self._log.get_idx_of_last_cols(airtime, ['SCHD.u8HarqId'], how='any')
-        if -1 == last_schd_idx:
+        if not self._log.locate(airtime):
             return 'AirTime:{airtime}不在Log空口时间范围内，没有相关Log'.format(airtime=airtime)
-        if 0 == last_schd_idx:
-            return 'AirTime:{airtime}已经被调度'.format(airtime=airtime)
 
-        cols = ['AirTime', 'SCHD_FAIL_RSN.u32UeSchdFailRsn', 'BSRCHANGE.u8LchId', 'BSRCHANGE.b8LchHasBsr',
+        schdcol = 'SCHD.u8HarqId'
+        cols = ['SCHD_FAIL_RSN.u32UeSchdFailRsn', 'BSRCHANGE.u8LchId', 'BSRCHANGE.b8LchHasBsr',
                 'LCH_SCHD.u8LchId', 'LCH_SCHD.u16RlcRptBsr', 'LCH_SCHD.u16SchdBsr']
-        last_bsr_idx = self._log.get_idx_of_last_cols(airtime, cols, how='all')
-        if -1 == last_bsr_idx or last_bsr_idx < last_schd_idx:
+        self._log.asof_index([schdcol] + cols)
+        tti = self._log.timeline.to_abstti(airtime)
+        last_schd = self._log.get_last_of_cols([airtime], [schdcol])
+        if last_schd[ABSTTI_COL].iat[0] == tti:
+            return 'AirTime:{airtime}已经被调度'.format(airtime=airtime)
+
+        last_bsr = self._log.get_last_of_cols([airtime], cols, how='any')
+        if last_schd['File'].iat[0] is None or last_bsr[ABSTTI_COL].iat[0] < last_schd[ABSTTI_COL].iat[0]:
             return 'Log中没有Airtime:{airtime}周围的调度数据，无法分析'.format(airtime=airtime)
 
-        data = self._log.get_data_of_cols(cols)
-        faildata = data[(data[cols[0]] == airtime) & data[cols[1]]]
+        start = int(last_schd['AirTime'].iat[0])
+        data = self._log.get_data_between_airtimes(start, airtime, cols + [ABSTTI_COL])
+        data = data[data[ABSTTI_COL] >= last_schd[ABSTTI_COL].iat[0]].reset_index(drop=True)
+        faildata = data.loc[(data[ABSTTI_COL] == tti) & data[cols[0]].notna(), cols[0]]
         if faildata.size:
-            return LTE_SCHD_FAIL_RSNS[int(faildata[cols[1]].iat[0])]
-
-        data = data[data.index.isin(np.arange(last_schd_idx, last_bsr_idx+1, 1))]
-        lch_cols = ['bsr_change', 'rlc_rpt_bsr', 'schd_bsr']
-        lch_bsr = pd.DataFrame()
-        for idx in data.index:
-            if data.at[idx, cols[4]]:
-                lch_bsr.at[data.at[idx, cols[4]], lch_cols[0]] = 1
-                lch_bsr.at[data.at[idx, cols[4]], lch_cols[1]] = data.at[idx, cols[5]]
-                lch_bsr.at[data.at[idx, cols[4]], lch_cols[2]] = data.at[idx, cols[6]]
-            if data.at[idx, cols[2]]:
-                lch_bsr.at[data.at[idx, cols[2]], lch_cols[0]] = data.at[idx, cols[3]]
-        if 0 == lch_bsr[lch_cols[0]].sum():
+            return LTE_SCHD_FAIL_RSNS[int(faildata.iat[0])]
+
+        # 每个逻辑信道最后一次的BSR变化，同一行内BSRCHANGE晚于LCH_SCHD
+        lchids = data[cols[3]].to_numpy(dtype=np.float64, na_value=np.nan)
+        chgids = data[cols[1]].to_numpy(dtype=np.float64, na_value=np.nan)
+        lchmask = ~np.isnan(lchids) & (lchids != 0)
+        chgmask = ~np.isnan(chgids) & (chgids != 0)
+        order = np.arange(len(data.index)) * 2
+        change = pd.DataFrame({'order': np.concatenate([order[lchmask], order[chgmask] + 1]),
+                               'lch': np.concatenate([lchids[lchmask], chgids[chgmask]]),
+                               'bsr_change': np.concatenate([np.ones(lchmask.sum()),
+                                                             data[cols[2]].to_numpy(dtype=np.float64, na_value=np.nan)[chgmask]])})
+        change = change.sort_values('order').groupby('lch')['bsr_change'].last()
+        if 0 == change.sum():
             return '没有BSR'
-        if data[data['AirTime'] == airtime][cols[2]].sum():
+        if data.loc[data[ABSTTI_COL] == tti, cols[1]].sum():
             return '调度结束才收到BSR'
-        if (lch_bsr[lch_cols[1]] <= lch_bsr[lch_cols[2]]).all():
+        bsr = data.loc[lchmask, cols[3:]].groupby(cols[3]).last().reindex(change.index)
+        if (bsr[cols[4]] <= bsr[cols[5]]).all():
             return 'RLC上报的BSR为0'
 
-        return '需要人工分析，上下文行索引范围：[{minidx}, {maxidx}]'.format(
-            minidx=last_schd_idx, maxidx=last_bsr_idx)
-
+        return '需要人工分析，上下文空口时间范围：[{start}, {end}]'.format(start=hex(start), end=hex(airtime))
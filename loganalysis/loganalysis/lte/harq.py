@@ -0,0 +1,156 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+from loganalysis.log import LogFile
+
+
+def ack_subframe_table(schddata, ackdata, schdcols, ackcols, window=32):
+    '''统计调度子帧与反馈(ACK/CRC)解调子帧的对应关系
+
+        每条调度记录匹配其后第一条UEGID和HarqId相同的反馈记录，解调时间与调度时间相差小于window时有效
+        Args:
+            schddata: 调度记录，行索引为文件中的行号
+            ackdata: 反馈记录，行索引为文件中的行号
+            schdcols: 调度记录的[UEGID列, 调度时间列, HarqId列]
+            ackcols: 反馈记录的[UEGID列, 解调时间列, HarqId列]
+            window: 有效匹配的最大时间差(16进制空口时间)
+        Returns:
+            10x10数组，table[调度子帧][解调子帧]为1表示存在该时序
+    '''
+    table = np.zeros((10, 10))
+    if 0 == len(schddata.index) or 0 == len(ackdata.index):
+        return table
+
+    schd = pd.DataFrame({'UEGID': schddata[schdcols[0]].values.astype(np.uint32),
+                         'HarqId': schddata[schdcols[2]].values.astype(np.uint32),
+                         'AirTime': schddata[schdcols[1]].values.astype(np.uint32),
+                         'Row': schddata.index.values.astype(np.int64)})
+    ack = pd.DataFrame({'UEGID': ackdata[ackcols[0]].values.astype(np.uint32),
+                        'HarqId': ackdata[ackcols[2]].values.astype(np.uint32),
+                        'DemTime': ackdata[ackcols[1]].values.astype(np.uint32),
+                        'Row': ackdata.index.values.astype(np.int64)})
+    merged = pd.merge_asof(schd, ack, on='Row', by=['UEGID', 'HarqId'], direction='forward',
+                           allow_exact_matches=False).dropna(subset=['DemTime'])
+    airtime = merged['AirTime'].values.astype(np.uint32)
+    demtime = merged['DemTime'].values.astype(np.uint32)
+    valid = np.asarray(LogFile.difftime(demtime, airtime) < window)
+    schdfrm = airtime[valid] % 16
+    demfrm = demtime[valid] % 16
+    valid = (schdfrm < 10) & (demfrm < 10)
+    table[schdfrm[valid], demfrm[valid]] = 1
+    return table
+
+
+def first_chunk(log, cols):
+    '''获取Log中第一个非空的数据块，没有数据时返回None'''
+    for data in log.gen_of_cols(cols):
+        if len(data.index):
+            return data
+    return None
+
+
+class HarqMatcher(object):
+    '''调度与HARQ反馈的流式匹配
+
+        逐块输入调度Log，按(时间, UEGID, HarqId)左连接调度记录与反馈记录。当前数据块中没有找到反馈的
+        调度记录暂存到下一个数据块(可以跨文件)继续匹配，直到反馈时间超过其时间slack以上才作为未匹配输出。
+        只保留连接列和输出列，暂存的调度记录不超过slack时间范围。
+    '''
+
+    def __init__(self, schdcols, ackcols, cols, ackprefix, slack=JOIN_TIME_SLACK):
+        '''初始化匹配器
+
+            Args:
+                schdcols: 调度侧连接列[时间, UEGID, HarqId]
+                ackcols: 反馈侧连接列[时间, UEGID, HarqId]，与schdcols按位置对应
+                cols: 输出列，其中反馈侧的列从匹配到的反馈记录中获取
+                ackprefix: 反馈侧列名的前缀，如'ACK'或'CRCI'
+                slack: 反馈相对调度的最大等待时间(16进制空口时间)
+        '''
+        self._schdcols = schdcols
+        self._ackcols = ackcols
+        self._cols = cols
+        self._addcols = [col for col in cols if col.startswith(ackprefix)]
+        self._outcols = [col for col in cols if col not in self._addcols]
+        self._slack = slack
+        self._pending = None
+        self._acktime = None
+
+    @staticmethod
+    def _elapsed(time1, time2):
+        '''空口时间time1晚于time2的TTI数，按空口时间翻转处理，time1早于time2时为负数'''
+        diff = (LogFile.dectime(time1).astype(np.int64) - LogFile.dectime(time2)) % TTI_PERIOD
+        return np.where(diff >= TTI_PERIOD // 2, diff - TTI_PERIOD, diff)[()]
+
+    def _output(self, data):
+        '''按输出列整理数据，缺少的反馈列为空值'''
+        return data.reindex(columns=self._cols)
+
+    def feed(self, data):
+        '''输入一个数据块，返回已确定匹配结果的记录
+
+            Args:
+                data: 调度Log数据块，需包含连接列和输出列
+            Returns:
+                DataFrame格式，列为cols；没有HarqId的记录直接输出，反馈侧的列为空值
+        '''
+        schdcols, ackcols = self._schdcols, self._ackcols
+        keyed = data[schdcols].notna().all(axis=1).values
+        others = data.loc[~keyed, self._outcols]
+
+        schddata = data.loc[keyed, list(dict.fromkeys(schdcols + self._outcols))]
+        schddata = schddata.assign(_matched=False)
+        if self._pending is not None:
+            schddata = pd.concat([self._pending, schddata], ignore_index=True)
+        else:
+            schddata = schddata.reset_index(drop=True)
+        ackdata = data.loc[data[ackcols].notna().all(axis=1).values,
+                           list(dict.fromkeys(ackcols + self._addcols))]
+        if len(ackdata.index):
+            acktimes = np.asarray(ackdata[ackcols[0]], dtype=np.uint32)
+            acktime = acktimes[np.argmax(self._elapsed(acktimes, acktimes[-1]))]
+            if self._acktime is None or self._elapsed(acktime, self._acktime) > 0:
+                self._acktime = acktime
+
+        # 每条反馈只在其所在的数据块中参与匹配，已匹配的调度记录继续暂存，以匹配后续重复的反馈
+        merged = pd.merge(schddata.drop(columns='_matched').reset_index(), ackdata, how='inner',
+                          left_on=schdcols, right_on=ackcols)
+        matched = schddata['_matched'].values | np.isin(np.arange(len(schddata.index)), merged['index'].values)
+        schddata['_matched'] = matched
+        if self._acktime is None:
+            expired = np.zeros(len(schddata.index), dtype=bool)
+        else:
+            expired = self._elapsed(self._acktime, np.asarray(schddata[schdcols[0]], dtype=np.uint32)) \
+                > LogFile.dectime(self._slack)
+        self._pending = schddata[~expired]
+        rlt = [others, merged, schddata[expired & ~matched]]
+        return self._concat(rlt)
+
+    def _concat(self, chunks):
+        '''按输出列拼接多个数据块'''
+        chunks = [self._output(data) for data in chunks if len(data.index)]
+        if not chunks:
+            return pd.DataFrame(columns=self._cols)
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0].reset_index(drop=True)
+
+    def flush(self):
+        '''输出暂存的从未匹配的调度记录'''
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return self._concat([])
+        return self._concat([pending[~pending['_matched'].values]])
+
+    def match(self, chunks):
+        '''逐块匹配，最后输出暂存的未匹配调度记录
+
+            Args:
+                chunks: 数据块迭代器
+            Yields:
+                DataFrame格式，列为cols
+        '''
+        for data in chunks:
+            yield self.feed(data)
+        rlt = self.flush()
+        if len(rlt.index):
+            yield rlt
@@ -0,0 +1,144 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+
+# KPI指标定义：{名称: (文件类型, 时间列, 统计方式, 数据列)}
+# 统计方式：bler为(NACK+DTX)/(NACK+ACK+DTX)，throughput为TB大小之和(Kbits)，count为非空次数，
+# mean为平均值，schdfail为各失败原因的次数
+KPI_METRICS = {
+    'dl_bler': (LTE_FILE_DLSCHD, 'ACK.u32DemTime', 'bler', ['ACK.u8Tb0AckInfo', 'ACK.u8Tb1AckInfo']),
+    'dl_throughput': (LTE_FILE_DLSCHD, 'AirTime', 'throughput', ['TB.u16TbSize']),
+    'dl_schd_uecnt': (LTE_FILE_DLSCHD, 'AirTime', 'count', ['SCHD.u8HarqId']),
+    'dl_rbnum': (LTE_FILE_DLSCHD, 'AirTime', 'mean', ['SCHD.u8RbNum']),
+    'dl_schdfail': (LTE_FILE_DLSCHD, 'AirTime', 'schdfail', ['SCHD_FAIL_RSN.u32UeSchdFailRsn']),
+    'ul_bler': (LTE_FILE_ULSCHD, 'CRCI.u32DemTime', 'bler', ['CRCI.u8AckInfo']),
+    'ul_throughput': (LTE_FILE_ULSCHD, 'AirTime', 'throughput', ['TB.u16TbSize']),
+    'ul_schd_uecnt': (LTE_FILE_ULSCHD, 'AirTime', 'count', ['GRANT.u8HarqId']),
+    'ul_rbnum': (LTE_FILE_ULSCHD, 'AirTime', 'mean', ['GRANT.u8RbNum']),
+    'ul_schdfail': (LTE_FILE_ULSCHD, 'AirTime', 'schdfail', ['SCHD_FAIL_RSN.u32UeSchdFailRsn']),
+}
+
+
+def kpi_cols(metrics, keycols):
+    '''计算metrics需要读取的列'''
+    cols = list(keycols)
+    for name in metrics:
+        _, timecol, _, datacols = KPI_METRICS[name]
+        cols.extend(col for col in [timecol] + datacols if col not in cols)
+    return cols
+
+
+def kpi_parts(data, metrics, airtime_bin_size, keycols):
+    '''计算数据块中各指标按(时间粒度, keycols)分组的部分统计量
+
+        部分统计量都是次数或总和，多个数据块的结果可以用DataFrame.add(fill_value=0)精确合并
+        Args:
+            data: 数据块
+            metrics: 指标名称列表，须为同一文件类型
+            airtime_bin_size: 时间粒度(s)
+            keycols: 时间粒度之外的分组列，如['CellId']或['CellId', 'UEGID']
+        Returns:
+            DataFrame格式，行索引为('AirTime', keycols)，列为(指标, 统计量)两级索引，没有数据时为None
+    '''
+    names = ['AirTime'] + list(keycols)
+    parts = []
+    for name in metrics:
+        _, timecol, kind, datacols = KPI_METRICS[name]
+        values = data[datacols].to_numpy(dtype=np.float64, na_value=np.nan)
+        rows = data[[timecol] + list(keycols)].notna().all(axis=1).values
+        if 'bler' == kind:
+            nack = ((values == 0) | (values == 2)).sum(axis=1)
+            stats = {'num': nack, 'den': nack + (values == 1).sum(axis=1)}
+        elif 'schdfail' == kind:
+            rows = rows & ~np.isnan(values[:, 0])
+            stats = {str(int(rsn)): values[:, 0] == rsn for rsn in np.unique(values[rows, 0])}
+        else:
+            valid = ~np.isnan(values[:, 0])
+            stats = {'num': np.where(valid, values[:, 0], 0) if 'count' != kind else valid, 'den': valid}
+        if not rows.any() or not stats:
+            continue
+
+        keys = [data[timecol].values[rows].astype(np.int64) // (airtime_bin_size*1600)]
+        keys.extend(data[col].values[rows].astype(np.int64) for col in keycols)
+        stats = pd.DataFrame({stat: np.asarray(value)[rows] for stat, value in stats.items()})
+        part = stats.groupby(keys).sum()
+        part.index.names = names
+        part.columns = pd.MultiIndex.from_product([[name], part.columns])
+        parts.append(part)
+    if not parts:
+        return None
+    return pd.concat(parts, axis=1).fillna(0)
+
+
+def kpi_result(total, metrics):
+    '''由合并后的部分统计量计算各指标
+
+        Returns:
+            DataFrame格式，列为指标名称，schdfail指标按失败原因展开为'指标.原因'多列
+    '''
+    rlt = {}
+    for name in metrics:
+        kind = KPI_METRICS[name][2]
+        if name not in total.columns.get_level_values(0):
+            continue
+        part = total[name]
+        if 'bler' == kind or 'mean' == kind:
+            rlt[name] = part['num'] / part['den']
+        elif 'throughput' == kind:
+            rlt[name] = part['num'] * 8 / 1000
+        elif 'count' == kind:
+            rlt[name] = part['num']
+        else:
+            for rsn in sorted(part.columns, key=int):
+                rlt['{name}.{rsn}'.format(name=name, rsn=LTE_SCHD_FAIL_RSNS[int(rsn)])] = part[rsn]
+    return pd.DataFrame(rlt, index=total.index)
+
+
+def ue_matrices(chunks, cols, airtime_bin_size):
+    '''由HARQ匹配结果计算所有UE的流量和BLER矩阵
+
+        每个数据块按(时间粒度, UEGID)分组累加TB大小和反馈次数，只保存有数据的组合
+        Args:
+            chunks: match_schd_and_ack输出的数据块迭代器
+            cols: [调度时间列, UEGID列, TB大小列, 反馈列...]
+            airtime_bin_size: 时间粒度(s)
+        Returns:
+            (流量, bler)，行为时间粒度，列为UEGID，稀疏存储；流量单位Kbits，填充值为0；bler没有反馈时为空值
+    '''
+    total = None
+    for data in chunks:
+        rows = data[cols[:2]].notna().all(axis=1).values
+        if not rows.any():
+            continue
+        tbsize = data[cols[2]].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        acks = data[cols[3:]].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        nack = ((acks == 0) | (acks == 2)).sum(axis=1)
+        stats = pd.DataFrame({'tb': np.nan_to_num(tbsize), 'num': nack, 'den': nack + (acks == 1).sum(axis=1)})
+        keys = [data[cols[0]].values[rows].astype(np.int64) // (airtime_bin_size*1600),
+                data[cols[1]].values[rows].astype(np.int64)]
+        part = stats.groupby(keys).sum()
+        total = part if total is None else total.add(part, fill_value=0)
+
+    if total is None:
+        return pd.DataFrame(), pd.DataFrame()
+    bins = np.unique(total.index.get_level_values(0))
+    throughput = _sparse_matrix(total['tb'] * 8 / 1000, bins, 0)
+    bler = total.loc[total['den'] > 0]
+    return throughput, _sparse_matrix(bler['num'] / bler['den'], bins, np.nan)
+
+
+def _sparse_matrix(series, bins, fill_value):
+    '''(时间粒度, UEGID)两级索引的Series转换为稀疏矩阵，行为bins，列为UEGID
+
+        每个UE的列按bins下标补齐为fill_value后转换为SparseArray，只保存不等于fill_value的取值
+    '''
+    rows = np.searchsorted(bins, series.index.get_level_values(0).values)
+    values = series.values.astype(np.float64)
+    matrix = {}
+    for ue, pos in sorted(series.groupby(level=1).indices.items()):
+        column = pd.Series(values[pos], index=rows[pos]).reindex(range(len(bins)), fill_value=fill_value)
+        matrix[ue] = pd.arrays.SparseArray(column.values, fill_value=fill_value)
+    rlt = pd.DataFrame(matrix, index=pd.Index(bins, name='AirTime'))
+    rlt.columns.name = 'UEGID'
+    return rlt
@@ -1,11 +1,14 @@
 # coding=utf-8
+from functools import partial
 import numpy as np
 import pandas as pd
 from loganalysis.log import Log
 from loganalysis.log import LogFile
 from loganalysis.const import *
+from loganalysis.accumulator import Accumulator
 from loganalysis.lte.ue import Ue
 from loganalysis.lte.cell import Cell
+from loganalysis.lte.kpi import KPI_METRICS, kpi_cols, kpi_parts, kpi_result
 
 class LteLog(Log):
     ''' LTE调度模块Log分析接口类
@@ -17,13 +20,22 @@ class LteLog(Log):
         要求所有文件命名符合EI命名格式：子系统_时间.csv
     '''
 
-    def __init__(self, directory, time_interval=None, product_type='Macro'):
+    def __init__(self, directory, time_interval=None, product_type='Macro', cache=False, index=True,
+                 chunksize=None, workers=None, split=False, prefetch=None):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                directory: Log所在目录
                time_interval: 时间范围[start, end],格式为yyyymmddhhmmss
                product_type: 产品类型['Macro', 'Micro']，默认为micro
+               cache: 列式缓存，False不缓存，True缓存到Log目录下，也可以直接指定缓存目录
+               index: 是否使用持久化的文件元数据索引，默认为True；即使cache为False，索引(index.json和*.rows.npz)
+                      也会写入Log目录下的.loganalysis目录(cache为目录时写入该目录)，不希望改动Log目录时设为False
+               chunksize: 分块读取的行数，为None时按文件读取
+               workers: 聚合计算的并行进程数或者Executor实例，为None时单进程计算；
+                        为进程数时创建一个进程池，由所有Log文件共用，close时关闭
+               split: 是否按记录组(SCHD、ACK、TB等)拆分为稠密子表存储，只读取请求列所在的子表
+               prefetch: 后台预读的数据块个数或者Prefetcher实例，为None时不预读
         '''
         if time_interval:
             assert(len(time_interval)==2)
@@ -41,7 +53,9 @@ class LteLog(Log):
             assert(0<=time_interval[1]//100000000%100<12)
             assert(2019<=time_interval[1]//10000000000<2021)
             
-        super(LteLog, self).__init__(directory, time_interval, product_type)
+        super(LteLog, self).__init__(directory, time_interval, product_type, cache, index, chunksize,
+                                     workers, prefetch)
+        self._split = split
         self._cells = {}
         self._cellids = set()
         self._ues = {}
@@ -49,7 +63,9 @@ class LteLog(Log):
         for filetype in LTE_FILE_TYPES:
             filenames = self._filenames_of_type(filetype)
             if filenames:
-                logfile = LteFile(filetype, directory, filenames)
+                logfile = LteFile(filetype, directory, filenames, cache=cache, index=self._index,
+                                  chunksize=chunksize, workers=self._workers, split=split,
+                                  prefetch=prefetch)
                 if logfile.lines == 0:
                     continue
                 self._logfiles[filetype] = logfile
@@ -72,8 +88,7 @@ class LteLog(Log):
             if self.product_type == LTE_PRODUCT_MICRO:
                 return logfile
 
-            df = logfile.get_data_of_cols(cols=['CellId'], maxlines=2)
-            if df['CellId'][0] == cellid:
+            if cellid in logfile.cellids:
                 return logfile
         return None
 
@@ -104,21 +119,69 @@ class LteLog(Log):
         '''
         return self._get_phy_logfile(cellid, LTE_FILE_PUSCH)
 
-    def get_cell(self, cellid):
+    @property
+    def split(self):
+        return self._split
+
+    def get_cell(self, cellid, uldlcfgidx=None):
         '''获取小区实例
             Args：
                 cellid：小区id
+                uldlcfgidx：上下行配比，为None时根据Log自动推断
             Returns:
                 对应的小区实例
         '''
         
         if cellid in self._cellids:
             if cellid not in self._cells.keys():
-                self._cells[cellid] = Cell(cellid, self)
+                self._cells[cellid] = Cell(cellid, self, uldlcfgidx)
             return self._cells[cellid]
         else:
             return '非法CellId值，此小区不存在'
         
+    def why_selfmaintain(self, cellids=None):
+        '''分析各小区所有自维护的原因
+            Args：
+                cellids：小区id列表，为None时分析Log中的所有小区
+            Returns:
+                DataFrame格式，列为['CellId', 'Link', 'DemTime', 'UEGID', 'Reason']
+        '''
+        cols = ['CellId', 'Link', 'DemTime', 'UEGID', 'Reason']
+        rlt = Accumulator(columns=cols, ignore_index=True, empty_columns=cols)
+        for cellid in sorted(self._cellids if cellids is None else self._cellids.intersection(cellids)):
+            data = self.get_cell(cellid).why_selfmaintain()
+            data.insert(0, cols[0], cellid)
+            rlt.append(data)
+        return rlt.result()
+
+    def kpi_cube(self, metrics, airtime_bin_size=1, by_ue=False):
+        '''一次遍历上下行调度Log，按小区(和UE)分组计算多个KPI指标
+
+            Args：
+                metrics：指标名称列表，取值见KPI_METRICS，如['dl_bler', 'dl_throughput', 'ul_rbnum']
+                airtime_bin_size：时间粒度（s)
+                by_ue：是否按UEGID进一步分组
+            Returns:
+                DataFrame格式，行索引为('AirTime', 'CellId')或('AirTime', 'CellId', 'UEGID')，列为指标，
+                schdfail类指标按失败原因展开为'指标.原因'多列；unstack('CellId')可得到时间粒度×(指标, 小区)的表
+        '''
+        assert(airtime_bin_size>=1)
+        assert(set(metrics) <= set(KPI_METRICS))
+        keycols = ['CellId', 'UEGID'] if by_ue else ['CellId']
+        total = None
+        for filetype in (LTE_FILE_DLSCHD, LTE_FILE_ULSCHD):
+            names = [name for name in metrics if KPI_METRICS[name][0] == filetype]
+            if not names or filetype not in self._logfiles:
+                continue
+            mapper = partial(kpi_parts, metrics=names, airtime_bin_size=airtime_bin_size, keycols=keycols)
+            for part in self._logfiles[filetype]._map_of_cols(mapper, kpi_cols(names, keycols)):
+                if part is not None:
+                    total = part if total is None else total.add(part, fill_value=0)
+        if total is None:
+            return pd.DataFrame(columns=metrics, index=pd.MultiIndex.from_arrays([[]] * (len(keycols) + 1),
+                                                                                 names=['AirTime'] + keycols))
+        return kpi_result(total.sort_index(), metrics)
+
     def get_ue(self, uegid, cellid=None):
         '''获取小区实例
             Args：
@@ -165,27 +228,46 @@ class LteLog(Log):
         if uegid:
             id_filter.update({'UEGID': [uegid]})
          
-        return LteFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter)
+        return LteFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter,
+                       cache=self._cache, index=self._index, chunksize=self._chunksize,
+                       workers=self._workers, split=self._split, prefetch=self._prefetch)
         
 class LteFile(LogFile):
     '''Log文件接口类'''
 
-    def __init__(self, filetype, directory, files, id_filter=None):
+    _KEY_COLS = ['CellId', 'UEGID']
+
+    def __init__(self, filetype, directory, files, id_filter=None, cache=False, index=None, chunksize=None,
+                 workers=None, split=False, prefetch=None):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                file: 文件名
                filetype: log类型
+               cache: 列式缓存，False不缓存，True缓存到Log目录下，也可以直接指定缓存目录
+               index: 文件元数据索引FileIndex实例，为None时扫描文件获取元数据
+               chunksize: 分块读取的行数，为None时按文件读取
+               workers: 聚合计算的并行进程数或者Executor实例，为None时单进程计算
+               split: 是否按记录组拆分为稠密子表存储，只读取请求列所在的子表
+               prefetch: 后台预读的数据块个数或者Prefetcher实例，为None时不预读
         '''
-        super(LteFile, self).__init__(filetype, directory, files, id_filter)
+        super(LteFile, self).__init__(filetype, directory, files, id_filter, cache, index, chunksize,
+                                      workers, split, prefetch)
         self._cellids = set()
         self._uegids = set()
         self._cell_and_ue_ids = pd.DataFrame()
         cols = ['CellId', 'UEGID']
+        if self._indexable():
+            ids = [self._index_groups(file)[cols] for file in self._files]
+            if ids:
+                self._cell_and_ue_ids = pd.concat(ids).drop_duplicates()
+                self._cellids = set(self._cell_and_ue_ids[cols[0]])
+                self._uegids = set(self._cell_and_ue_ids[cols[1]])
+            return
+
         for data in self.gen_of_cols(cols):
             if len(data.index) == 0:
-                self._lines = 0
-                return
+                continue
             self._cellids = set.union(self._cellids, set(data[cols[0]]))
             self._uegids = set.union(self._uegids, set(data[cols[1]]))
             self._cell_and_ue_ids = pd.concat([data[cols].drop_duplicates(), self._cell_and_ue_ids]).drop_duplicates()
@@ -0,0 +1,167 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+from loganalysis.join import keys_of
+
+
+def attribute_reasons(data, candidates):
+    '''按优先级为每条记录归因
+
+        依次与各候选集合连接，记录归因到第一个命中的集合。每个集合只做一次哈希连接，
+        代价与记录数和集合大小成线性关系。
+        Args:
+            data: 待归因记录的连接列，DataFrame格式，不能含空值
+            candidates: [(原因, 候选记录)]列表，按优先级排列；候选记录的各列按位置与data的列对应，为None时跳过
+        Returns:
+            Categorical格式的原因，与data逐行对应，没有命中的记录为空值
+    '''
+    reasons = [reason for reason, _ in candidates]
+    codes = np.full(len(data.index), -1, dtype=np.int8)
+    if 0 == len(data.index):
+        return pd.Categorical.from_codes(codes, categories=reasons)
+
+    keys = keys_of(data)
+    for code, (reason, candidate) in enumerate(candidates):
+        if candidate is None or 0 == len(candidate.index):
+            continue
+        hit = (codes == -1) & keys.isin(keys_of(candidate.dropna(how='any')))
+        codes[hit] = code
+    return pd.Categorical.from_codes(codes, categories=reasons)
+
+
+def attribute_mismatches(data, cols, reasons, mismatches):
+    '''按(解调时间, UEGID)将记录归因到第一个命中的不匹配查询
+
+        Args:
+            data: 待归因的记录
+            cols: data中的[解调时间列, UEGID列]
+            reasons: 不匹配查询的名称列表，按优先级排列
+            mismatches: {名称: 不匹配记录}，不匹配记录的第一列为解调时间
+        Returns:
+            Categorical格式的原因，与data逐行对应
+    '''
+    candidates = []
+    for reason in reasons:
+        mismatch = mismatches.get(reason)
+        if mismatch is not None:
+            mismatch = mismatch[[mismatch.columns[0], cols[1]]]  # 默认解调时间都在第一个位置
+        candidates.append((reason, mismatch))
+    return attribute_reasons(data[cols], candidates)
+
+
+def infer_schdfail_reasons(data, cols):
+    '''批量推测每个UE在没有调度的TTI中的调度失败原因
+
+        判断顺序与DlSchdUe._infer_schdfail_reason一致。记录按(UEGID, 绝对TTI, 行顺序)排序，以调度记录把每个UE的
+        记录划分为段，各逻辑信道的BSR状态在段内前向填充，每个TTI取其最后一行的状态，没有逐TTI的Python循环。
+        BSR状态只保存稀疏的事件(BSRCHANGE和LCH_SCHD记录)，每个TTI对段内已出现的逻辑信道做as-of查找，
+        内存与事件数和(TTI, 信道)对数成正比，不随记录数×信道数增长。
+        Args:
+            data: 按文件顺序排列的记录
+            cols: [UEGID列, 绝对TTI列, 调度列, 失败原因列, BSR变化信道列, BSR变化标志列, 调度信道列,
+                   RLC上报BSR列, 调度BSR列]
+        Returns:
+            DataFrame格式，列为[UEGID列, 绝对TTI列, 'Reason']，每个有记录但没有调度的(UEGID, TTI)一行，
+            Reason为Categorical格式，取值为LTE_SCHD_FAIL_RSNS和LTE_SCHD_FAIL_INFER_RSNS
+    '''
+    uecol, tticol, schdcol, rsncol, chgcol, hasbsrcol, lchcol, rlccol, schdbsrcol = cols
+    reasons = list(LTE_SCHD_FAIL_RSNS) + list(LTE_SCHD_FAIL_INFER_RSNS)
+    ues = data[uecol].values.astype(np.int64)
+    ttis = data[tticol].values.astype(np.int64)
+    num = len(ues)
+    if 0 == num:
+        return pd.DataFrame({uecol: ues, tticol: ttis,
+                             'Reason': pd.Categorical.from_codes(np.array([], dtype=np.int8), categories=reasons)})
+    order = np.lexsort((np.arange(num), ttis, ues))
+    data = data.iloc[order]
+    ues = ues[order]
+    ttis = ttis[order]
+
+    # 每个(UEGID, TTI)为一组，取组内最后一行的状态
+    newue = np.concatenate([[True], ues[1:] != ues[:-1]])
+    starts = np.flatnonzero(newue | np.concatenate([[True], ttis[1:] != ttis[:-1]]))
+    lasts = np.concatenate([starts[1:], [num]]) - 1
+    schd = data[schdcol].notna().values
+    grpschd = np.logical_or.reduceat(schd, starts)
+
+    # 每次调度开始一个新段，UE还没有调度过时没有上下文
+    cumschd = np.cumsum(schd)
+    uestart = np.maximum.accumulate(np.where(newue, np.arange(num), 0))
+    noctx = (cumschd - cumschd[uestart] + schd[uestart])[lasts] == 0
+    segs = np.cumsum(schd | newue)
+
+    rsn = data[rsncol].to_numpy(dtype=np.float64, na_value=np.nan)
+    rsnrows = np.flatnonzero(~np.isnan(rsn))
+    rsngrps, first = np.unique(np.searchsorted(starts, rsnrows, side='right') - 1, return_index=True)
+    grprsn = np.full(len(starts), -1, dtype=np.int64)
+    grprsn[rsngrps] = rsn[rsnrows[first]].astype(np.int64)
+
+    # 各逻辑信道的BSR变化标志、RLC上报BSR和调度BSR事件，同一行内BSRCHANGE晚于LCH_SCHD
+    lchs = data[lchcol].to_numpy(dtype=np.float64, na_value=np.nan)
+    chgs = data[chgcol].to_numpy(dtype=np.float64, na_value=np.nan)
+    lchmask = ~np.isnan(lchs) & (lchs != 0)
+    chgmask = ~np.isnan(chgs) & (chgs != 0)
+    lchids = np.unique(np.concatenate([lchs[lchmask], chgs[chgmask]]))
+    lchrows = np.flatnonzero(lchmask)
+    lchcodes = np.searchsorted(lchids, lchs[lchmask])
+    chgrows = np.flatnonzero(chgmask)
+    change = _events(segs, len(lchids), np.concatenate([lchrows, chgrows]),
+                     np.concatenate([lchcodes, np.searchsorted(lchids, chgs[chgmask])]),
+                     np.concatenate([np.ones(len(lchrows)),
+                                     data[hasbsrcol].to_numpy(dtype=np.float64, na_value=np.nan)[chgmask]]))
+    rlc = _events(segs, len(lchids), lchrows, lchcodes,
+                  data[rlccol].to_numpy(dtype=np.float64, na_value=np.nan)[lchmask])
+    schdbsr = _events(segs, len(lchids), lchrows, lchcodes,
+                      data[schdbsrcol].to_numpy(dtype=np.float64, na_value=np.nan)[lchmask])
+
+    # 每个TTI与其所在段内在该TTI之前已有BSR变化状态的逻辑信道配对
+    pairs, firsts = np.unique(change[0] // num, return_index=True)
+    grpsegs = segs[lasts]
+    lo = np.searchsorted(lasts, change[0][firsts] % num)
+    hi = np.searchsorted(grpsegs, pairs // max(len(lchids), 1), side='right')
+    cnts = np.maximum(hi - lo, 0)
+    grps = np.repeat(lo - np.cumsum(cnts) + cnts, cnts) + np.arange(cnts.sum())
+    pairs = np.repeat(pairs, cnts)
+    queries = pairs * num + lasts[grps]
+    grpchange = _asof(change, queries, num)
+    violate = ~(_asof(rlc, queries, num) <= _asof(schdbsr, queries, num))
+
+    nobsr = np.bincount(grps, weights=grpchange, minlength=len(starts)) == 0
+    bsrafter = np.logical_or.reduceat(chgmask, starts)
+    rlczero = np.bincount(grps, weights=violate.astype(np.float64), minlength=len(starts)) == 0
+
+    base = len(LTE_SCHD_FAIL_RSNS)
+    codes = np.select([noctx, grprsn >= 0, nobsr, bsrafter, rlczero],
+                      [base, grprsn, base + 1, base + 2, base + 3], base + 4)
+    cand = ~grpschd
+    return pd.DataFrame({uecol: ues[lasts][cand], tticol: ttis[lasts][cand],
+                         'Reason': pd.Categorical.from_codes(codes[cand].astype(np.int8), categories=reasons)})
+
+
+def _events(segs, nlchs, rows, lchcodes, values):
+    '''按(段, 逻辑信道, 行号)排序的状态事件，同一行多个事件取最后一个，丢弃空值
+
+        Returns:
+            (组合键, 取值)，组合键为(段*信道数+信道)*记录数+行号
+    '''
+    num = len(segs)
+    keys = (segs[rows].astype(np.int64) * nlchs + lchcodes) * num + rows
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    last = np.concatenate([keys[1:] != keys[:-1], [True]])[:len(keys)]
+    keys, values = keys[last], values[last]
+    valid = ~np.isnan(values)
+    return keys[valid], values[valid]
+
+
+def _asof(events, queries, num):
+    '''查找每个组合键之前(含)同一(段, 逻辑信道)的最后一个事件取值，没有时为空值'''
+    keys, values = events
+    rlt = np.full(len(queries), np.nan)
+    if 0 == len(keys):
+        return rlt
+    idx = np.searchsorted(keys, queries, side='right') - 1
+    hit = (idx >= 0) & (keys[np.maximum(idx, 0)] // num == queries // num)
+    rlt[hit] = values[idx[hit]]
+    return rlt
@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from loganalysis.const import *
+from loganalysis.hist import hist2d
 from .dlschd import DlSchdUe
 
 from loganalysis.lte.ulschd import UlSchdUe
@@ -47,12 +48,10 @@ class Ue(object):
         rlt = pd.DataFrame()
         cols = ['AirTime', 'CellId']
         for log in logs:
-            for data in self.dl.log.gen_of_cols(cols):
-                data[cols[0]] = data[cols[0]]//1600
-                group_data = data[cols[1]].groupby(data[cols[0]]).apply(lambda x: x.value_counts())
+            for data in log.gen_of_cols(cols):
+                group_data = hist2d(data[cols[0]] // 1600, data[cols[1]])
                 if 0 == group_data.size:
                     continue
-                group_data = group_data.unstack(level=1, fill_value=0)
                 rlt = rlt.add(group_data, fill_value=0)
         
         rlt[rlt==0]=None
@@ -67,11 +66,10 @@ class Ue(object):
         '''指定当前log的时间范围
             Args：
                 start:起始时间
-                end:截止时间
+                end:截止时间，早于start时认为跨过了翻转点
             Returns:
                 无
         '''
-        assert(start <= end)
         if self._dllog:
             self._dllog.set_airtimes_interval(start, end)
             
@@ -3,11 +3,20 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from loganalysis.const import *
+from loganalysis.log import SharedScan
+from loganalysis.accumulator import Accumulator
+from loganalysis.hist import hist2d
+from .harq import HarqMatcher, ack_subframe_table, first_chunk
+from .kpi import ue_matrices
+from .reason import attribute_mismatches
 
 
 class UlSchd():
     '''上行调度Log分析类'''
 
+    # 自维护原因，按优先级排列，对应Cell中的不匹配查询
+    SELFMAINTAIN_REASONS = ['ulcrcdem_mismatch', 'pusch_mismatch']
+
     def __init__(self, log, cell=None, uegid=None):
         self._type = LTE_FILE_ULSCHD
         self._log = log
@@ -30,13 +39,12 @@ class UlSchd():
     def show_bler(self, airtime_bin_size=1, ax=None):
         ack_cols = ['CRCI.u32DemTime', 'CRCI.u8AckInfo']
         rlt = pd.DataFrame()
-        for data in self._log.gen_of_cols(ack_cols):
+        for data in self._log.gen_of_cols(ack_cols, dense=True):
             data = data.dropna(how='any')
             if 0 == data.size:
                 continue
-            cnt = data[ack_cols[1]].groupby(data[ack_cols[0]]// (airtime_bin_size*1600))\
-                .apply(lambda x: x.value_counts()).unstack(level=1)
-            rlt = rlt.add(cnt, fill_value=0, level=0)
+            cnt = hist2d(data[ack_cols[0]] // (airtime_bin_size*1600), data[ack_cols[1]])
+            rlt = rlt.add(cnt, fill_value=0)
 
         def func(data):
             return (data[0] + data[2]) / ((data[0]+data[1]+data[2])+1)
@@ -54,13 +62,12 @@ class UlSchd():
     def show_dci0lost(self, airtime_bin_size=1, ax=None):
         ack_cols = ['CRCI.u32DemTime', 'CRCI.u8AckInfo']
         rlt = pd.DataFrame()
-        for data in self._log.gen_of_cols(ack_cols):
+        for data in self._log.gen_of_cols(ack_cols, dense=True):
             data = data.dropna(how='any')
             if 0 == data.size:
                 continue
-            cnt = data[ack_cols[1]].groupby(data[ack_cols[0]]// (airtime_bin_size*1600))\
-                .apply(lambda x: x.value_counts()).unstack(level=1)
-            rlt = rlt.add(cnt, fill_value=0, level=0)
+            cnt = hist2d(data[ack_cols[0]] // (airtime_bin_size*1600), data[ack_cols[1]])
+            rlt = rlt.add(cnt, fill_value=0)
 
         def func(data):
             return (data[2]) / ((data[0]+data[1]+data[2])+1)
@@ -245,7 +252,7 @@ class UlSchd():
         '''
         col = ['SCHD_FAIL_RSN.u32UeSchdFailRsn']
         rlt = pd.Series(name='SchdFail_Cnt')
-        for data in self._log.gen_of_cols(col):
+        for data in self._log.gen_of_cols(col, dense=True):
             data = data[col[0]].dropna().astype(np.int32).value_counts()
             rlt = rlt.add(data, fill_value=0) if rlt is not None else data
         rlt.index = [LTE_SCHD_FAIL_RSNS[int(idx)] for idx in rlt.index]
@@ -253,29 +260,31 @@ class UlSchd():
         return rlt
 
     def _get_schdtime(self, demtime):
-        '''给定解调时间，获取下行调度时间'''
-        return self._log.difftime(demtime, self._cell._schd_subfrm_offset[demtime % 16])
+        '''给定解调时间，获取下行调度时间，支持标量或者数组'''
+        demtime = np.asarray(demtime).astype(np.uint32)
+        return self._log.difftime(demtime, np.asarray(self._cell._schd_subfrm_offset)[demtime % 16])
 
     def match_schd_and_ack(self, cols):
         '''
-        根据UEGID，HarqId匹配调度和Ack反馈信息
+        根据UEGID，HarqId匹配调度和Ack反馈信息，CRC在后续数据块或文件中的也能匹配
 
         Args：
-            无
+            cols: 匹配后输出的列名，以CRCI开头的列取自匹配到的CRC记录
         Yields:
             对齐后的数据，生成器
         '''
         demcols = ['FN', 'UEGID', 'CRCI.u8CrcHarqId']
         schdcols = ['AirTime', 'UEGID', 'GRANT.u8HarqId']
-        totcols = list(set(['CRCI.u32DemTime']+demcols+schdcols+cols))
-        for data in self._log.gen_of_cols(totcols):
-            data['FN'] = data['CRCI.u32DemTime'].dropna().astype(np.uint32).map(self._get_schdtime)
-            addcols = [col for col in cols if col.startswith('CRCI')]
-            matchcols = np.union1d(addcols, demcols)
-            ackdata = data[matchcols]
-            data = data.drop(np.setdiff1d(matchcols, ['UEGID']), axis=1)
-            merged = pd.merge(data, ackdata, how='left', left_on=schdcols, right_on=demcols)
-            yield merged[cols]
+        totcols = list(set(['CRCI.u32DemTime']+demcols+schdcols+cols) - {'FN'})
+        matcher = HarqMatcher(schdcols, demcols, cols, 'CRCI')
+
+        def chunks():
+            for data in self._log.gen_of_cols(totcols):
+                demtime = data['CRCI.u32DemTime'].dropna()
+                data['FN'] = pd.Series(self._get_schdtime(demtime.values), index=demtime.index)
+                yield data
+
+        return matcher.match(chunks())
             
     def show_throuput(self, airtime_bin_size=1):
         ''' 输出流量图
@@ -308,8 +317,7 @@ class UlSchd():
         ack_data = pd.DataFrame()
         for data in self.match_schd_and_ack(cols):
             data = data.dropna(how='any').astype(np.uint32)
-            grouped = data[cols[0]].groupby(data[cols[1]]).apply(lambda x: x.value_counts()).unstack(0, fill_value=0)\
-                .reindex(index=[0, 1, 2], fill_value=0)
+            grouped = hist2d(data[cols[0]], data[cols[1]]).reindex(index=[0, 1, 2], fill_value=0)
             ack_data = ack_data.add(grouped, fill_value=0)
         bler = ack_data.apply(lambda x: (x[2]+x[0])/max(x.sum(), 1))
         bler.index.name = 'Mcs'
@@ -325,8 +333,7 @@ class UlSchd():
         cols = ['CRCI.u8AckInfo', 'GRANT.u8MatchType']
         ack_data = pd.DataFrame()
         for data in self.match_schd_and_ack(cols):
-            grouped = data[cols[0]].groupby(data[cols[1]]).apply(lambda x: x.value_counts()).unstack(0, fill_value=0)\
-                .reindex(index=[0, 1, 2], fill_value=0)
+            grouped = hist2d(data[cols[0]], data[cols[1]]).reindex(index=[0, 1, 2], fill_value=0)
             ack_data = ack_data.add(grouped, fill_value=0)
         bler_data = ack_data.apply(lambda x: (x[0]+x[2])/max(x.sum(), 1))
         bler_data.index.name = 'IsMu'
@@ -337,10 +344,9 @@ class UlSchd():
         '''不同子帧下的bler'''
         cols = ['CRCI.u8AckInfo', 'CRCI.u32DemTime']
         ack_data = pd.DataFrame()
-        for data in self._log.gen_of_cols(cols):
+        for data in self._log.gen_of_cols(cols, dense=True):
             data = data.dropna(how='any').astype(np.uint32)
-            grouped = data[cols[0]].groupby(data[cols[1]] % 16).apply(lambda x: x.value_counts())\
-                .unstack(0, fill_value=0).reindex(index=np.arange(10), fill_value=0)
+            grouped = hist2d(data[cols[0]], data[cols[1]] % 16).reindex(index=np.arange(10), fill_value=0)
             ack_data = ack_data.add(grouped, fill_value=0)
         bler_data = ack_data.apply(lambda x: (x[0]+x[2])/max(x.sum(), 1))
         bler_data.index.name = 'Subfrm'
@@ -349,31 +355,35 @@ class UlSchd():
 
     def find_selfmaintain(self):
         '''查找是否存在自维护, 并输出相关信息'''
+        with SharedScan() as scan:
+            rlt = self._scan_selfmaintain(scan)
+        return rlt.result()
 
+    def _scan_selfmaintain(self, scan):
+        '''登记自维护查询，返回结果累积器'''
         cols = ['UEGID', 'CRCI.u32DemTime', 'CRCI.u8CrcHarqId', 'CRCI.b8IsSelfMainTain']
-        rlt = pd.DataFrame(columns=cols)
-        for data in self._log.gen_of_cols(cols):
-            rlt = rlt.append(data[data[cols[3]] == 1])
+        rlt = Accumulator(columns=cols)
+        scan.add(self._log, cols, rlt.append, val_filter={cols[3]: [1]})
         return rlt
 
     def find_harqfail(self):
         '''查找是否存harqfail, 并输出相关信息'''
 
         cols = ['UEGID', 'CRCI.u32DemTime', 'CRCI.u8CrcHarqId', 'CRCI.b8IsHarqFail']
-        rlt = pd.DataFrame(columns=cols)
+        rlt = Accumulator(columns=cols)
         for data in self._log.gen_of_cols(cols):
-            rlt = rlt.append(data[data[cols[3]] == 1])
-        return rlt
+            rlt.append(data[data[cols[3]] == 1])
+        return rlt.result()
 
     def find_dci0lost(self):
         '''查找是否存dci0lost, 并输出相关信息'''
 
         cols = ['UEGID', 'CRCI.u32DemTime', 'CRCI.u8CrcHarqId', 'CRCI.u8DciLostFlag']
-        rlt = pd.DataFrame(columns=cols)
+        rlt = Accumulator(columns=cols)
         for data in self._log.gen_of_cols(cols):
             data = data[data[cols[3]] == 1]
-            rlt = rlt.append(data)
-        return rlt
+            rlt.append(data)
+        return rlt.result()
 
     def why_selfmaintain(self):
         '''分析自维护原因
@@ -386,23 +396,24 @@ class UlSchd():
         
         if self._cell is None:
             return 'cell is None, cant analysize'
-        
+
+        with SharedScan() as scan:
+            selfdata = self._scan_selfmaintain(scan)
+            mismatches = self._cell.scan_mismatches(scan, self.SELFMAINTAIN_REASONS)
+        return self.attribute_selfmaintain(selfdata.result(), self._cell.mismatch_results(mismatches))
+
+    def attribute_selfmaintain(self, selfdata, mismatches):
+        '''按优先级将自维护记录归因到不匹配记录
+
+            Args：
+                selfdata: find_selfmaintain的结果
+                mismatches: {原因: 不匹配记录}，不匹配记录的第一列为解调时间
+            return：
+                demtime, uegid：reason 列表
+        '''
         cols = ['CRCI.u32DemTime', 'UEGID']
-        selfdata = self.find_selfmaintain()[cols].drop_duplicates().astype(np.uint32)
-        ulcrcdem_mismatch = self._cell.find_ulcrcdem_mismatch()
-        pusch_mismatch = self._cell.find_pusch_mismatch()
-
-        for idx in selfdata.index:
-            mismatchs = [ulcrcdem_mismatch, pusch_mismatch]
-            reasons = ['ulcrcdem_mismatch', 'pusch_mismatch']
-            for reanson_idx, mismatch in enumerate(mismatchs):
-                mismatch_cols = mismatch.columns  # 默认解调时间都在第一个位置
-                mask = (mismatch[mismatch_cols[0]] == selfdata.at[idx, cols[0]])\
-                       & (mismatch[cols[1]] == selfdata.at[idx, cols[1]])
-                ack_filter = mismatch[mask]
-                if len(ack_filter.index) != 0:
-                    selfdata.loc[idx, 'Reason'] = reasons[reanson_idx]
-                    break
+        selfdata = selfdata[cols].drop_duplicates().astype(np.uint32)
+        selfdata['Reason'] = attribute_mismatches(selfdata, cols, self.SELFMAINTAIN_REASONS, mismatches)
         return selfdata
 
 
@@ -412,6 +423,19 @@ class UlSchdCell(UlSchd):
     def __init__(self, log, cell):
         super(UlSchdCell, self).__init__(log, cell)
 
+    def ue_matrices(self, airtime_bin_size=1):
+        '''一次HARQ匹配计算小区内所有UE的流量和BLER矩阵
+
+            Args:
+                airtime_bin_size：统计粒度，默认为1s
+            Returns：
+                (流量, bler)，均为DataFrame格式，行为时间粒度，列为UEGID，稀疏存储；
+                流量单位Kbits，没有调度的时间粒度为0；bler没有反馈时为空值
+        '''
+        assert(airtime_bin_size>=1)
+        cols = ['AirTime', 'UEGID', 'TB.u16TbSize', 'CRCI.u8AckInfo']
+        return ue_matrices(self.match_schd_and_ack(cols), cols, airtime_bin_size)
+
     def infer_uldlcfgidx(self):
         '''推测上下行配比
 
@@ -425,49 +449,26 @@ class UlSchdCell(UlSchd):
         '''
         schdcols = ['UEGID', 'AirTime', 'GRANT.u8HarqId']
         ackcols = ['UEGID', 'CRCI.u32DemTime', 'CRCI.u8CrcHarqId']
-        data = next(self._log.gen_of_cols(schdcols + ackcols[1:]))[:400]
+        data = first_chunk(self._log, schdcols + ackcols[1:])
+        if data is None:
+            return 255
         ackdata = data[ackcols].dropna(how='any').astype(np.uint32)
         schddata = data[schdcols].dropna(how='any').astype(np.uint32)
-
-        def get_deminfo_idx(schdidx, uegid, airtime, harqid):
-            for idx in ackdata.index:
-                if idx <= schdidx:
-                    continue
-                if ackdata.at[idx, ackcols[0]] == uegid and ackdata.at[idx, ackcols[2]] == harqid:
-                    demtime = ackdata.at[idx, ackcols[1]]
-                    if self._log.difftime(demtime, airtime) < 32:
-                        return idx
-                    else:
-                        return -1
-            return -1
-
-        ack_table = np.zeros((10, 10))
-        for idx in schddata.index:
-            if schddata.at[idx, 'GRANT.u8HarqId'] > 7:
-                return 7
-
-            ackidx = get_deminfo_idx(idx, *schddata.loc[idx, schdcols])
-            if -1 == ackidx:
-                continue
-
-            ackfrm = ackdata.at[ackidx, 'CRCI.u32DemTime'] % 16
-            subfrm = schddata.at[idx, 'AirTime'] % 16
-            if ack_table[subfrm][ackfrm] == 1:
-                continue
-            ack_table[subfrm][ackfrm] += 1
-            if ack_table[8][2] != 0 or ack_table[3][7]:  # 配比2
-                return 2
-            elif ack_table[9][4] != 0 or ack_table[4][9] != 0 or ack_table[5][2] != 0 \
-                    or ack_table[9][4] != 0 or ack_table[6][3] != 0:
-                return 0
-            elif ack_table[1][7] != 0 or ack_table[6][2] != 0 or ack_table[4][8] != 0 \
-                    or ack_table[9][3] != 0:
-                return 1
-            elif ack_table[0][4] != 0 or ack_table[0][5] != 0 or ack_table[0][6] != 0 \
-                    or ack_table[1][9] != 0 or ack_table[1][2] != 0 or ack_table[1][3] != 0:
-                return 7
-
-            return 255
+        if (schddata['GRANT.u8HarqId'] > 7).any():
+            return 7
+
+        ack_table = ack_subframe_table(schddata, ackdata, schdcols, ackcols)
+        if ack_table[8][2] != 0 or ack_table[3][7] != 0:  # 配比2
+            return 2
+        elif ack_table[9][4] != 0 or ack_table[4][9] != 0 or ack_table[5][2] != 0 or ack_table[6][3] != 0:
+            return 0
+        elif ack_table[1][7] != 0 or ack_table[6][2] != 0 or ack_table[4][8] != 0 \
+                or ack_table[9][3] != 0:
+            return 1
+        elif ack_table[0][4] != 0 or ack_table[0][5] != 0 or ack_table[0][6] != 0 \
+                or ack_table[1][9] != 0 or ack_table[1][2] != 0 or ack_table[1][3] != 0:
+            return 7
+        return 255
 
     def merge_with_pusch(self, ulschd_file, pusch_file):
         '''与PUSCH文件合并
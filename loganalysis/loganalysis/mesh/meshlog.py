@@ -14,22 +14,32 @@ class MeshLog(Log):
         要求所有文件命名符合EI命名格式：子系统_时间.csv
     '''
 
-    def __init__(self, directory, time_interval=None, product_type='Micro'):
+    def __init__(self, directory, time_interval=None, product_type='Micro', cache=False, index=True,
+                 chunksize=None, workers=None, prefetch=None):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                directory: Log所在目录
                time_interval: 时间范围[start, end],格式为yyyymmddhhmmss
                product_type: 产品类型['Macro', 'Micro']，默认为micro
+               cache: 列式缓存，False不缓存，True缓存到Log目录下，也可以直接指定缓存目录
+               index: 是否使用持久化的文件元数据索引，默认为True；即使cache为False，索引(index.json和*.rows.npz)
+                      也会写入Log目录下的.loganalysis目录(cache为目录时写入该目录)，不希望改动Log目录时设为False
+               chunksize: 分块读取的行数，为None时按文件读取
+               workers: 聚合计算的并行进程数或者Executor实例，为None时单进程计算；
+                        为进程数时创建一个进程池，由所有Log文件共用，close时关闭
+               prefetch: 后台预读的数据块个数或者Prefetcher实例，为None时不预读
         '''
-        super(MeshLog, self).__init__(directory, time_interval, product_type)
+        super(MeshLog, self).__init__(directory, time_interval, product_type, cache, index, chunksize,
+                                      workers, prefetch)
         self._nodes = {}
         self._nodeids = set()
         self._nbrids = set()
         for filetype in MESH_FILE_TYPES:
-            filenames = self._filenames_of_type(filetype, time_interval)
+            filenames = self._filenames_of_type(filetype)
             if filenames:
-                logfile = MeshFile(filetype, directory, filenames)
+                logfile = MeshFile(filetype, directory, filenames, cache=cache, index=self._index,
+                                   chunksize=chunksize, workers=self._workers, prefetch=prefetch)
                 if logfile.lines == 0:
                     continue
                 self._logfiles[filetype] = logfile
@@ -62,10 +72,14 @@ class MeshLog(Log):
 
         id_filter = {'NodeID': [nodeid]}
         if nbrid is None:
-            return MeshFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter)
+            return MeshFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter,
+                            cache=self._cache, index=self._index, chunksize=self._chunksize,
+                            workers=self._workers, prefetch=self._prefetch)
 
         id_filter = {'NodeID': [nodeid], 'NBRID': [nbrid]}
-        return MeshFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter)
+        return MeshFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter,
+                        cache=self._cache, index=self._index, chunksize=self._chunksize,
+                        workers=self._workers, prefetch=self._prefetch)
 
     @property
     def nodeids(self):
@@ -80,21 +94,36 @@ class MeshLog(Log):
 class MeshFile(LogFile):
     '''Log文件接口类'''
 
-    def __init__(self, filetype, directory, files, id_filter=None):
+    _KEY_COLS = ['NodeID', 'NBRID']
+
+    def __init__(self, filetype, directory, files, id_filter=None, cache=False, index=None, chunksize=None,
+                 workers=None, prefetch=None):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                file: 文件名
                filetype: log类型
+               cache: 列式缓存，False不缓存，True缓存到Log目录下，也可以直接指定缓存目录
+               index: 文件元数据索引FileIndex实例，为None时扫描文件获取元数据
+               chunksize: 分块读取的行数，为None时按文件读取
+               workers: 聚合计算的并行进程数或者Executor实例，为None时单进程计算
+               prefetch: 后台预读的数据块个数或者Prefetcher实例，为None时不预读
         '''
-        super(MeshFile, self).__init__(filetype, directory, files, id_filter)
+        super(MeshFile, self).__init__(filetype, directory, files, id_filter, cache, index, chunksize,
+                                       workers, prefetch=prefetch)
         self._nodeids = set()
         self._nbrids = set()
         cols = ['NodeID', 'NBRID']
+        if self._indexable():
+            for file in self._files:
+                groups = self._index_groups(file)
+                self._nodeids = set.union(self._nodeids, set(groups[cols[0]]))
+                self._nbrids = set.union(self._nbrids, set(groups[cols[1]]))
+            return
+
         for data in self.gen_of_cols(cols):
             if len(data.index) == 0:
-                self._lines = 0
-                return
+                continue
             self._nodeids = set.union(self._nodeids, set(data[cols[0]]))
             self._nbrids = set.union(self._nbrids, set(data[cols[1]]))
 
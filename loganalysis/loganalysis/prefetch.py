@@ -0,0 +1,104 @@
+# coding=utf-8
+import threading
+from collections import deque
+from loganalysis.const import PREFETCH_DEPTH, PREFETCH_MAX_BYTES
+
+
+class Prefetcher(object):
+    '''后台预读数据块
+
+        在后台线程中执行数据块生成器(读取和解析文件)，提前准备后续最多depth个数据块，
+        使磁盘/网络I/O和解析与调用方对当前数据块的计算重叠。已缓冲数据块的内存总量超过max_bytes时
+        暂停预读，但至少缓冲一个数据块。生成器中的异常在调用方取到对应位置时抛出。
+    '''
+
+    def __init__(self, depth=PREFETCH_DEPTH, max_bytes=PREFETCH_MAX_BYTES):
+        '''初始化预读配置
+
+           Args:
+               depth: 预读的数据块个数(按文件读取时即文件个数)
+               max_bytes: 已缓冲数据块的内存上限，为None时不限制
+        '''
+        assert(depth >= 1)
+        assert(max_bytes is None or max_bytes > 0)
+        self._depth = depth
+        self._max_bytes = max_bytes
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @staticmethod
+    def _nbytes(data):
+        '''数据块占用的内存'''
+        try:
+            return int(data.memory_usage(index=True, deep=False).sum())
+        except AttributeError:
+            return 0
+
+    def iterate(self, gen):
+        '''在后台线程中执行生成器gen，按原顺序输出其数据块
+
+            调用方提前结束迭代时通知后台线程停止，并丢弃已缓冲的数据块
+            Args：
+                gen: 数据块生成器
+            Yields:
+                gen输出的数据块
+        '''
+        buffer = deque()
+        cond = threading.Condition()
+        state = {'bytes': 0, 'done': False, 'error': None, 'stop': False}
+
+        def full():
+            if not buffer:
+                return False
+            if len(buffer) >= self._depth:
+                return True
+            return self._max_bytes is not None and state['bytes'] >= self._max_bytes
+
+        def produce():
+            try:
+                for data in gen:
+                    nbytes = self._nbytes(data)
+                    with cond:
+                        while full() and not state['stop']:
+                            cond.wait()
+                        if state['stop']:
+                            break
+                        buffer.append((data, nbytes))
+                        state['bytes'] += nbytes
+                        cond.notify_all()
+            except BaseException as e:
+                with cond:
+                    state['error'] = e
+            finally:
+                gen.close()
+                with cond:
+                    state['done'] = True
+                    cond.notify_all()
+
+        thread = threading.Thread(target=produce, name='loganalysis-prefetch', daemon=True)
+        thread.start()
+        try:
+            while True:
+                with cond:
+                    while not buffer and not state['done']:
+                        cond.wait()
+                    if not buffer:
+                        if state['error'] is not None:
+                            raise state['error']
+                        return
+                    data, nbytes = buffer.popleft()
+                    state['bytes'] -= nbytes
+                    cond.notify_all()
+                yield data
+        finally:
+            with cond:
+                state['stop'] = True
+                buffer.clear()
+                cond.notify_all()
+            thread.join()
@@ -0,0 +1,87 @@
+# coding=utf-8
+import re
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+
+# EI字段名：结构名.前缀+大写开头的字段名，前缀可带数组标记a
+_FIELD_PATTERN = re.compile(r'\.a?(u8|u16|u32|u64|b8|s8|s16|s32|s64)(?=[A-Z0-9_])')
+
+# 各文件类型中不符合前缀规则的字段类型，{文件类型: {列名: 类型}}
+SCHEMAS = {filetype: {} for filetype in LTE_FILE_TYPES + MESH_FILE_TYPES}
+for _filetype in LTE_FILE_TYPES:
+    if _filetype.endswith(LTE_FILE_PUCCH):
+        SCHEMAS[_filetype].update({'DSP1_PUCCH_UERUN_INFO.SystemSfn': 'UInt32',
+                                   'DSP1_PUCCH_UERUN_INFO.AckExist': 'UInt8',
+                                   'DSP1_PUCCH_UERUN_INFO.CqiExist': 'UInt8',
+                                   'DSP1_PUCCH_UERUN_INFO.SrExist': 'UInt8'})
+    elif _filetype.endswith(LTE_FILE_PUSCH):
+        SCHEMAS[_filetype].update({'DSP1_PUSCH_UE_RUN_INFO.SystemTime': 'UInt32',
+                                   'DSP1_PUSCH_UE_RUN_INFO.HarqProcID': 'UInt8'})
+
+
+def register_schema(filetype, dtypes):
+    '''登记文件类型中字段的类型，优先于前缀规则
+
+        Args:
+            filetype: 文件类型
+            dtypes: {列名: 类型}
+    '''
+    SCHEMAS.setdefault(filetype, {}).update(dtypes)
+
+
+def field_dtype(col):
+    '''根据EI字段名前缀推导紧凑类型，不符合前缀规则时返回None'''
+    match = _FIELD_PATTERN.search(col)
+    return EI_FIELD_DTYPES[match.group(1)] if match else None
+
+
+def schema_of(filetype, cols):
+    '''获取指定列的紧凑类型，解析后由apply_schema转换
+
+        Args:
+            filetype: 文件类型
+            cols: 列名列表
+        Returns:
+            {列名: 类型}，只包含已登记或符合前缀规则的列，其余列保留read_csv推断的类型
+    '''
+    schema = SCHEMAS.get(filetype, {})
+    dtypes = {}
+    for col in cols:
+        dtype = schema.get(col, field_dtype(col))
+        if dtype is not None:
+            dtypes[col] = dtype
+    return dtypes
+
+
+def apply_schema(data, dtypes):
+    '''把read_csv按默认类型解析的数据转换为紧凑类型
+
+        不能直接作为read_csv的dtype参数：超出范围的取值会按位截断(如u8列中的300解析为44)。
+        整数类型的列只有全部取值都是该类型范围内的整数时才转换，否则保留解析得到的较宽类型(int64/float64/object)
+        Args:
+            data: DataFrame，原地转换
+            dtypes: schema_of得到的{列名: 类型}，data中没有的列忽略
+        Returns:
+            data
+    '''
+    for col, dtype in dtypes.items():
+        if col not in data.columns:
+            continue
+        dtype = pd.api.types.pandas_dtype(dtype)
+        values = data[col]
+        if pd.api.types.is_integer_dtype(dtype):
+            if not pd.api.types.is_numeric_dtype(values.dtype):
+                continue
+            valid = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = valid[~np.isnan(valid)]
+            info = np.iinfo(dtype.numpy_dtype if hasattr(dtype, 'numpy_dtype') else dtype)
+            if valid.size and (valid.min() < info.min or valid.max() > info.max or (valid != np.floor(valid)).any()):
+                continue
+        data[col] = values.astype(dtype)
+    return data
+
+
+def record_group(col):
+    '''EI字段所属的记录组(结构名)，如SCHD.u8RbNum属于SCHD；AirTime、UEGID等公共列返回None'''
+    return col.split('.', 1)[0] if '.' in col else None
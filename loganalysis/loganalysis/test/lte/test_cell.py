@@ -0,0 +1,162 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from loganalysis.const import LTE_FILE_DLSCHD, LTE_FILE_NI
+from loganalysis.log import LogFile
+from loganalysis.lte.dlschd import DlSchdCell
+from loganalysis.lte.harq import ack_subframe_table, first_chunk
+from loganalysis.lte.ltelog import LteLog
+from loganalysis.lte.ulschd import UlSchdCell
+from loganalysis.test.sample import lte_log_dir, DL_DEM_OFFSET, DL_SUBFRMS, UL_GRANT_SUBFRMS, WRAP_FRAME
+
+MISMATCHES = ['pdsch', 'pdcch', 'pucch', 'pusch', 'dlackdem', 'ulcrcdem']
+
+
+class TestCellMismatch(unittest.TestCase):
+    '''Cell不匹配查询单元测试类'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.log = LteLog(lte_log_dir())
+        cls.wrap_log = LteLog(lte_log_dir(frame=WRAP_FRAME))
+
+    def _mismatches(self, log, cellid):
+        cell = log.get_cell(cellid)
+        return {name: getattr(cell, 'find_{0}_mismatch'.format(name))().reset_index(drop=True)
+                for name in MISMATCHES}
+
+    def test_found(self):
+        rlt = self._mismatches(self.log, 201)
+        for name in ['pdsch', 'pdcch', 'pucch', 'pusch', 'ulcrcdem']:
+            self.assertGreater(len(rlt[name].index), 0, name)
+
+    def test_chunks(self):
+        '''分块读取与按文件读取结果一致'''
+        chunked = LteLog(lte_log_dir(), chunksize=1000)
+        for cellid in [201, 203]:
+            expected = self._mismatches(self.log, cellid)
+            rlt = self._mismatches(chunked, cellid)
+            for name in MISMATCHES:
+                pd.testing.assert_frame_equal(expected[name], rlt[name], check_dtype=False)
+
+    def test_across_wrap(self):
+        '''跨越空口帧号翻转点的Log与不翻转的Log得到相同的不匹配记录'''
+        for cellid in [201, 203]:
+            expected = self._mismatches(self.log, cellid)
+            rlt = self._mismatches(self.wrap_log, cellid)
+            for name in MISMATCHES:
+                self.assertEqual(len(expected[name].index), len(rlt[name].index), name)
+                self.assertEqual(list(expected[name]['UEGID']), list(rlt[name]['UEGID']), name)
+
+    def test_describle(self):
+        rlt = self.log.get_cell(201).describle()
+        expected = self._mismatches(self.log, 201)
+        for name in MISMATCHES:
+            self.assertEqual(len(expected[name].index), rlt[name + '_mismatch_cnt'])
+
+    def test_describle_single_pass(self):
+        '''describle对每个Log只读取一次'''
+        cell = self.log.get_cell(203)
+        with mock.patch.object(LogFile, '_gen_of_cols', autospec=True, side_effect=LogFile._gen_of_cols) as gen:
+            cell.describle()
+        reads = Counter(id(call[0][0]) for call in gen.call_args_list)
+        self.assertEqual(5, len(reads))
+        self.assertEqual({1}, set(reads.values()))
+
+
+class TestUlDlCfgIdx(unittest.TestCase):
+    '''上下行配比推断单元测试类'''
+
+    def setUp(self):
+        # 推断结果写入Log目录下的索引，复制一份避免影响其他测试
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        source = lte_log_dir()
+        for name in os.listdir(source):
+            if name.endswith('.csv'):
+                shutil.copy(os.path.join(source, name), self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def _table(self, schd, cols):
+        '''样例Log第一个数据块中调度子帧与解调子帧的对应关系'''
+        data = first_chunk(getattr(LteLog(self.directory).get_cell(201), schd).log, ['UEGID'] + cols)
+        schdcols, ackcols = ['UEGID'] + cols[:2], ['UEGID'] + cols[2:]
+        return ack_subframe_table(data[schdcols].dropna(), data[ackcols].dropna(), schdcols, ackcols)
+
+    def test_subframe_table(self):
+        '''配比2的调度与ACK/CRC时序都能找到；HarqId重复使用时可能多出其他解调子帧，但调度子帧只有配比中的子帧'''
+        for schd, cols, subfrms, offsets in [
+                ('dl', ['AirTime', 'SCHD.u8HarqId', 'ACK.u32DemTime', 'ACK.u8HarqId'], DL_SUBFRMS, DL_DEM_OFFSET),
+                ('ul', ['AirTime', 'GRANT.u8HarqId', 'CRCI.u32DemTime', 'CRCI.u8CrcHarqId'], UL_GRANT_SUBFRMS,
+                 [4] * 10)]:
+            table = self._table(schd, cols)
+            with self.subTest(schd=schd):
+                for subfrm in subfrms:
+                    self.assertEqual(1, table[subfrm][(subfrm + offsets[subfrm]) % 10])
+                self.assertEqual(set(subfrms), set(np.flatnonzero(table.any(axis=1))))
+
+    def test_infer(self):
+        '''配比2的Log根据上行或下行调度都推断为2'''
+        cell = LteLog(self.directory, index=False).get_cell(201)
+        self.assertEqual(2, cell.uldlcfgidx)
+        self.assertEqual(2, cell.dl.infer_uldlcfgidx())
+        self.assertEqual(2, cell.ul.infer_uldlcfgidx())
+        with mock.patch.object(DlSchdCell, 'infer_uldlcfgidx', return_value=255):
+            self.assertEqual(2, LteLog(self.directory, index=False).get_cell(201).uldlcfgidx)
+
+    def test_derived(self):
+        '''推断结果保存在索引中，再次构造小区时直接使用，Log文件变化后重新推断'''
+        with mock.patch.object(DlSchdCell, 'infer_uldlcfgidx', autospec=True,
+                               side_effect=DlSchdCell.infer_uldlcfgidx) as infer:
+            self.assertEqual(2, LteLog(self.directory).get_cell(201).uldlcfgidx)
+            self.assertEqual(1, infer.call_count)
+            self.assertEqual(2, LteLog(self.directory).get_cell(201).uldlcfgidx)
+            self.assertEqual(1, infer.call_count)
+            self.assertEqual(2, LteLog(self.directory).get_cell(203).uldlcfgidx)
+            self.assertEqual(2, infer.call_count)
+
+            name = sorted(name for name in os.listdir(self.directory) if name.startswith(LTE_FILE_DLSCHD))[-1]
+            stat = os.stat(os.path.join(self.directory, name))
+            os.utime(os.path.join(self.directory, name), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(2, LteLog(self.directory).get_cell(201).uldlcfgidx)
+            self.assertEqual(3, infer.call_count)
+
+    def test_invalid(self):
+        '''指定不支持的配比或者推断失败时抛出ValueError'''
+        log = LteLog(self.directory, index=False)
+        self.assertRaises(ValueError, log.get_cell, 201, 3)
+        self.assertEqual(1, log.get_cell(201, 1).uldlcfgidx)
+        with mock.patch.object(DlSchdCell, 'infer_uldlcfgidx', return_value=255), \
+                mock.patch.object(UlSchdCell, 'infer_uldlcfgidx', return_value=255):
+            self.assertRaises(ValueError, LteLog(self.directory, index=False).get_cell, 203)
+
+
+class TestNi(unittest.TestCase):
+    '''小区NI单元测试类'''
+
+    def tearDown(self):
+        plt.close('all')
+
+    def test_show(self):
+        '''多文件、分块读取时各RB的NI取所有记录的最大值'''
+        directory = lte_log_dir()
+        files = sorted(name for name in os.listdir(directory) if name.startswith(LTE_FILE_NI))
+        data = pd.concat([pd.read_csv(os.path.join(directory, name), na_values='-') for name in files])
+        data = data[data['CellId'] == 201]
+        expected = data[['RTL2_EI_CELL_NI.as16Ni%d' % i for i in range(4)]].max().values
+        for chunksize in [None, 500]:
+            plt.close('all')
+            LteLog(directory, chunksize=chunksize).get_cell(201).ni.show()
+            with self.subTest(chunksize=chunksize):
+                ax = plt.figure(plt.get_fignums()[0]).axes[0]
+                np.testing.assert_array_equal(expected, ax.lines[0].get_ydata())
@@ -0,0 +1,101 @@
+# coding=utf-8
+import unittest
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+from loganalysis.const import TTI_PERIOD
+from loganalysis.log import LogFile
+from loganalysis.lte.harq import HarqMatcher
+from loganalysis.lte.ltelog import LteLog
+from loganalysis.test.sample import addtime, lte_log_dir, DL_DEM_OFFSET, WRAP_FRAME
+
+# 各方向的输出列：[调度时间, UEGID, 调度HarqId, 反馈解调时间, 反馈HarqId, 反馈信息]
+LINK_COLS = {'dl': ['AirTime', 'UEGID', 'SCHD.u8HarqId', 'ACK.u32DemTime', 'ACK.u8HarqId', 'ACK.u8Tb0AckInfo'],
+             'ul': ['AirTime', 'UEGID', 'GRANT.u8HarqId', 'CRCI.u32DemTime', 'CRCI.u8CrcHarqId', 'CRCI.u8AckInfo']}
+
+
+class TestHarqMatcher(unittest.TestCase):
+    '''调度与HARQ反馈流式匹配单元测试类'''
+
+    COLS = ['AirTime', 'UEGID', 'HarqId', 'ACK.Info']
+
+    def _chunk(self, rows):
+        '''[(调度时间, UEGID, HarqId, 反馈时间, 反馈HarqId, 反馈信息)]转换为数据块'''
+        return pd.DataFrame(rows, columns=['AirTime', 'UEGID', 'HarqId', 'ACK.DemTime', 'ACK.HarqId', 'ACK.Info'],
+                            dtype=float)
+
+    def _match(self, chunks, slack=0x20):
+        matcher = HarqMatcher(['AirTime', 'UEGID', 'HarqId'], ['ACK.DemTime', 'UEGID', 'ACK.HarqId'],
+                              self.COLS, 'ACK', slack)
+        rlt = pd.concat(list(matcher.match(iter(chunks))), ignore_index=True)
+        # 反馈记录和没有HarqId的记录原样输出，只比较调度记录
+        rlt = rlt[rlt['HarqId'].notna()]
+        return sorted(tuple(-1 if np.isnan(val) else int(val) for val in row) for row in rlt.values)
+
+    def test_pending(self):
+        '''反馈在后续数据块中也能匹配，超过slack仍没有反馈的调度输出为未匹配'''
+        nan = np.nan
+        chunks = [self._chunk([[0x100, 1, 3, nan, nan, nan], [0x101, 2, 4, nan, nan, nan],
+                               [0x102, 1, 5, nan, nan, nan], [nan, 1, nan, nan, nan, nan]]),
+                  self._chunk([[nan, 1, nan, 0x100, 3, 1], [nan, 2, nan, 0x101, 5, 0]]),
+                  self._chunk([[nan, 1, nan, 0x200, 5, 2]])]
+        self.assertEqual([(0x100, 1, 3, 1), (0x101, 2, 4, -1), (0x102, 1, 5, -1)],
+                         self._match(chunks))
+
+    def test_wrap(self):
+        '''翻转点之前的调度在翻转后收到反馈时没有超过slack，仍能匹配后续数据块中的反馈'''
+        nan = np.nan
+        last = 0xFFFFFFF9
+        chunks = [self._chunk([[last, 1, 3, nan, nan, nan], [last, 2, 4, nan, nan, nan]]),
+                  self._chunk([[0x10, 2, 4, nan, nan, nan], [nan, 2, nan, 0x10, 4, 0]]),
+                  self._chunk([[nan, 1, nan, last, 3, 1]])]
+        self.assertEqual([(0x10, 2, 4, 0), (last, 1, 3, 1), (last, 2, 4, -1)], self._match(chunks))
+
+
+class TestLogHarqMatch(unittest.TestCase):
+    '''上下行调度与ACK/CRC反馈匹配单元测试类'''
+
+    @staticmethod
+    def _matched(log, link, cellid=201):
+        '''有HarqId的调度记录的匹配结果，空口时间转换为相对Log起始的TTI数，按时间和UEGID排序'''
+        cols = LINK_COLS[link]
+        rlt = pd.concat(list(getattr(log.get_cell(cellid), link).match_schd_and_ack(cols)), ignore_index=True)
+        rlt = rlt[rlt[cols[2]].notna()]
+        start = LogFile.dectime(log.get_cell(cellid).dl.log.get_data_of_cols(['AirTime'])['AirTime'].iloc[0])
+        rlt = rlt.assign(Tti=(LogFile.dectime(rlt['AirTime'].values).astype(np.int64) - start) % TTI_PERIOD)
+        rlt = rlt.drop(columns=[cols[0], cols[3]]).astype(float)
+        return rlt.sort_values(['Tti', 'UEGID']).reset_index(drop=True)
+
+    def test_chunks(self):
+        '''分块读取与按文件读取结果一致，反馈在下一个数据块或文件中的也能匹配'''
+        for link in LINK_COLS:
+            expected = self._matched(LteLog(lte_log_dir()), link)
+            for chunksize in [97, 500]:
+                with self.subTest(link=link, chunksize=chunksize):
+                    pd.testing.assert_frame_equal(expected, self._matched(LteLog(lte_log_dir(),
+                                                                                 chunksize=chunksize), link))
+
+    def test_across_wrap(self):
+        '''跨越空口帧号翻转点的Log与不翻转的Log结果一致'''
+        for link in LINK_COLS:
+            expected = self._matched(LteLog(lte_log_dir()), link)
+            with self.subTest(link=link):
+                pd.testing.assert_frame_equal(expected, self._matched(LteLog(lte_log_dir(frame=WRAP_FRAME),
+                                                                             chunksize=500), link))
+
+    def test_timing(self):
+        '''匹配到的反馈符合配比时序，只有反馈时间在Log结束之后的调度没有反馈'''
+        log = LteLog(lte_log_dir(frame=WRAP_FRAME))
+        last = log.get_cell(201).dl.log.get_data_of_cols(['AirTime'])['AirTime'].iloc[-1]
+        for link, offsets in [('dl', DL_DEM_OFFSET), ('ul', [4] * 10)]:
+            cols = LINK_COLS[link]
+            rlt = pd.concat(list(getattr(log.get_cell(201), link).match_schd_and_ack(cols)), ignore_index=True)
+            rlt = rlt[rlt[cols[2]].notna()]
+            demtime = np.array([addtime(int(airtime), offsets[int(airtime) % 16]) for airtime in rlt['AirTime']])
+            matched = rlt[cols[4]].notna().values
+            with self.subTest(link=link):
+                self.assertGreater(matched.sum(), 0.99 * len(matched))
+                np.testing.assert_array_equal(demtime[matched], rlt[cols[3]].values[matched].astype(np.uint32))
+                np.testing.assert_array_equal(rlt[cols[2]].values[matched], rlt[cols[4]].values[matched])
+                self.assertTrue(np.all(LogFile.difftime(demtime[~matched], last) < 0x10))
@@ -0,0 +1,109 @@
+# coding=utf-8
+import os
+import unittest
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+from loganalysis.const import LTE_FILE_DLSCHD, LTE_FILE_ULSCHD, LTE_SCHD_FAIL_RSNS
+from loganalysis.lte.kpi import KPI_METRICS, ue_matrices
+from loganalysis.lte.ltelog import LteLog
+from loganalysis.test.sample import lte_log_dir
+
+MATRIX_COLS = ['AirTime', 'UEGID', 'TB.u16TbSize', 'ACK.u8Tb0AckInfo', 'ACK.u8Tb1AckInfo']
+
+
+class TestUeMatrices(unittest.TestCase):
+    '''UE流量和BLER稀疏矩阵单元测试类'''
+
+    def test_sparse(self):
+        # 第1s: UE1两次ACK、UE2没有反馈；第3s: UE1一次NACK一次DTX、UE3流量为0；两个数据块中的同一组合合并
+        chunks = [pd.DataFrame([[1600, 1, 100, 1, np.nan], [1601, 2, 200, np.nan, np.nan]], columns=MATRIX_COLS),
+                  pd.DataFrame([[1602, 1, 50, 1, np.nan], [4800, 1, 1000, 0, 2], [4801, 3, 0, 1, 1],
+                                [np.nan, 1, 10, 1, 1]], columns=MATRIX_COLS)]
+        throughput, bler = ue_matrices(iter(chunks), MATRIX_COLS, 1)
+
+        expected = pd.DataFrame({1: [1.2, 8.0], 2: [1.6, 0], 3: [0, 0]}, index=pd.Index([1, 3], name='AirTime'),
+                                dtype=float)
+        self.assertTrue(all(isinstance(dtype, pd.SparseDtype) for dtype in throughput.dtypes))
+        pd.testing.assert_frame_equal(expected, throughput.sparse.to_dense(), check_names=False)
+        self.assertEqual([2, 1, 0], [throughput[ue].array.npoints for ue in [1, 2, 3]])
+
+        expected = pd.DataFrame({1: [0, 1], 3: [np.nan, 0]}, index=pd.Index([1, 3], name='AirTime'), dtype=float)
+        pd.testing.assert_frame_equal(expected, bler.sparse.to_dense(), check_names=False)
+        self.assertEqual([2, 1], [bler[ue].array.npoints for ue in [1, 3]])
+
+    def test_empty(self):
+        throughput, bler = ue_matrices(iter([]), MATRIX_COLS, 1)
+        self.assertTrue(throughput.empty and bler.empty)
+
+    def test_chunks(self):
+        '''分块读取与按文件读取结果一致'''
+        expected = LteLog(lte_log_dir()).get_cell(201).dl.ue_matrices()
+        rlt = LteLog(lte_log_dir(), chunksize=700).get_cell(201).dl.ue_matrices()
+        self.assertGreater(len(expected[0].columns), 0)
+        for exp, matrix in zip(expected, rlt):
+            pd.testing.assert_frame_equal(exp, matrix)
+
+
+def _brute_cube(directory, metrics, airtime_bin_size, keycols):
+    '''直接读取全部调度Log，逐指标分组计算KPI，作为kpi_cube的对照结果'''
+    data = {}
+    for filetype in (LTE_FILE_DLSCHD, LTE_FILE_ULSCHD):
+        files = sorted(name for name in os.listdir(directory) if name.startswith(filetype))
+        data[filetype] = pd.concat([pd.read_csv(os.path.join(directory, name), na_values='-') for name in files],
+                                   ignore_index=True)
+    rlt = {}
+    for name in metrics:
+        filetype, timecol, kind, datacols = KPI_METRICS[name]
+        frame = data[filetype].dropna(subset=[timecol] + keycols)
+        keys = [(frame[timecol] // (airtime_bin_size*1600)).astype(np.int64).rename('AirTime')]
+        keys.extend(frame[col].astype(np.int64) for col in keycols)
+        values = frame[datacols]
+        if 'bler' == kind:
+            nack = values.isin([0, 2]).sum(axis=1).groupby(keys).sum()
+            rlt[name] = nack / (nack + (values == 1).sum(axis=1).groupby(keys).sum())
+        elif 'throughput' == kind:
+            rlt[name] = values[datacols[0]].groupby(keys).sum() * 8 / 1000
+        elif 'count' == kind:
+            rlt[name] = values[datacols[0]].groupby(keys).count()
+        elif 'mean' == kind:
+            rlt[name] = values[datacols[0]].groupby(keys).mean()
+        else:
+            for rsn, counts in values[datacols[0]].groupby(keys).value_counts().unstack().items():
+                rlt['{name}.{rsn}'.format(name=name, rsn=LTE_SCHD_FAIL_RSNS[int(rsn)])] = counts
+    rlt = pd.DataFrame(rlt)
+    # 分组中没有该指标的数据时，次数和流量为0，比值为空值
+    for name in rlt.columns:
+        if KPI_METRICS[name.split('.')[0]][2] not in ('bler', 'mean'):
+            rlt[name] = rlt[name].fillna(0)
+    return rlt
+
+
+class TestKpiCube(unittest.TestCase):
+    '''多KPI指标一次遍历计算单元测试类'''
+
+    def _check(self, expected, rlt):
+        self.assertEqual(sorted(expected.columns), sorted(rlt.columns))
+        pd.testing.assert_frame_equal(expected[rlt.columns], rlt, check_dtype=False, check_index_type=False)
+
+    def test_brute_force(self):
+        '''与直接读取全部Log逐指标分组计算的结果一致'''
+        # 合成的上行调度Log中没有调度失败原因
+        metrics = [name for name in KPI_METRICS if 'ul_schdfail' != name]
+        log = LteLog(lte_log_dir())
+        for airtime_bin_size, by_ue in [(1, False), (2, True)]:
+            keycols = ['CellId', 'UEGID'] if by_ue else ['CellId']
+            with self.subTest(airtime_bin_size=airtime_bin_size, by_ue=by_ue):
+                rlt = log.kpi_cube(metrics, airtime_bin_size, by_ue)
+                self.assertGreater(len(rlt.index), 0)
+                self.assertEqual(['AirTime'] + keycols, list(rlt.index.names))
+                self._check(_brute_cube(lte_log_dir(), metrics, airtime_bin_size, keycols), rlt)
+
+    def test_modes(self):
+        '''分块读取和多进程计算与按文件读取结果一致'''
+        metrics = ['dl_bler', 'dl_throughput', 'dl_schdfail', 'ul_bler', 'ul_rbnum']
+        expected = LteLog(lte_log_dir()).kpi_cube(metrics, by_ue=True)
+        for kwargs in [{'chunksize': 700}, {'workers': 2}]:
+            with LteLog(lte_log_dir(), **kwargs) as log, self.subTest(**kwargs):
+                pd.testing.assert_frame_equal(expected, log.kpi_cube(metrics, by_ue=True))
@@ -0,0 +1,133 @@
+# coding=utf-8
+import unittest
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+from loganalysis.const import LTE_SCHD_FAIL_RSNS
+from loganalysis.lte.ltelog import LteLog
+from loganalysis.lte.reason import infer_schdfail_reasons
+from loganalysis.test.sample import lte_log_dir, WRAP_FRAME
+
+COLS = ['UEGID', 'AbsTti', 'Schd', 'FailRsn', 'ChgLch', 'HasBsr', 'Lch', 'RlcBsr', 'SchdBsr']
+
+# 单UE推测结果中各原因的文字
+INFER_TEXTS = {'no_schd_context': '无法分析', 'no_bsr': '没有BSR', 'bsr_after_schd': '调度结束才收到BSR',
+               'rlc_bsr_zero': 'RLC上报的BSR为0', 'manual': '需要人工分析'}
+
+
+def _records(rows):
+    '''[(UEGID, TTI, {列名: 值})]转换为infer_schdfail_reasons的输入'''
+    return pd.DataFrame([dict({col: np.nan for col in COLS[2:]}, UEGID=ue, AbsTti=tti, **vals)
+                         for ue, tti, vals in rows], columns=COLS)
+
+
+class TestInferSchdFailReasons(unittest.TestCase):
+    '''批量调度失败原因推测单元测试类'''
+
+    def _reasons(self, rows):
+        rlt = infer_schdfail_reasons(_records(rows), COLS)
+        return {(ue, tti): reason for ue, tti, reason in rlt.itertuples(index=False)}
+
+    def test_rules(self):
+        rlt = self._reasons([(1, 0, {'ChgLch': 3, 'HasBsr': 1}),
+                             (1, 1, {'Schd': 0}),
+                             (1, 1, {'Lch': 3, 'RlcBsr': 10, 'SchdBsr': 5}),
+                             (1, 2, {'FailRsn': 2}),
+                             (1, 3, {'ChgLch': 4, 'HasBsr': 1}),
+                             (1, 4, {}),
+                             (1, 5, {'Schd': 1}),
+                             (1, 5, {'Lch': 3, 'RlcBsr': 0, 'SchdBsr': 0}),
+                             (1, 5, {'Lch': 4, 'RlcBsr': 3, 'SchdBsr': 5}),
+                             (1, 6, {}),
+                             (1, 7, {'ChgLch': 3, 'HasBsr': 0}),
+                             (1, 7, {'ChgLch': 4, 'HasBsr': 0}),
+                             (1, 8, {}),
+                             (2, 4, {'Schd': 2, 'Lch': 3, 'RlcBsr': 0, 'SchdBsr': 0, 'ChgLch': 3, 'HasBsr': 0}),
+                             (2, 5, {})])
+        self.assertEqual({(1, 0): 'no_schd_context', (1, 2): LTE_SCHD_FAIL_RSNS[2], (1, 3): 'bsr_after_schd',
+                          (1, 4): 'manual', (1, 6): 'rlc_bsr_zero', (1, 7): 'no_bsr', (1, 8): 'no_bsr',
+                          (2, 5): 'no_bsr'}, rlt)
+
+    def test_lch_state_per_segment(self):
+        '''各逻辑信道的BSR状态只在两次调度之间前向填充，RLC和调度BSR取各自最后一次的值'''
+        rows = [(1, 0, {'Schd': 0}), (1, 0, {'Lch': 5, 'RlcBsr': 9, 'SchdBsr': 1}),
+                (1, 1, {'Schd': 1}), (1, 2, {}),
+                (1, 3, {'Lch': 5, 'SchdBsr': 4}), (1, 4, {'Lch': 5, 'RlcBsr': 2}),
+                (1, 5, {'ChgLch': 6}), (1, 6, {})]
+        self.assertEqual({(1, 2): 'no_bsr', (1, 3): 'manual', (1, 4): 'rlc_bsr_zero', (1, 5): 'bsr_after_schd',
+                          (1, 6): 'rlc_bsr_zero'}, self._reasons(rows))
+
+    def test_empty(self):
+        rlt = infer_schdfail_reasons(_records([]), COLS)
+        self.assertEqual(['UEGID', 'AbsTti', 'Reason'], list(rlt.columns))
+        self.assertEqual(0, len(rlt.index))
+
+
+class TestLogSchdFailReasons(unittest.TestCase):
+    '''下行调度批量失败原因与逐UE分析结果对比单元测试类'''
+
+    def _check(self, log, cellid, num=40):
+        rlt = log.get_cell(cellid).dl.infer_schdfail_reasons()
+        self.assertGreater(len(rlt.index), 0)
+        ues = {}
+        for _, row in rlt.sample(min(num, len(rlt.index)), random_state=0).iterrows():
+            ue = ues.setdefault(row.UEGID, log.get_ue(int(row.UEGID), cellid))
+            reason = ue.dl._infer_schdfail_reason(int(row.AirTime))
+            self.assertIn(INFER_TEXTS.get(row.Reason, row.Reason), reason, row.to_dict())
+        return rlt
+
+    def test_consistent_with_ue(self):
+        self._check(LteLog(lte_log_dir()), 201)
+
+    def test_across_wrap(self):
+        '''跨越空口帧号翻转点的Log与不翻转的Log结果一致'''
+        rlt = self._check(LteLog(lte_log_dir(frame=WRAP_FRAME), chunksize=1000), 203)
+        expected = LteLog(lte_log_dir()).get_cell(203).dl.infer_schdfail_reasons()
+        pd.testing.assert_series_equal(expected['Reason'], rlt['Reason'])
+        pd.testing.assert_series_equal(expected['UEGID'], rlt['UEGID'], check_dtype=False)
+
+
+class TestSelfMaintainReasons(unittest.TestCase):
+    '''自维护原因归因单元测试类'''
+
+    LINKS = [('DL', 'dl', ['ACK.u32DemTime', 'UEGID']), ('UL', 'ul', ['CRCI.u32DemTime', 'UEGID'])]
+
+    @staticmethod
+    def _lookup(cell, schd, cols):
+        '''逐条自维护记录按优先级在各不匹配记录中查找(解调时间, UEGID)，得到第一个命中的原因'''
+        selfdata = schd.find_selfmaintain()[cols].drop_duplicates().astype(np.uint32)
+        mismatches = [(reason, getattr(cell, 'find_' + reason)()) for reason in schd.SELFMAINTAIN_REASONS]
+        rlt = []
+        for demtime, uegid in selfdata.itertuples(index=False):
+            hits = [reason for reason, mismatch in mismatches
+                    if ((mismatch[mismatch.columns[0]] == demtime) & (mismatch[cols[1]] == uegid)).any()]
+            rlt.append((int(demtime), int(uegid), hits[0] if hits else None))
+        return rlt
+
+    @staticmethod
+    def _tuples(data):
+        return [(int(demtime), int(uegid), None if pd.isna(reason) else reason)
+                for demtime, uegid, reason in data.itertuples(index=False)]
+
+    def test_lookup(self):
+        '''与逐条查找的结果一致，上下行都有命中的记录'''
+        log = LteLog(lte_log_dir(), chunksize=1000)
+        cell = log.get_cell(201)
+        expected = {}
+        for link, name, cols in self.LINKS:
+            schd = getattr(cell, name)
+            expected[link] = self._lookup(cell, schd, cols)
+            with self.subTest(link=link):
+                self.assertTrue(any(reason is not None for _, _, reason in expected[link]))
+                self.assertEqual(expected[link], self._tuples(schd.why_selfmaintain()))
+
+        rlt = cell.why_selfmaintain()
+        self.assertEqual(['Link', 'DemTime', 'UEGID', 'Reason'], list(rlt.columns))
+        for link, _, _ in self.LINKS:
+            self.assertEqual(expected[link], self._tuples(rlt.loc[rlt['Link'] == link, rlt.columns[1:]]))
+
+        rlt = log.why_selfmaintain([201, 999])
+        self.assertEqual({201}, set(rlt['CellId']))
+        for link, _, _ in self.LINKS:
+            self.assertEqual(expected[link], self._tuples(rlt.loc[rlt['Link'] == link, rlt.columns[2:]]))
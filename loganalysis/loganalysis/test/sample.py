@@ -0,0 +1,177 @@
+# coding=utf-8
+'''单元测试使用的合成EI Log
+
+    按上下行配比2生成下行/上行调度、DL PHY、PUCCH、PUSCH和小区NI Log，调度与ACK/CRC反馈按配比时序对应，
+    少量PHY记录和反馈随机缺失，用于产生不匹配和自维护记录。相同seed生成相同的记录，与起始帧号无关，
+    因此跨越空口帧号翻转点的Log与不翻转的Log结果应当一致。
+'''
+import atexit
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# 配比2下行调度子帧到ACK解调的时间偏移、上行授权子帧
+DL_DEM_OFFSET = (7, 6, 0, 4, 8, 7, 6, 0, 4, 8)
+DL_SUBFRMS = (0, 1, 3, 4, 5, 6, 8, 9)
+UL_GRANT_SUBFRMS = (3, 8)
+
+# 起始帧号，默认参数下空口帧号在第二个文件中间翻转
+WRAP_FRAME = 0x10000000 - 90
+
+# 已生成的Log目录，同一进程中相同参数只生成一次
+_DIRS = {}
+
+FILE_TYPES = ('RTL2_dlUeTtiInfo', 'RTL2_ulUeTtiInfo', 'Cell0DLPHYUERunInfo', 'Cell0PucchUERunInfo',
+              'Cell0PuschUERunInfo', 'RTL2_CellTtiInfo')
+
+
+def addtime(airtime, delta):
+    '''16进制空口时间加法，帧号按AIRTIME_FRAME_WRAP翻转'''
+    frame = airtime // 16 + delta // 16
+    subfrm = airtime % 16 + delta % 16
+    if subfrm >= 10:
+        subfrm -= 10
+        frame += 1
+    return (frame % 0x10000000) * 16 + subfrm
+
+
+def write_lte_log(directory, nfiles=3, ttis_per_file=600, frame=100, cells=(201, 203), ues=(1, 2, 3, 247),
+                  seed=0):
+    '''在directory下生成合成LTE Log，每类Log按时间顺序分为nfiles个文件
+
+        Args:
+            directory: 输出目录
+            nfiles: 每类Log的文件数
+            ttis_per_file: 每个文件包含的TTI数
+            frame: 起始帧号，接近0x10000000时Log跨过翻转点
+            cells: 小区ID
+            ues: UEGID
+            seed: 随机数种子
+        Returns:
+            无
+    '''
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    airtime = frame * 16
+    localtime = 20190422232542000
+    pend_dl = []
+    pend_ul = []
+    for fileidx in range(nfiles):
+        rows = {filetype: [] for filetype in FILE_TYPES}
+        dl, ul, dlphy, pucch, pusch, ni = [rows[filetype] for filetype in FILE_TYPES]
+        for _ in range(ttis_per_file):
+            subfrm = airtime % 16
+            localtime += 1
+            head = {'LocalTime': localtime, 'AirTime': airtime}
+            for cell in cells:
+                ni.append(dict(head, CellId=cell, UEGID=np.nan,
+                               **{'RTL2_EI_CELL_NI.as16Ni%d' % i: -100 - rng.integers(0, 20) for i in range(4)}))
+                for ue in ues:
+                    key = dict(head, CellId=cell, UEGID=ue)
+                    if (ue * 7 + localtime) % 5 == 0:
+                        continue
+                    if subfrm in DL_SUBFRMS and rng.random() < 0.6:
+                        harq = int(rng.integers(0, 15))
+                        schd = dict(key, **{'SCHD.u8HarqId': harq, 'SCHD.u8RbNum': int(rng.integers(1, 100)),
+                                            'SCHD.u8TranScheme': int(rng.integers(0, 3)),
+                                            'SCHD.u8CceStart': int(rng.integers(0, 40)), 'SCHD.u8Tac': 31,
+                                            'AMC_DIV.s16TxDivDeltaMcs': int(rng.integers(-500, 500)),
+                                            'AMC_DIV.u8TxDivStdMcs': int(rng.integers(0, 28))})
+                        dl.append(schd)
+                        dl.append(dict(key, **{'TB.u16TbSize': int(rng.integers(100, 5000))}))
+                        dl.append(dict(key, **{'LCH_SCHD.u8LchId': 3,
+                                               'LCH_SCHD.u16RlcRptBsr': int(rng.integers(0, 100)),
+                                               'LCH_SCHD.u16SchdBsr': int(rng.integers(0, 100))}))
+                        pend_dl.append((addtime(airtime, DL_DEM_OFFSET[subfrm]), cell, ue, harq))
+                        if rng.random() < 0.97:
+                            dlphy.append(dict(key, **{'DLPHY_UE_EI_INFO.u32AirTime': airtime,
+                                                      'DLPHY_UE_EI_INFO.u8PDSCH_TS': schd['SCHD.u8TranScheme'],
+                                                      'DLPHY_UE_EI_INFO.u8PDCCH_CCEStartNo0': schd['SCHD.u8CceStart'],
+                                                      'DLPHY_UE_EI_INFO.u8PDCCH_CCEStartNo1': 99,
+                                                      'DLPHY_UE_EI_INFO.u8PDCCH_CCEStartNo2': 99,
+                                                      'DLPHY_UE_EI_INFO.u8PDCCH_CCEStartNo3': 99}))
+                    elif subfrm in DL_SUBFRMS and rng.random() < 0.2:
+                        dl.append(dict(key, **{'SCHD_FAIL_RSN.u32UeSchdFailRsn': int(rng.integers(0, 30))}))
+                    if rng.random() < 0.05:
+                        dl.append(dict(key, **{'BSRCHANGE.u8LchId': 3,
+                                               'BSRCHANGE.b8LchHasBsr': int(rng.integers(0, 2))}))
+                    if subfrm in UL_GRANT_SUBFRMS and rng.random() < 0.6:
+                        harq = int(rng.integers(0, 7))
+                        ul.append(dict(key, **{'GRANT.u8HarqId': harq, 'GRANT.u8RbNum': int(rng.integers(1, 100)),
+                                               'GRANT.u8CceStart': int(rng.integers(0, 40)), 'GRANT.u8IsDciSchd': 1,
+                                               'GRANT.u8MatchType': int(rng.integers(0, 3)),
+                                               'TB.u8Mcs': int(rng.integers(0, 29)),
+                                               'TB.u16TbSize': int(rng.integers(100, 5000)),
+                                               'AMC.s16DeltaMcs': int(rng.integers(-500, 500)),
+                                               'AMC.u8StdMcs': int(rng.integers(0, 28)),
+                                               'PUSCH_SINR.s16SingleRbSINR': int(rng.integers(-10, 30))}))
+                        pend_ul.append((addtime(airtime, 4), cell, ue, harq))
+                    if rng.random() < 0.1:
+                        ul.append(dict(key, **{'BSR.u32LchGrpId': int(rng.integers(0, 4)),
+                                               'BSR.u32LchGrpBsr': int(rng.integers(0, 1000)),
+                                               'PHR.u16PathLoss': int(rng.integers(60, 140))}))
+
+            # 到达解调时间的反馈
+            rest = []
+            for dem, cell, ue, harq in pend_dl:
+                if dem != airtime:
+                    rest.append((dem, cell, ue, harq))
+                    continue
+                key = dict(head, CellId=cell, UEGID=ue)
+                selfmaintain = int(rng.random() < 0.05)
+                dl.append(dict(key, **{'ACK.u32DemTime': dem, 'ACK.u8HarqId': harq,
+                                       'ACK.u8Tb0AckInfo': 255 if selfmaintain else int(rng.choice([0, 1, 1, 1, 2])),
+                                       'ACK.u8Tb1AckInfo': 2 if selfmaintain else int(rng.choice([0, 1, 2])),
+                                       'ACK.u8IsSelfMainTain': selfmaintain,
+                                       'ACK.u8Tb0IsHarqFail': int(rng.random() < 0.01), 'ACK.u8Tb1IsHarqFail': 0}))
+                ul.append(dict(key, **{'PHYMGR_INFO.u32DemTime': dem, 'PHYMGR_INFO.u8UlSchFlag': 0,
+                                       'PHYMGR_INFO.u8AckExist': 1 if rng.random() < 0.97 else 0,
+                                       'PHYMGR_INFO.u8CqiExist': 0, 'PHYMGR_INFO.u8SrExist': 0}))
+                if rng.random() < 0.97:
+                    pucch.append(dict(key, **{'DSP1_PUCCH_UERUN_INFO.SystemSfn': dem,
+                                              'DSP1_PUCCH_UERUN_INFO.AckExist': 1,
+                                              'DSP1_PUCCH_UERUN_INFO.CqiExist': 0,
+                                              'DSP1_PUCCH_UERUN_INFO.SrExist': 0}))
+            pend_dl = rest
+            rest = []
+            for dem, cell, ue, harq in pend_ul:
+                if dem != airtime:
+                    rest.append((dem, cell, ue, harq))
+                    continue
+                key = dict(head, CellId=cell, UEGID=ue)
+                ul.append(dict(key, **{'CRCI.u32DemTime': dem, 'CRCI.u8CrcHarqId': harq,
+                                       'CRCI.u8AckInfo': int(rng.choice([0, 1, 1, 1, 2])),
+                                       'CRCI.b8IsSelfMainTain': int(rng.random() < 0.05),
+                                       'CRCI.b8IsHarqFail': int(rng.random() < 0.01),
+                                       'CRCI.u8DciLostFlag': int(rng.random() < 0.02)}))
+                ul.append(dict(key, **{'PHYMGR_INFO.u32DemTime': dem, 'PHYMGR_INFO.u8UlSchFlag': 1,
+                                       'PHYMGR_INFO.u8HarqProcID': harq if rng.random() < 0.97 else 15}))
+                if rng.random() < 0.97:
+                    pusch.append(dict(key, **{'DSP1_PUSCH_UE_RUN_INFO.SystemTime': dem,
+                                              'DSP1_PUSCH_UE_RUN_INFO.HarqProcID': harq}))
+            pend_ul = rest
+            airtime = addtime(airtime, 1)
+
+        stamp = 20190422232542 + fileidx
+        for filetype in FILE_TYPES:
+            filename = os.path.join(directory, '{0}_{1}.csv'.format(filetype, stamp))
+            pd.DataFrame(rows[filetype]).to_csv(filename, index=False, na_rep='-', float_format='%.10g')
+
+
+def lte_log_dir(**kwargs):
+    '''获取按kwargs生成的合成LTE Log目录，进程退出时删除
+
+        Args:
+            kwargs: write_lte_log的参数
+        Returns:
+            Log目录
+    '''
+    key = tuple(sorted(kwargs.items()))
+    if key not in _DIRS:
+        directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        atexit.register(shutil.rmtree, directory, True)
+        write_lte_log(directory, **kwargs)
+        _DIRS[key] = directory
+    return _DIRS[key]
@@ -0,0 +1,72 @@
+# coding=utf-8
+import unittest
+import numpy as np
+import pandas as pd
+from loganalysis.accumulator import Accumulator
+
+
+def _chunk(start, num, value=1.0):
+    return pd.DataFrame({'a': np.arange(start, start+num, dtype=np.int64), 'b': np.full(num, value)},
+                        index=pd.RangeIndex(start * 10, start * 10 + num))
+
+
+class TestAccumulator(unittest.TestCase):
+    '''分块数据累积器单元测试类'''
+
+    def test_preallocated(self):
+        '''已知总行数且各数据块列和类型一致时拷贝到预分配的数组'''
+        chunks = [_chunk(0, 3), _chunk(3, 0), _chunk(5, 4, 2.0)]
+        acc = Accumulator(rows=7)
+        for data in chunks:
+            acc.append(data)
+        self.assertIsNotNone(acc._arrays)
+        self.assertEqual([], acc._chunks)
+        self.assertEqual(7, len(acc))
+        pd.testing.assert_frame_equal(pd.concat(chunks), acc.result(), check_index_type=False)
+
+    def test_fallback(self):
+        '''列、类型不一致或行数超出预期时退回到分块收集，结果与pd.concat一致'''
+        cases = [[_chunk(0, 3), _chunk(3, 2)[['b', 'a']]],
+                 [_chunk(0, 3), _chunk(3, 2).astype({'a': np.int32})],
+                 [_chunk(0, 3), _chunk(3, 2).assign(c=1)],
+                 [_chunk(0, 3), _chunk(3, 5)],
+                 [_chunk(0, 3).astype({'a': 'Int64'}), _chunk(3, 2).astype({'a': 'Int64'})]]
+        for chunks in cases:
+            with self.subTest(columns=[list(data.columns) for data in chunks]):
+                acc = Accumulator(rows=5)
+                for data in chunks:
+                    acc.append(data)
+                self.assertIsNone(acc._arrays)
+                pd.testing.assert_frame_equal(pd.concat(chunks), acc.result(), check_index_type=False)
+
+    def test_index(self):
+        '''ignore_index为False时保留数据块的行索引，否则从0编号'''
+        chunks = [_chunk(2, 3), _chunk(7, 2)]
+        for rows in [None, 5]:
+            acc = Accumulator(rows=rows)
+            ignored = Accumulator(rows=rows, ignore_index=True)
+            for data in chunks:
+                acc.append(data)
+                ignored.append(data)
+            with self.subTest(rows=rows):
+                self.assertEqual([20, 21, 22, 70, 71], list(acc.result().index))
+                self.assertEqual(list(range(5)), list(ignored.result().index))
+
+    def test_columns(self):
+        acc = Accumulator(columns=['b', 'c'], rows=3)
+        acc.append(_chunk(0, 3))
+        rlt = acc.result()
+        self.assertEqual(['b', 'c'], list(rlt.columns))
+        self.assertTrue(rlt['c'].isna().all())
+
+    def test_empty(self):
+        '''只收到空数据块时输出第一个数据块的空表，没有数据块时输出empty_columns'''
+        acc = Accumulator(rows=10)
+        acc.append(_chunk(0, 0).astype({'a': np.int32}))
+        rlt = acc.result()
+        self.assertEqual(0, len(rlt.index))
+        self.assertEqual([np.dtype(np.int32), np.dtype(np.float64)], list(rlt.dtypes))
+
+        rlt = Accumulator(empty_columns=['x', 'y']).result()
+        self.assertEqual(['x', 'y'], list(rlt.columns))
+        self.assertEqual(0, len(rlt.index))
@@ -0,0 +1,61 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from loganalysis.const import *
+from loganalysis.log import LogFile
+from loganalysis.lte.ltelog import LteLog
+from loganalysis.test.sample import lte_log_dir, WRAP_FRAME
+
+
+class TestAsofIndex(unittest.TestCase):
+    '''AsofIndex和get_last_of_cols单元测试类'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.log = LteLog(lte_log_dir(frame=WRAP_FRAME))
+        cls.dl = cls.log._logfiles[LTE_FILE_DLSCHD]
+
+    def _expected(self, logfile, ttis, cols, uegids):
+        '''逐个查询遍历全部记录得到的结果'''
+        data = pd.concat([chunk.assign(File=logfile.files.index(span[0]), Row=chunk.index)
+                          for span in logfile._file_spans()
+                          for chunk in logfile._gen_of_cols(cols + ['UEGID', ABSTTI_COL], None, None, [span])],
+                         ignore_index=True)
+        data = data[data[cols].notna().any(axis=1)]
+        rlt = []
+        for tti, uegid in zip(ttis, uegids):
+            hit = data[(data[ABSTTI_COL] <= tti) & (data['UEGID'] == uegid)]
+            rlt.append(-1 if 0 == len(hit.index) else hit[ABSTTI_COL].values[-1])
+        return np.array(rlt)
+
+    def test_multi_files_across_wrap(self):
+        cols = ['ACK.u8HarqId']
+        start = self.dl.timeline.start
+        ttis = start + np.array([-5, 0, 700, 1500, 1790, 1850, 2500, 10000])
+        uegids = np.array([1, 2, 3, 247, 1, 2, 3, 1])
+        airtimes = ttis % TTI_PERIOD // 10 * 16 + ttis % 10
+        rlt = self.dl.get_last_of_cols(airtimes, cols, keys=uegids)
+        # 查询时间早于Log起始时间时取最接近的翻转周期，与绝对TTI一致
+        self.assertEqual(list(self._expected(self.dl, ttis, cols, uegids)), list(rlt[ABSTTI_COL]))
+        self.assertTrue(rlt['File'].isna().values[0])
+        self.assertEqual(self.dl.files[-1], rlt['File'].values[-1])
+
+    def test_null_keys(self):
+        '''键为空的行不参与索引，键为空的查询不命中'''
+        directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        try:
+            data = pd.DataFrame({'LocalTime': np.arange(6), 'AirTime': np.arange(6) * 16,
+                                 'UEGID': [1, None, 2, None, 1, None], 'Val': [1, 2, 3, 4, 5, 6]})
+            data.to_csv(os.path.join(directory, 'test_1.csv'), index=False, na_rep='-')
+            logfile = LogFile('test', directory, ['test_1.csv'])
+            rlt = logfile.get_last_of_cols(np.array([0x30, 0x30, 0x50, 0x50]), ['Val'],
+                                           keys=np.array([1, 2, 0, np.nan]), keycol='UEGID')
+            self.assertEqual([0, 2, -1, -1], list(rlt['Row']))
+            with self.assertRaises(ValueError):
+                logfile.get_last_of_cols(np.array([0x30]), ['Val'], keys=np.array([1]))
+        finally:
+            shutil.rmtree(directory, True)
@@ -0,0 +1,292 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from loganalysis.cache import FileIndex, SidecarCache, SplitCache
+from loganalysis.const import INDEX_ID_CHUNK_ROWS, LTE_FILE_DLSCHD
+from loganalysis.log import LogFile
+from loganalysis.lte.ltelog import LteFile, LteLog
+from loganalysis.schema import apply_schema, record_group, schema_of
+from loganalysis.test.sample import lte_log_dir
+
+ROWS = 5000
+
+
+def write_csv(directory, name, rows=ROWS, seed=0, ue=0):
+    '''写一个按UEGID分段的稀疏EI文件：每行只填写SCHD、ACK或TB记录组中的一个，UEGID为ue+行号//1000'''
+    rng = np.random.default_rng(seed)
+    kinds = np.arange(rows) % 3
+    data = pd.DataFrame({'LocalTime': np.arange(rows), 'AirTime': np.arange(rows) // 10 * 16 + np.arange(rows) % 10,
+                         'CellId': 201, 'UEGID': ue + np.arange(rows) // 1000,
+                         'SCHD.u8HarqId': np.where(kinds == 0, rng.integers(0, 15, rows), np.nan),
+                         'SCHD.u8RbNum': np.where(kinds == 0, rng.integers(1, 100, rows), np.nan),
+                         'ACK.u8Tb0AckInfo': np.where(kinds == 1, rng.integers(0, 3, rows), np.nan),
+                         'TB.u16TbSize': np.where(kinds == 2, rng.integers(100, 5000, rows), np.nan)})
+    data.to_csv(os.path.join(directory, name), index=False, na_rep='-', float_format='%.10g')
+    return data
+
+
+class TestSidecarCache(unittest.TestCase):
+    '''Parquet旁路缓存单元测试类'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        self.file = 'RTL2_dlUeTtiInfo_20190422232542.csv'
+        write_csv(self.directory, self.file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def _expected(self, cols=None):
+        filename = os.path.join(self.directory, self.file)
+        data = pd.read_csv(filename, na_values='-')
+        apply_schema(data, schema_of(LTE_FILE_DLSCHD, data.columns))
+        return data if cols is None else data[cols]
+
+    def test_build(self):
+        '''首次读取时生成旁路文件，按紧凑类型保存'''
+        cache = SidecarCache(self.directory, filetype=LTE_FILE_DLSCHD)
+        self.assertFalse(cache.is_valid(self.file))
+        pd.testing.assert_frame_equal(self._expected(), cache.read(self.file))
+        self.assertTrue(cache.is_valid(self.file))
+        self.assertEqual('UInt8', str(cache.read(self.file, ['SCHD.u8RbNum'])['SCHD.u8RbNum'].dtype))
+        cols = ['TB.u16TbSize', 'AirTime']
+        pd.testing.assert_frame_equal(self._expected(['AirTime', 'TB.u16TbSize']), cache.read(self.file, cols))
+
+    def test_rebuild(self):
+        '''源文件变化后旁路文件失效并重建'''
+        cache = SidecarCache(self.directory, filetype=LTE_FILE_DLSCHD)
+        cache.read(self.file)
+        write_csv(self.directory, self.file, rows=ROWS // 2, seed=1)
+        self.assertFalse(cache.is_valid(self.file))
+        pd.testing.assert_frame_equal(self._expected(), cache.read(self.file))
+        self.assertEqual(ROWS // 2, len(cache.read(self.file, ['AirTime']).index))
+
+    def test_rows_and_filters(self):
+        '''只读取与行范围有交集且统计信息可能满足过滤条件的row group'''
+        with mock.patch('loganalysis.cache.CACHE_ROW_GROUP_SIZE', 256):
+            cache = SidecarCache(self.directory, filetype=LTE_FILE_DLSCHD)
+            cache.build(self.file)
+        expected = self._expected()
+        expected = expected.iloc[300:2500]
+        expected = expected[expected['UEGID'] == 2]
+        groups = []
+        read_row_group = pq.ParquetFile.read_row_group
+
+        def record(pfile, group, *args, **kwargs):
+            groups.append(group)
+            return read_row_group(pfile, group, *args, **kwargs)
+
+        with mock.patch.object(pq.ParquetFile, 'read_row_group', autospec=True, side_effect=record):
+            rlt = cache.read(self.file, rows=(300, 2500), filters={'UEGID': [2]})
+        pd.testing.assert_frame_equal(expected, rlt)
+        self.assertEqual(list(range(2000 // 256, 2500 // 256 + 1)), sorted(set(groups)))
+
+        rlt = pd.concat(list(cache.read_chunks(self.file, rows=(300, 2500), chunksize=100, filters={'UEGID': [2]})))
+        pd.testing.assert_frame_equal(expected, rlt)
+        rlt = pd.concat(list(cache.read_chunks(self.file, ['AirTime', 'ACK.u8Tb0AckInfo'], chunksize=300,
+                                               dense=['ACK.u8Tb0AckInfo'])))
+        expected = self._expected(['AirTime', 'ACK.u8Tb0AckInfo'])
+        pd.testing.assert_frame_equal(expected[expected['ACK.u8Tb0AckInfo'].notna()], rlt)
+
+
+class TestSplitCache(unittest.TestCase):
+    '''按记录组拆分的列式缓存单元测试类'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        self.file = 'RTL2_dlUeTtiInfo_20190422232542.csv'
+        write_csv(self.directory, self.file)
+        self.wide = SidecarCache(self.directory, filetype=LTE_FILE_DLSCHD)
+        self.split = SplitCache(self.directory, filetype=LTE_FILE_DLSCHD)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def test_tables(self):
+        '''公共列表包含全部行，子表只包含该记录组非空的行'''
+        self.split.build(self.file)
+        keys = pq.read_table(self.split.path(self.file))
+        self.assertEqual(['LocalTime', 'AirTime', 'CellId', 'UEGID'], keys.schema.names)
+        self.assertEqual(ROWS, keys.num_rows)
+        for kind, group, cols in [(0, 'SCHD', ['SCHD.u8HarqId', 'SCHD.u8RbNum']), (1, 'ACK', ['ACK.u8Tb0AckInfo']),
+                                  (2, 'TB', ['TB.u16TbSize'])]:
+            table = pq.read_table(self.split._table_path(self.file, group))
+            self.assertEqual(['_row'] + cols, table.schema.names)
+            np.testing.assert_array_equal(np.arange(kind, ROWS, 3), table.column('_row').to_numpy())
+
+    def test_read(self):
+        '''读取结果与不拆分的缓存一致'''
+        for cols in [None, ['AirTime', 'SCHD.u8RbNum'], ['UEGID', 'ACK.u8Tb0AckInfo', 'TB.u16TbSize'],
+                     ['TB.u16TbSize', 'CellId']]:
+            # 与LogFile一致，只按请求列中的记录组列选取稠密行
+            dense = [col for col in cols or [] if record_group(col) is not None] or None
+            for rows in [None, (300, 2500), (ROWS, ROWS)]:
+                for filters in [None, {'UEGID': [2, 3]}, {'ACK.u8Tb0AckInfo': [1]}]:
+                    with self.subTest(cols=cols, rows=rows, filters=filters):
+                        pd.testing.assert_frame_equal(self.wide.read(self.file, cols, rows, filters=filters),
+                                                      self.split.read(self.file, cols, rows, filters=filters),
+                                                      check_index_type=False)
+                        expected = self.wide.read(self.file, cols, rows, dense, filters)
+                        pd.testing.assert_frame_equal(expected, self.split.read(self.file, cols, rows, dense, filters),
+                                                      check_index_type=False)
+                        chunks = list(self.split.read_chunks(self.file, cols, rows, 700, dense, filters))
+                        pd.testing.assert_frame_equal(expected, pd.concat(chunks), check_index_type=False)
+
+    def test_requested_groups(self):
+        '''只读取请求列所在的子表'''
+        self.split.build(self.file)
+        with mock.patch('loganalysis.cache.pq.read_table', wraps=pq.read_table) as read_table:
+            self.split.read(self.file, ['AirTime', 'ACK.u8Tb0AckInfo'], dense=['ACK.u8Tb0AckInfo'])
+        paths = [args[0] for args, _ in read_table.call_args_list]
+        self.assertEqual([self.split._table_path(self.file, 'ACK')], paths)
+
+
+class TestFileIndex(unittest.TestCase):
+    '''文件元数据索引单元测试类'''
+
+    KEYCOLS = ['CellId', 'UEGID']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        self.file = 'RTL2_dlUeTtiInfo_20190422232542.csv'
+        self.data = write_csv(self.directory, self.file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def _reader(self, file, cols):
+        return pd.read_csv(os.path.join(self.directory, file), na_values='-', usecols=cols)
+
+    def test_groups(self):
+        '''按ID列分组的行数、首末行和首末时间'''
+        groups = FileIndex(self.directory).groups(self.file, self.KEYCOLS, self._reader)
+        rows = self.data.assign(_row=np.arange(ROWS)).groupby('UEGID')['_row']
+        np.testing.assert_array_equal(rows.size().values, groups['rows'].values)
+        np.testing.assert_array_equal(rows.min().values, groups['first_row'].values)
+        np.testing.assert_array_equal(rows.max().values, groups['last_row'].values)
+        np.testing.assert_array_equal(self.data['AirTime'].values[rows.max().values], groups['last_airtime'].values)
+        self.assertTrue((groups['CellId'] == 201).all())
+
+    def test_persist(self):
+        '''索引持久化后不再读取源文件，源文件变化后重建对应条目'''
+        index = FileIndex(self.directory)
+        entry = index.entry(self.file, self.KEYCOLS, self._reader)
+        index.save()
+        reader = mock.Mock(side_effect=self._reader)
+        self.assertEqual(entry, FileIndex(self.directory).entry(self.file, self.KEYCOLS, reader))
+        reader.assert_not_called()
+
+        write_csv(self.directory, self.file, rows=ROWS // 2, seed=1)
+        entry = FileIndex(self.directory).entry(self.file, self.KEYCOLS, reader)
+        self.assertTrue(reader.called)
+        self.assertEqual(ROWS // 2, entry['rows'])
+
+    def test_log_from_index(self):
+        '''有索引时构造Log不再扫描文件，元数据与扫描得到的一致'''
+        source = lte_log_dir()
+        for name in os.listdir(source):
+            if name.endswith('.csv'):
+                shutil.copy(os.path.join(source, name), self.directory)
+        os.remove(os.path.join(self.directory, self.file))
+        scanned = LteLog(self.directory, index=False)
+        LteLog(self.directory)
+        with mock.patch.object(LogFile, '_read_file', autospec=True) as read_file:
+            log = LteLog(self.directory)
+        read_file.assert_not_called()
+        for filetype, logfile in scanned._logfiles.items():
+            self.assertEqual(logfile.lines, log._logfiles[filetype].lines)
+            self.assertEqual(logfile.airtimes, log._logfiles[filetype].airtimes)
+            self.assertEqual(logfile.pctimes, log._logfiles[filetype].pctimes)
+        pd.testing.assert_frame_equal(scanned.get_cell_and_ue_ids().sort_values(self.KEYCOLS, ignore_index=True),
+                                      log.get_cell_and_ue_ids().sort_values(self.KEYCOLS, ignore_index=True),
+                                      check_dtype=False)
+
+
+class TestInvertedRows(unittest.TestCase):
+    '''ID列倒排表单元测试类'''
+
+    KEYCOLS = ['CellId', 'UEGID']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        source = lte_log_dir()
+        self.files = sorted(name for name in os.listdir(source) if name.startswith(LTE_FILE_DLSCHD))
+        for name in self.files:
+            shutil.copy(os.path.join(source, name), self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def _reader(self, file, cols):
+        return pd.read_csv(os.path.join(self.directory, file), na_values='-', usecols=cols)
+
+    def test_rows_of_ids(self):
+        '''倒排表的行号与直接过滤的结果一致，持久化后不再读取源文件'''
+        index = FileIndex(self.directory)
+        data = self._reader(self.files[0], self.KEYCOLS)
+        filters = [{'CellId': [201]}, {'UEGID': [2]}, {'CellId': [203], 'UEGID': [1, 247]}, {'UEGID': [99]}]
+        for id_filter in filters:
+            mask = np.ones(len(data.index), dtype=bool)
+            for col, vals in id_filter.items():
+                mask &= data[col].isin(vals).values
+            np.testing.assert_array_equal(np.flatnonzero(mask),
+                                          index.rows_of_ids(self.files[0], self.KEYCOLS, id_filter, self._reader))
+
+        reader = mock.Mock(side_effect=self._reader)
+        rows = FileIndex(self.directory).rows_of_ids(self.files[0], self.KEYCOLS, filters[2], reader)
+        reader.assert_not_called()
+        np.testing.assert_array_equal(index.rows_of_ids(self.files[0], self.KEYCOLS, filters[2], self._reader), rows)
+
+    def test_logfile(self):
+        '''指定UE时只输出倒排表中的行，结果与读取后过滤一致'''
+        logfile = LteFile(LTE_FILE_DLSCHD, self.directory, self.files, id_filter={'CellId': [203], 'UEGID': [3]},
+                          index=FileIndex(self.directory), chunksize=500)
+        cols = ['AirTime', 'CellId', 'UEGID', 'SCHD.u8RbNum']
+        rlt = pd.concat(list(logfile.gen_of_cols(cols)))
+        self.assertGreater(len(rlt.index), 0)
+        expected = LteFile(LTE_FILE_DLSCHD, self.directory, self.files, index=None).get_data_of_cols(cols)
+        expected = expected[(expected['CellId'] == 203) & (expected['UEGID'] == 3)]
+        pd.testing.assert_frame_equal(expected, rlt)
+
+
+class TestIdSummaries(unittest.TestCase):
+    '''ID列取值摘要跳过文件和数据块单元测试类'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        self.files = ['RTL2_dlUeTtiInfo_20190422232542.csv', 'RTL2_dlUeTtiInfo_20190422232543.csv']
+        write_csv(self.directory, self.files[0], rows=10000)
+        write_csv(self.directory, self.files[1], ue=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def _reader(self, file, cols):
+        return pd.read_csv(os.path.join(self.directory, file), na_values='-', usecols=cols)
+
+    def test_candidate_spans(self):
+        '''每INDEX_ID_CHUNK_ROWS行的最小/最大值和布隆过滤器选出可能包含取值的行范围'''
+        index = FileIndex(self.directory)
+        chunk = INDEX_ID_CHUNK_ROWS
+        for vals, spans in [([6], [(chunk, 2 * chunk)]), ([0, 9], [(0, chunk), (2 * chunk, 10000)]),
+                            ([4], [(0, 2 * chunk)]), ([10, 100], [])]:
+            self.assertEqual(spans, index.candidate_spans(self.files[0], ['CellId', 'UEGID'], {'UEGID': vals},
+                                                          self._reader))
+        self.assertIsNone(index.candidate_spans(self.files[0], ['CellId', 'UEGID'], {'SCHD.u8RbNum': [1]},
+                                                self._reader))
+
+    def test_skip_files(self):
+        '''不包含过滤取值的文件不读取'''
+        logfile = LteFile(LTE_FILE_DLSCHD, self.directory, self.files, index=FileIndex(self.directory))
+        cols = ['AirTime', 'UEGID', 'TB.u16TbSize']
+        expected = logfile.get_data_of_cols(cols)
+        with mock.patch.object(LteFile, '_read_chunks', autospec=True, side_effect=LogFile._read_chunks) as read:
+            rlt = logfile.get_data_of_cols(cols, val_filter={'UEGID': [101]})
+        self.assertEqual([self.files[1]], [args[1] for args, _ in read.call_args_list])
+        pd.testing.assert_frame_equal(expected[expected['UEGID'] == 101], rlt)
@@ -0,0 +1,69 @@
+# coding=utf-8
+import os
+import unittest
+import numpy as np
+import pandas as pd
+from loganalysis.const import LTE_FILE_DLSCHD
+from loganalysis.hist import hist2d
+from loganalysis.log import LogFile
+from loganalysis.test.sample import lte_log_dir
+
+
+class TestHist2d(unittest.TestCase):
+    '''整数编码直方图单元测试类'''
+
+    def test_crosstab(self):
+        '''与pd.crosstab结果一致，空值不计数，取值不连续时只输出出现过的取值'''
+        rng = np.random.default_rng(0)
+        keys = pd.Series(rng.choice([3, 7, 8, np.nan], 1000), name='AirTime')
+        values = pd.Series(rng.choice([0, 5, 100, 255, np.nan], 1000), name='Val')
+        rlt = hist2d(keys, values)
+        expected = pd.crosstab(keys, values)
+        self.assertEqual([3, 7, 8], list(rlt.index))
+        self.assertEqual([0, 5, 100, 255], list(rlt.columns))
+        pd.testing.assert_frame_equal(expected, rlt, check_dtype=False, check_index_type=False,
+                                      check_column_type=False)
+
+    def test_nullable(self):
+        '''可空整数类型的空值不计数'''
+        values = pd.Series(pd.array([1, None, 3, 1], dtype='UInt8'))
+        rlt = hist2d(np.zeros(4), values)
+        self.assertEqual([[2, 1]], rlt.values.tolist())
+        self.assertEqual([1, 3], list(rlt.columns))
+
+    def test_empty(self):
+        rlt = hist2d(pd.Series([np.nan, 1.0]), pd.Series([1.0, np.nan]))
+        self.assertEqual((0, 0), rlt.shape)
+
+
+class TestHistOfCol(unittest.TestCase):
+    '''Log文件直方图单元测试类'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = lte_log_dir()
+        cls.files = sorted(name for name in os.listdir(cls.directory) if name.startswith(LTE_FILE_DLSCHD))
+        cls.data = pd.concat([pd.read_csv(os.path.join(cls.directory, name), na_values='-') for name in cls.files],
+                             ignore_index=True)
+
+    def test_no_bin(self):
+        '''airtime_bin_size为0时不区分时间粒度，与value_counts一致'''
+        col = 'SCHD_FAIL_RSN.u32UeSchdFailRsn'
+        counts = self.data[col].value_counts().sort_index()
+        for chunksize in [None, 700]:
+            logfile = LogFile(LTE_FILE_DLSCHD, self.directory, self.files, chunksize=chunksize)
+            with self.subTest(chunksize=chunksize):
+                rlt = logfile.hist_of_col(col, 0, ratio=False)
+                self.assertEqual([0], list(rlt.index))
+                self.assertEqual([int(value) for value in counts.index], list(rlt.columns))
+                np.testing.assert_array_equal(counts.values, rlt.loc[0].values)
+                rlt = logfile.hist_of_col(col, 0)
+                np.testing.assert_allclose((counts / counts.sum()).values, rlt.loc[0].values)
+
+    def test_bins(self):
+        col = 'SCHD.u8TranScheme'
+        expected = pd.crosstab(self.data['AirTime'] // 1600, self.data[col])
+        rlt = LogFile(LTE_FILE_DLSCHD, self.directory, self.files, chunksize=500).hist_of_col(col, 1, ratio=False)
+        np.testing.assert_array_equal(expected.index.values, rlt.index.values)
+        np.testing.assert_array_equal(expected.columns.values, rlt.columns.values)
+        np.testing.assert_array_equal(expected.values, rlt.values)
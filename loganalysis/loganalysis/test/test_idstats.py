@@ -0,0 +1,36 @@
+# coding=utf-8
+import unittest
+import numpy as np
+from loganalysis.const import INDEX_ID_MAX_VALUES
+from loganalysis.idstats import id_stats, may_contain
+
+
+class TestIdStats(unittest.TestCase):
+    '''ID列取值摘要单元测试类'''
+
+    def test_no_false_negative(self):
+        '''文件和数据块中出现的取值一定判断为可能包含'''
+        rng = np.random.default_rng(0)
+        values = rng.integers(0, 5000, 20000).astype(float)
+        values[rng.random(len(values)) < 0.3] = np.nan
+        stats = id_stats(values, chunk_rows=1000)
+        self.assertIsNone(stats['values'])
+        self.assertGreater(len(np.unique(values[~np.isnan(values)])), INDEX_ID_MAX_VALUES)
+        for val in rng.choice(values[~np.isnan(values)], 200):
+            hit = may_contain(stats, [val])
+            chunks = np.unique(np.flatnonzero(values == val) // 1000)
+            self.assertTrue(hit[chunks].all())
+        self.assertFalse(may_contain(stats, [5000, -1, np.nan]).any())
+
+    def test_values(self):
+        '''取值较少时按去重取值判断，没有取值的数据块不可能包含'''
+        values = np.full(3000, np.nan)
+        values[:1000] = 7
+        values[2000:] = np.arange(1000) % 3 * 10
+        stats = id_stats(values, chunk_rows=1000)
+        self.assertEqual([0, 7, 10, 20], stats['values'])
+        self.assertEqual([7, None, 0], stats['chunk_min'])
+        self.assertEqual([True, False, False], may_contain(stats, [7, 5]).tolist())
+        self.assertEqual([False, False, True], may_contain(stats, [20]).tolist())
+        self.assertFalse(may_contain(stats, [15]).any())
+        self.assertFalse(may_contain(id_stats(np.full(10, np.nan)), [0]).any())
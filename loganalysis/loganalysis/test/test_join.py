@@ -0,0 +1,68 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from loganalysis.join import StreamJoin
+from loganalysis.log import LogFile, SharedScan
+from loganalysis.test.sample import addtime, WRAP_FRAME
+
+
+class TestStreamJoin(unittest.TestCase):
+    '''StreamJoin单元测试类'''
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self._directory, True)
+
+    @staticmethod
+    def _airtimes(frame, num):
+        airtimes = [frame * 16]
+        for _ in range(num - 1):
+            airtimes.append(addtime(airtimes[-1], 1))
+        return np.array(airtimes)
+
+    def _logfile(self, name, airtime, uegid, chunksize):
+        '''把AirTime和UEGID两列写为一个CSV文件，返回对应的LogFile'''
+        data = pd.DataFrame({'LocalTime': np.arange(len(airtime)), 'AirTime': airtime, 'UEGID': uegid})
+        data.to_csv(os.path.join(self._directory, name + '.csv'), index=False)
+        return LogFile(name, self._directory, [name + '.csv'], chunksize=chunksize)
+
+    def _unmatched(self, left, right, leftsize=70, rightsize=100):
+        '''在一次共享扫描中查找左侧Log在右侧Log中没有对应记录的行号'''
+        cols = ['AirTime', 'UEGID']
+        join = StreamJoin(cols)
+        rlt = []
+        scan = SharedScan()
+        join.attach(scan, self._logfile('right', right[0], right[1], rightsize))
+        join.add_left(scan, self._logfile('left', left[0], left[1], leftsize), cols,
+                      lambda data: rlt.extend(join.unmatched(cols, data)))
+        scan.run()
+        return rlt
+
+    def test_unmatched(self):
+        airtime = self._airtimes(100, 600)
+        self.assertEqual(list(range(600)), self._unmatched((airtime, 1), (airtime, 2)))
+        self.assertEqual([], self._unmatched((airtime, 1), (airtime, 1)))
+
+    def test_unmatched_across_wrap(self):
+        airtime = self._airtimes(0x10000000 - 30, 600)
+        self.assertEqual(list(range(600)), self._unmatched((airtime, 1), (airtime, 2)))
+        self.assertEqual([], self._unmatched((airtime, 1), (airtime, 1)))
+
+    def test_unbalanced_chunks(self):
+        '''两侧数据块大小相差很大时，等待右侧数据覆盖左侧数据块后再匹配'''
+        airtime = self._airtimes(WRAP_FRAME, 600)
+        uegid = np.where(np.arange(600) % 7 == 0, 2, 1)
+        expected = list(np.flatnonzero(uegid == 2))
+        self.assertEqual(expected, self._unmatched((airtime, uegid), (airtime, 1), 500, 30))
+        self.assertEqual(expected, self._unmatched((airtime, uegid), (airtime, 1), 30, 500))
+
+    def test_out_of_range(self):
+        '''右侧Log时间范围以外的左侧记录不计入结果'''
+        airtime = self._airtimes(WRAP_FRAME, 300)
+        self.assertEqual(list(range(100, 200)), self._unmatched((airtime, 1), (airtime[100:200], 2)))
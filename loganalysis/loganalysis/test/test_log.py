@@ -1,7 +1,20 @@
 # coding=utf-8
+import os
+import shutil
+import tempfile
 import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+from loganalysis.cache import FileIndex
+from loganalysis.const import AGG_FUNC, INDEX_OFFSET_ROWS, LTE_FILE_DLSCHD
 from loganalysis.log import Log
-from loganalysis.log import LogFile
+from loganalysis.log import LogFile, _agg_by_airtime, _merge_m2
+from loganalysis.lte.ltelog import LteLog
+from loganalysis.test.sample import addtime, lte_log_dir
 
 
 class TestLog(unittest.TestCase):
@@ -21,3 +34,192 @@ class TestLog(unittest.TestCase):
     def tearDown(self):
         pass
 
+
+
+class TestCsvOffsets(unittest.TestCase):
+    '''CSV行首字节位置索引单元测试类'''
+
+    ROWS = 10000
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def _logfile(self, name, quoted=False, chunksize=None):
+        airtimes = [100 * 16]
+        for _ in range(self.ROWS - 1):
+            airtimes.append(addtime(airtimes[-1], 1))
+        data = pd.DataFrame({'LocalTime': np.arange(self.ROWS), 'AirTime': airtimes,
+                             'UEGID': np.where(np.arange(self.ROWS) % 3, np.arange(self.ROWS) % 7, np.nan),
+                             'Text': ['a,b' if quoted and 0 == idx % 500 else 'x' for idx in range(self.ROWS)]})
+        data.to_csv(os.path.join(self.directory, name), index=False, na_rep='-')
+        return LogFile(name, self.directory, [name], index=FileIndex(self.directory), chunksize=chunksize)
+
+    def _check(self, logfile):
+        expected = pd.read_csv(os.path.join(self.directory, logfile.files[0]), na_values='-')
+        for start, end in [(0, 10), (1, 4097), (4095, 4100), (INDEX_OFFSET_ROWS, 8500), (9990, self.ROWS),
+                           (self.ROWS, self.ROWS)]:
+            chunks = list(logfile._read_chunks(logfile.files[0], ['AirTime', 'UEGID', 'Text'], (start, end)))
+            if not chunks:
+                self.assertEqual(start, end)
+                continue
+            rlt = pd.concat(chunks)
+            self.assertEqual(list(range(start, end)), list(rlt.index))
+            np.testing.assert_array_equal(expected['AirTime'].values[start:end], rlt['AirTime'].values)
+            np.testing.assert_array_equal(expected['UEGID'].values[start:end], rlt['UEGID'].astype(float).values)
+            np.testing.assert_array_equal(expected['Text'].values[start:end], rlt['Text'].values)
+
+    def test_seek(self):
+        '''有行首位置时seek到最近位置，只跳过不足一个间隔的行'''
+        logfile = self._logfile('seek.csv')
+        offsets = logfile.index.row_offsets('seek.csv', [], logfile._read_file)
+        self.assertEqual(-(-self.ROWS // INDEX_OFFSET_ROWS), len(offsets['positions']))
+        with open(os.path.join(self.directory, 'seek.csv'), 'rb') as fp:
+            for mark, position in enumerate(offsets['positions']):
+                fp.seek(position)
+                self.assertEqual(str(mark * INDEX_OFFSET_ROWS), fp.readline().decode().split(',')[0])
+
+        with mock.patch('loganalysis.log.pd.read_csv', wraps=pd.read_csv) as read_csv:
+            self._check(logfile)
+        skiprows = [kwargs.get('skiprows') for _, kwargs in read_csv.call_args_list]
+        self.assertTrue(any(isinstance(skip, int) for skip in skiprows))
+        self.assertTrue(all(skip < INDEX_OFFSET_ROWS for skip in skiprows if isinstance(skip, int)))
+        self.assertTrue(all(len(skip) == 0 for skip in skiprows if isinstance(skip, range)))
+        logfile = self._logfile('chunks.csv', chunksize=700)
+        self._check(logfile)
+
+    def test_quoted(self):
+        '''文件中有引号时不记录行首位置，从文件头开始跳过'''
+        logfile = self._logfile('quoted.csv', quoted=True)
+        self.assertIsNone(logfile.index.row_offsets('quoted.csv', [], logfile._read_file))
+        self._check(logfile)
+
+
+class TestWorkers(unittest.TestCase):
+    '''多进程聚合计算单元测试类'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = lte_log_dir()
+        cls.files = sorted(name for name in os.listdir(cls.directory) if name.startswith(LTE_FILE_DLSCHD))
+
+    def _sum(self, logfile):
+        return logfile.sum_of_cols(['TB.u16TbSize', 'SCHD.u8RbNum'], 1)
+
+    def test_pool_reused(self):
+        '''workers为进程数时只创建一个进程池，多次计算共用，close时关闭'''
+        expected = self._sum(LogFile(LTE_FILE_DLSCHD, self.directory, self.files))
+        with mock.patch('loganalysis.log.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            with LogFile(LTE_FILE_DLSCHD, self.directory, self.files, workers=2) as logfile:
+                executor = logfile.workers
+                for _ in range(3):
+                    pd.testing.assert_frame_equal(expected, self._sum(logfile))
+            self.assertEqual(1, pool.call_count)
+        self.assertRaises(RuntimeError, executor.submit, len, [])
+
+    def test_log_shares_pool(self):
+        '''Log的所有Log文件共用一个进程池，调用方传入的Executor不由Log关闭'''
+        with ThreadPoolExecutor(2) as executor:
+            log = LteLog(self.directory, workers=executor)
+            log.close()
+            self.assertIs(executor, log.get_cell(201).dl.log.workers)
+            self.assertEqual(2, executor.submit(len, [1, 2]).result())
+
+        with LteLog(self.directory, workers=2) as log:
+            executor = log.workers
+            self.assertIsInstance(executor, ProcessPoolExecutor)
+            logfile = log.get_cell(201).dl.log
+            self.assertIs(executor, logfile.workers)
+            expected = self._sum(LogFile(LTE_FILE_DLSCHD, self.directory, self.files, id_filter={'CellId': [201]}))
+            pd.testing.assert_frame_equal(expected, self._sum(logfile))
+        self.assertRaises(RuntimeError, executor.submit, len, [])
+
+
+class TestAirTime(unittest.TestCase):
+    '''空口时间运算单元测试类'''
+
+    def test_addtime(self):
+        times = np.array([0x100, 0x109, 0x1005, 0xFFFFFF9, 0xFFFFFFF9, 0xFFFFFFF0])
+        deltas = np.array([0x1, 0x1, 0x15, 0x7, 0x1, 0x20])
+        # 子帧号进位到帧号；帧号在0x10000000处翻转
+        expected = np.array([0x101, 0x110, 0x1020, 0x10000006, 0x0, 0x10])
+        np.testing.assert_array_equal(expected, LogFile.addtime(times, deltas))
+        np.testing.assert_array_equal([addtime(int(time), int(delta)) for time, delta in zip(times, deltas)],
+                                      LogFile.addtime(times, deltas))
+
+    def test_difftime(self):
+        times = np.array([0x101, 0x110, 0x1020, 0x0, 0x19, 0x5])
+        deltas = np.array([0x1, 0x1, 0x15, 0x1, 0x20, 0x6])
+        expected = np.array([0x100, 0x109, 0x1005, 0xFFFFFFF9, 0xFFFFFFF9, 0xFFFFFFF9])
+        np.testing.assert_array_equal(expected, LogFile.difftime(times, deltas))
+        np.testing.assert_array_equal(times, LogFile.addtime(LogFile.difftime(times, deltas), deltas))
+
+    def test_dectime(self):
+        times = np.array([0x0, 0x9, 0x10, 0x123, 0xFFFFFFF9])
+        expected = np.array([0, 9, 10, 0x12 * 10 + 3, 0xFFFFFFF * 10 + 9])
+        np.testing.assert_array_equal(expected, LogFile.dectime(times))
+        np.testing.assert_array_equal(times, LogFile.hextime(LogFile.dectime(times)))
+
+    def test_scalar(self):
+        '''标量输入时输出标量'''
+        for func, args, expected in [(LogFile.addtime, (0xFFFFFFF9, 0x1), 0x0),
+                                     (LogFile.difftime, (0x0, 0x1), 0xFFFFFFF9),
+                                     (LogFile.dectime, (0x123,), 183), (LogFile.hextime, (183,), 0x123)]:
+            rlt = func(*args)
+            self.assertEqual(0, np.ndim(rlt))
+            self.assertEqual(expected, rlt)
+
+
+class TestAggOfCols(unittest.TestCase):
+    '''一次遍历多种聚合单元测试类'''
+
+    COLS = ['SCHD.u8RbNum', 'TB.u16TbSize']
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = lte_log_dir()
+        cls.files = sorted(name for name in os.listdir(cls.directory) if name.startswith(LTE_FILE_DLSCHD))
+        cls.data = pd.concat([pd.read_csv(os.path.join(cls.directory, name), na_values='-') for name in cls.files],
+                             ignore_index=True)
+
+    def _expected(self, airtime_bin_size, data):
+        '''按时间粒度groupby计算的对照结果'''
+        group_data = data[self.COLS].groupby(data['AirTime'] // (airtime_bin_size*1600))
+        rlt = {(col, func): getattr(group_data[col], func)() for col in self.COLS for func in AGG_FUNC}
+        return pd.DataFrame(rlt)
+
+    def _check(self, expected, rlt):
+        self.assertGreater(len(expected.index), 1)
+        pd.testing.assert_frame_equal(expected[rlt.columns], rlt, check_dtype=False, check_index_type=False,
+                                      check_names=False)
+
+    def test_brute_force(self):
+        '''跨越文件和数据块的时间粒度与groupby结果一致，std按各部分的平方偏差和合并'''
+        spec = {col: list(AGG_FUNC) for col in self.COLS}
+        for airtime_bin_size in [1, 2]:
+            expected = self._expected(airtime_bin_size, self.data)
+            for kwargs in [{}, {'chunksize': 97}, {'chunksize': 700}, {'workers': 2}]:
+                with LogFile(LTE_FILE_DLSCHD, self.directory, self.files, **kwargs) as logfile, \
+                        self.subTest(airtime_bin_size=airtime_bin_size, **kwargs):
+                    self._check(expected, logfile.agg_of_cols(spec, airtime_bin_size))
+
+    def test_filters(self):
+        expected = self._expected(1, self.data[self.data['CellId'] == 203])
+        logfile = LogFile(LTE_FILE_DLSCHD, self.directory, self.files, chunksize=500)
+        rlt = logfile.agg_of_cols({'SCHD.u8RbNum': 'std', 'TB.u16TbSize': ['sum', 'max']}, 1, {'CellId': [203]})
+        self.assertEqual([('SCHD.u8RbNum', 'std'), ('TB.u16TbSize', 'sum'), ('TB.u16TbSize', 'max')],
+                         list(rlt.columns))
+        self._check(expected, rlt)
+
+    def test_merge_m2(self):
+        '''两部分平方偏差和的合并结果与整体计算一致'''
+        values = pd.Series(np.random.default_rng(0).normal(100, 20, 1000))
+        keys = np.arange(1000) % 3
+        parts = [_agg_by_airtime(pd.DataFrame({'AirTime': keys[part] * 1600, 'V': values.values[part]}), ['V'], 1,
+                                 ['count', 'm2', 'sum']) for part in [slice(0, 377), slice(377, 1000)]]
+        m2 = _merge_m2(parts[0]['m2'], parts[0]['count'], parts[0]['sum'],
+                       parts[1]['m2'], parts[1]['count'], parts[1]['sum'])
+        expected = values.groupby(keys).var(ddof=0) * values.groupby(keys).count()
+        np.testing.assert_allclose(expected.values, m2['V'].values, rtol=1e-9)
@@ -0,0 +1,63 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from loganalysis.cache import FileIndex
+from loganalysis.const import ABSTTI_COL, AGG_FUNC, LTE_FILE_DLSCHD
+from loganalysis.lte.ltelog import LteFile
+from loganalysis.test.sample import lte_log_dir, WRAP_FRAME
+
+# 读取方式：按文件读取、分块、列式缓存、多进程、拆分子表、预读及其组合
+MODES = {'chunksize': {'chunksize': 700},
+         'cache': {'cache': True},
+         'workers': {'workers': 2},
+         'split': {'split': True},
+         'prefetch': {'prefetch': 2},
+         'cache+chunk': {'cache': True, 'chunksize': 700},
+         'split+chunk': {'split': True, 'chunksize': 700}}
+
+ID_FILTERS = [None, {'CellId': [201]}, {'UEGID': [2]}]
+
+
+class TestReadModes(unittest.TestCase):
+    '''各读取方式结果一致性单元测试类'''
+
+    @classmethod
+    def setUpClass(cls):
+        # 缓存和拆分子表写入Log目录，复制一份避免影响其他测试
+        cls.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+        source = lte_log_dir(frame=WRAP_FRAME)
+        cls.files = sorted(name for name in os.listdir(source) if name.startswith(LTE_FILE_DLSCHD))
+        for name in cls.files:
+            shutil.copy(os.path.join(source, name), cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, True)
+
+    def _results(self, id_filter, **kwargs):
+        '''按指定读取方式计算各接口的结果'''
+        with LteFile(LTE_FILE_DLSCHD, self.directory, self.files, id_filter=id_filter,
+                     index=FileIndex(self.directory), **kwargs) as logfile:
+            cols = ['AirTime', 'UEGID', 'SCHD.u8RbNum', 'TB.u16TbSize', 'ACK.u8Tb0AckInfo']
+            return {'sum': logfile.sum_of_cols(['TB.u16TbSize', 'SCHD.u8RbNum'], 1),
+                    'mean': logfile.mean_of_cols(['SCHD.u8RbNum'], 1, 'cnt'),
+                    'cnt': logfile.cnt_of_cols(['SCHD.u8HarqId', 'ACK.u8Tb0AckInfo'], 1),
+                    'hist': logfile.hist_of_col('SCHD.u8TranScheme', 1),
+                    'agg': logfile.agg_of_cols({'TB.u16TbSize': list(AGG_FUNC), 'SCHD.u8RbNum': ['mean', 'std']}, 1),
+                    'data': logfile.get_data_of_cols(cols),
+                    'filtered': logfile.get_data_of_cols(cols, val_filter={'SCHD.u8TranScheme': [1]}),
+                    'gen': pd.concat(list(logfile.gen_of_cols(cols + [ABSTTI_COL]))),
+                    'dense': pd.concat(list(logfile.gen_of_cols(['AirTime', 'ACK.u8Tb0AckInfo'], dense=True)))}
+
+    def test_modes(self):
+        for id_filter in ID_FILTERS:
+            expected = self._results(id_filter)
+            self.assertGreater(len(expected['data'].index), 0)
+            for mode, kwargs in MODES.items():
+                rlt = self._results(id_filter, **kwargs)
+                for name, value in expected.items():
+                    with self.subTest(id_filter=id_filter, mode=mode, result=name):
+                        pd.testing.assert_frame_equal(value, rlt[name])
@@ -0,0 +1,58 @@
+# coding=utf-8
+import threading
+import unittest
+import numpy as np
+import pandas as pd
+from loganalysis.prefetch import Prefetcher
+
+
+class TestPrefetcher(unittest.TestCase):
+    '''后台预读单元测试类'''
+
+    def _gen(self, num, state, fail_at=None, size=10):
+        try:
+            for idx in range(num):
+                if idx == fail_at:
+                    raise ValueError(idx)
+                state['produced'] = idx + 1
+                yield pd.DataFrame({'idx': np.full(size, idx)})
+        finally:
+            state['closed'] = True
+
+    def _threads(self):
+        return [thread for thread in threading.enumerate() if thread.name == 'loganalysis-prefetch']
+
+    def test_order_and_depth(self):
+        '''按原顺序输出，后台最多提前depth个数据块'''
+        for depth, max_bytes in [(1, None), (3, None), (8, 100)]:
+            state = {'produced': 0}
+            rlt = []
+            for data in Prefetcher(depth, max_bytes).iterate(self._gen(20, state)):
+                # 缓冲区之外，调用方和后台线程各持有一个数据块
+                ahead = depth if max_bytes is None else 1
+                self.assertLessEqual(state['produced'], len(rlt) + 1 + ahead + 1)
+                rlt.append(int(data['idx'].iat[0]))
+            self.assertEqual(list(range(20)), rlt)
+            self.assertTrue(state['closed'])
+
+    def test_error(self):
+        '''生成器中的异常在调用方取到对应位置时抛出'''
+        state = {'produced': 0}
+        rlt = []
+        with self.assertRaises(ValueError):
+            for data in Prefetcher(4).iterate(self._gen(10, state, fail_at=5)):
+                rlt.append(int(data['idx'].iat[0]))
+        self.assertEqual(list(range(5)), rlt)
+        self.assertEqual([], self._threads())
+
+    def test_early_stop(self):
+        '''调用方提前结束时后台线程停止并关闭生成器'''
+        state = {'produced': 0}
+        chunks = Prefetcher(2).iterate(self._gen(1000, state))
+        for idx, data in enumerate(chunks):
+            if idx == 3:
+                break
+        chunks.close()
+        self.assertTrue(state['closed'])
+        self.assertLess(state['produced'], 10)
+        self.assertEqual([], self._threads())
@@ -0,0 +1,78 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from loganalysis.const import LTE_FILE_DLSCHD, LTE_FILE_PUCCH, LTE_FILE_TYPES
+from loganalysis.log import LogFile
+from loganalysis.schema import SCHEMAS, apply_schema, field_dtype, register_schema, schema_of
+
+
+class TestSchema(unittest.TestCase):
+    '''EI字段类型单元测试类'''
+
+    def test_field_dtype(self):
+        for col, dtype in [('SCHD.u8RbNum', 'UInt8'), ('RTL2_EI_CELL_NI.as16Ni0', 'Int16'),
+                           ('CRCI.b8IsHarqFail', 'UInt8'), ('ACK.u32DemTime', 'UInt32'), ('X.s64Val', 'Int64'),
+                           ('PHR.u16PathLoss', 'UInt16'), ('X.f32Val', None), ('X.u8', None), ('X.u8lower', None),
+                           ('AirTime', None), ('UEGID', None)]:
+            with self.subTest(col=col):
+                self.assertEqual(dtype, field_dtype(col))
+
+    def test_schema_of(self):
+        '''登记的类型优先于前缀规则，其余列不指定类型'''
+        filetype = [filetype for filetype in LTE_FILE_TYPES if filetype.endswith(LTE_FILE_PUCCH)][0]
+        self.assertEqual({'DSP1_PUCCH_UERUN_INFO.SystemSfn': 'UInt32', 'ACK.u8HarqId': 'UInt8'},
+                         schema_of(filetype, ['AirTime', 'DSP1_PUCCH_UERUN_INFO.SystemSfn', 'ACK.u8HarqId']))
+        register_schema('TestType', {'SCHD.u8RbNum': 'UInt16', 'Foo': 'Int32'})
+        try:
+            self.assertEqual({'SCHD.u8RbNum': 'UInt16', 'Foo': 'Int32', 'ACK.u8HarqId': 'UInt8'},
+                             schema_of('TestType', ['SCHD.u8RbNum', 'Foo', 'Bar', 'ACK.u8HarqId']))
+        finally:
+            SCHEMAS.pop('TestType')
+        self.assertEqual({'SCHD.u8RbNum': 'UInt8'}, schema_of('UnknownType', ['SCHD.u8RbNum', 'Foo']))
+
+    def test_apply_schema(self):
+        '''取值都在范围内的整数列转换为紧凑类型，否则保留解析得到的较宽类型'''
+        data = pd.DataFrame({'A.u8Ok': [1.0, np.nan, 255.0], 'A.u8Big': [1, 300, 2], 'A.u8Neg': [1, -1, 2],
+                             'A.u8Frac': [1.0, 1.5, np.nan], 'A.u8Text': ['1', 'x', '2'], 'A.s8Neg': [-128, 0, 127],
+                             'A.u16Empty': [np.nan] * 3, 'Other': [1, 2, 3]})
+        apply_schema(data, schema_of(LTE_FILE_DLSCHD, data.columns))
+        expected = {'A.u8Ok': 'UInt8', 'A.u8Big': 'int64', 'A.u8Neg': 'int64', 'A.u8Frac': 'float64',
+                    'A.s8Neg': 'Int8', 'A.u16Empty': 'UInt16', 'Other': 'int64'}
+        self.assertEqual(expected, {col: str(data[col].dtype) for col in expected})
+        self.assertFalse(pd.api.types.is_numeric_dtype(data['A.u8Text']))
+        self.assertEqual([1, 300, 2], list(data['A.u8Big']))
+        self.assertTrue(data['A.u8Ok'].isna().iat[1])
+
+
+class TestLogFileSchema(unittest.TestCase):
+    '''Log文件按紧凑类型读取单元测试类'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='loganalysis_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def test_out_of_range(self):
+        '''某个数据块中的取值超出字段类型范围时该块保留较宽类型，不截断取值'''
+        num = 1000
+        values = np.arange(num) % 200
+        values[700] = 300
+        data = pd.DataFrame({'LocalTime': np.arange(num), 'AirTime': np.arange(num) + 1600, 'SCHD.u8RbNum': values,
+                             'SCHD.u8TranScheme': np.where(np.arange(num) % 3, 1, np.nan)})
+        data.to_csv(os.path.join(self.directory, 'schd.csv'), index=False, na_rep='-')
+        for kwargs in [{}, {'chunksize': 300}, {'cache': True}]:
+            logfile = LogFile(LTE_FILE_DLSCHD, self.directory, ['schd.csv'], **kwargs)
+            with self.subTest(**kwargs):
+                chunks = list(logfile.gen_of_cols(['SCHD.u8RbNum', 'SCHD.u8TranScheme']))
+                rlt = pd.concat(chunks)
+                np.testing.assert_array_equal(values, rlt['SCHD.u8RbNum'].astype(np.int64).values)
+                self.assertEqual(int(np.nansum(data['SCHD.u8TranScheme'])), int(rlt['SCHD.u8TranScheme'].sum()))
+                for chunk in chunks:
+                    self.assertEqual('UInt8', str(chunk['SCHD.u8TranScheme'].dtype))
+                    if chunk['SCHD.u8RbNum'].max() < 256:
+                        self.assertEqual('UInt8', str(chunk['SCHD.u8RbNum'].dtype))
@@ -0,0 +1,92 @@
+# coding=utf-8
+import unittest
+import numpy as np
+import pandas as pd
+from loganalysis.const import TTI_PERIOD
+from loganalysis.lte.ltelog import LteLog
+from loganalysis.test.sample import addtime, lte_log_dir, WRAP_FRAME
+from loganalysis.timeline import Timeline, timeline_stats, unwrap
+
+
+def hextime(tti):
+    '''TTI数转换为16进制空口时间，按翻转周期取模'''
+    tti = np.asarray(tti) % TTI_PERIOD
+    return tti // 10 * 16 + tti % 10
+
+
+class TestTimeline(unittest.TestCase):
+    '''绝对TTI时间轴单元测试类'''
+
+    STRIDE = 64
+
+    def setUp(self):
+        # 3个文件，每个文件1000行，每TTI约两行，相邻行少量乱序，第二个文件中间跨过翻转点
+        rng = np.random.default_rng(0)
+        tti = TTI_PERIOD - 750 + np.arange(3000) // 2
+        swap = np.flatnonzero(rng.random(len(tti) - 1) < 0.05)
+        tti[swap], tti[swap + 1] = tti[swap + 1], tti[swap]
+        self.tti = np.split(tti, 3)
+        self.timeline = Timeline([timeline_stats(hextime(tti), self.STRIDE) for tti in self.tti], self.STRIDE)
+
+    def test_unwrap(self):
+        tti, rows, deltas = unwrap(hextime(self.tti[1]))
+        np.testing.assert_array_equal(self.tti[1] - self.tti[1][0] // TTI_PERIOD * TTI_PERIOD, tti)
+        self.assertEqual(1, len(rows))
+        self.assertEqual([1], deltas.tolist())
+
+    def test_abstti(self):
+        '''每个文件每行的绝对TTI与生成时一致'''
+        for fileidx, tti in enumerate(self.tti):
+            np.testing.assert_array_equal(tti, self.timeline.abstti(fileidx, np.arange(len(tti)), hextime(tti)))
+        self.assertEqual(self.tti[0][0], self.timeline.start)
+
+    def test_to_abstti(self):
+        '''空口时间取最接近Log起始时间的周期，end早于start时认为跨过了翻转点'''
+        self.assertEqual(TTI_PERIOD + 5, self.timeline.to_abstti(hextime(5)))
+        self.assertEqual(TTI_PERIOD - 5, self.timeline.to_abstti(hextime(TTI_PERIOD - 5)))
+        np.testing.assert_array_equal([TTI_PERIOD - 1000, TTI_PERIOD + 100],
+                                      self.timeline.to_abstti(hextime([TTI_PERIOD - 1000, 100])))
+        self.assertEqual((TTI_PERIOD - 10, TTI_PERIOD + 10),
+                         self.timeline.interval(hextime(TTI_PERIOD - 10), hextime(10)))
+        self.assertEqual(2 * TTI_PERIOD + 5, self.timeline.to_abstti(hextime(5), after=TTI_PERIOD + 6))
+
+    def test_locate(self):
+        '''定位的行范围覆盖所有满足条件的行，多出的行不超过一个标记间隔和乱序范围'''
+        for start, end in [(TTI_PERIOD - 750, TTI_PERIOD - 650), (TTI_PERIOD - 20, TTI_PERIOD + 20),
+                           (TTI_PERIOD - 400, TTI_PERIOD + 150), (TTI_PERIOD + 199, TTI_PERIOD + 199),
+                           (TTI_PERIOD + 500, TTI_PERIOD + 600), (TTI_PERIOD + 800, TTI_PERIOD + 900)]:
+            located = dict(self.timeline.locate(start, end))
+            for fileidx, tti in enumerate(self.tti):
+                rows = np.flatnonzero((tti >= start) & (tti <= end))
+                if 0 == len(rows):
+                    self.assertNotIn(fileidx, located)
+                    continue
+                lo, hi = located[fileidx]
+                self.assertLessEqual(lo, rows[0])
+                self.assertGreater(hi, rows[-1])
+                self.assertLessEqual(hi - lo, len(rows) + 2 * self.STRIDE + 2)
+
+
+class TestLogTimeline(unittest.TestCase):
+    '''LogFile按空口时间范围读取单元测试类'''
+
+    def _between(self, frame, start, end):
+        log = LteLog(lte_log_dir(frame=frame), chunksize=500)
+        logfile = log._logfiles['RTL2_dlUeTtiInfo']
+        data = logfile.get_data_between_airtimes(addtime(frame * 16, start), addtime(frame * 16, end),
+                                                 ['LocalTime', 'UEGID', 'SCHD.u8RbNum'])
+        return data[['LocalTime', 'UEGID', 'SCHD.u8RbNum']], logfile
+
+    def test_across_wrap(self):
+        '''跨越翻转点的时间范围与不翻转的Log读取结果一致'''
+        for start, end in [(50 * 16, 120 * 16 + 5), (89 * 16 + 9, 90 * 16), (0, 10), (150 * 16, 100 * 16)]:
+            expected, _ = self._between(100, start, end)
+            rlt, logfile = self._between(WRAP_FRAME, start, end)
+            pd.testing.assert_frame_equal(expected, rlt)
+            if start < end:
+                self.assertGreater(len(rlt.index), 0)
+
+        logfile.set_airtimes_interval(addtime(WRAP_FRAME * 16, 80 * 16), addtime(WRAP_FRAME * 16, 100 * 16))
+        data = logfile.get_data_of_cols(['LocalTime', 'AirTime'])
+        self.assertEqual(20 * 10 + 1, data['AirTime'].nunique())
+        self.assertTrue(data['LocalTime'].is_monotonic_increasing)
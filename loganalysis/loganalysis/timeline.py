@@ -0,0 +1,140 @@
+# coding=utf-8
+import numpy as np
+from loganalysis.const import *
+
+
+def unwrap(airtime):
+    '''16进制编码的空口时间转换为不翻转的TTI数
+
+        相邻两行的TTI差值超过半个翻转周期时认为发生了翻转(或乱序的记录跨过了翻转点)
+        Args:
+            airtime: 16进制编码的空口时间数组
+        Returns:
+            (TTI数组(int64), 翻转行号数组, 各翻转行的周期增量数组)
+    '''
+    airtime = np.asarray(airtime).astype(np.int64)
+    tti = airtime // 16 * 10 + airtime % 16
+    if len(tti) < 2:
+        return tti, np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    deltas = -np.rint(np.diff(tti) / TTI_PERIOD).astype(np.int64)
+    rows = np.flatnonzero(deltas) + 1
+    deltas = deltas[rows - 1]
+    offsets = np.zeros(len(tti), dtype=np.int64)
+    offsets[rows] = deltas
+    return tti + np.cumsum(offsets) * TTI_PERIOD, rows, deltas
+
+
+def timeline_stats(airtime, stride=TIMELINE_MARK_STRIDE):
+    '''统计单个文件的时间轴信息，可JSON序列化
+
+        Args:
+            airtime: 文件中按行排列的16进制空口时间
+            stride: 标记间隔行数
+        Returns:
+            字典，包括行数、翻转位置、文件内TTI范围，以及每隔stride行的TTI前缀最大值和后缀最小值
+    '''
+    tti, rows, deltas = unwrap(airtime)
+    if 0 == len(tti):
+        return {'rows': 0}
+    return {'rows': len(tti), 'wrap_rows': rows.tolist(), 'wrap_deltas': deltas.tolist(),
+            'first_tti': int(tti[0]), 'last_tti': int(tti[-1]),
+            'min_tti': int(tti.min()), 'max_tti': int(tti.max()),
+            'marks_max': np.maximum.accumulate(tti)[::stride].tolist(),
+            'marks_min': np.minimum.accumulate(tti[::-1])[::-1][::stride].tolist()}
+
+
+class Timeline(object):
+    '''LogFile的绝对TTI时间轴
+
+        由各文件的timeline_stats按文件顺序拼接而成：每个文件的TTI加上一个翻转周期的整数倍，
+        使其与前一个文件衔接，得到跨文件单调(允许少量乱序)的64位绝对TTI。
+        通过每隔stride行的前缀最大值和后缀最小值二分查找，把绝对TTI范围映射为文件内的行范围。
+    '''
+
+    def __init__(self, stats, stride=TIMELINE_MARK_STRIDE):
+        '''初始化时间轴
+
+            Args:
+                stats: 按文件顺序排列的timeline_stats列表
+                stride: 标记间隔行数
+        '''
+        self._stats = stats
+        self._stride = stride
+        self._bases = []
+        self._wrap_rows = []
+        self._wrap_offsets = []
+        last = None
+        for stat in stats:
+            base = 0
+            if stat['rows'] and last is not None:
+                base = int(np.rint((last - stat['first_tti']) / TTI_PERIOD)) * TTI_PERIOD
+            if stat['rows']:
+                last = stat['last_tti'] + base
+            self._bases.append(base)
+            self._wrap_rows.append(np.asarray(stat.get('wrap_rows', []), dtype=np.int64))
+            self._wrap_offsets.append(np.concatenate([[0], np.cumsum(stat.get('wrap_deltas', []))])
+                                      .astype(np.int64) * TTI_PERIOD)
+        starts = [stat['first_tti'] + base for stat, base in zip(stats, self._bases) if stat['rows']]
+        self._start = starts[0] if starts else None
+
+    @property
+    def start(self):
+        '''第一条记录的绝对TTI，没有记录时为None'''
+        return self._start
+
+    def abstti(self, fileidx, rows, airtime):
+        '''计算文件中指定行的绝对TTI
+
+            Args:
+                fileidx: 文件序号
+                rows: 行号数组
+                airtime: 对应行的16进制空口时间数组
+            Returns:
+                绝对TTI数组(int64)
+        '''
+        airtime = np.asarray(airtime).astype(np.int64)
+        idx = np.searchsorted(self._wrap_rows[fileidx], rows, side='right')
+        return airtime // 16 * 10 + airtime % 16 + self._bases[fileidx] + self._wrap_offsets[fileidx][idx]
+
+    def to_abstti(self, airtime, after=None):
+        '''16进制空口时间转换为绝对TTI
+
+            Args:
+                airtime: 16进制空口时间，可以是数组
+                after: 为None时取最接近Log起始时间的周期，否则取不早于after的第一个周期
+            Returns:
+                绝对TTI，airtime为数组时返回数组
+        '''
+        airtime = np.asarray(airtime).astype(np.int64)
+        tti = airtime // 16 * 10 + airtime % 16
+        if after is not None:
+            return np.where(tti < after, tti + -(-(after - tti) // TTI_PERIOD) * TTI_PERIOD, tti)[()]
+        if self._start is None:
+            return tti[()]
+        return (tti + np.rint((self._start - tti) / TTI_PERIOD).astype(np.int64) * TTI_PERIOD)[()]
+
+    def interval(self, start_airtime, end_airtime):
+        '''16进制空口时间范围转换为绝对TTI范围，end早于start时认为跨过了翻转点'''
+        start = self.to_abstti(start_airtime)
+        return start, self.to_abstti(end_airtime, after=start)
+
+    def locate(self, start, end):
+        '''查找绝对TTI范围[start, end]所在的文件和行范围
+
+            Args:
+                start: 起始绝对TTI
+                end: 截止绝对TTI
+            Returns:
+                [(文件序号, (lo, hi)), ]列表，行范围[lo, hi)可能多于实际满足条件的行
+        '''
+        rlt = []
+        for fileidx, (stat, base) in enumerate(zip(self._stats, self._bases)):
+            if 0 == stat['rows'] or stat['max_tti'] + base < start or stat['min_tti'] + base > end:
+                continue
+            marks_max = np.asarray(stat['marks_max']) + base
+            marks_min = np.asarray(stat['marks_min']) + base
+            lo = max(int(np.searchsorted(marks_max, start, side='left')) - 1, 0) * self._stride
+            hi = min(int(np.searchsorted(marks_min, end, side='right')) * self._stride, stat['rows'])
+            if lo < hi:
+                rlt.append((fileidx, (lo, hi)))
+        return rlt